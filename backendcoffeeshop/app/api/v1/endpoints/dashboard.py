@@ -1,18 +1,51 @@
-from fastapi import APIRouter, Depends, Query, Body, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, Query, Body, WebSocket
 from sqlalchemy.orm import Session
-from app.models import Order, Shift, OrderItem, MenuItem, Table
+from app.models import Order, Shift, OrderItem, MenuItem, Table, SalesHourly, SalesHourlyItem
 from app.database.database import get_db
 from datetime import datetime, timedelta, time
-from typing import Dict, List
-from sqlalchemy import func, desc, cast, Time
+from typing import Dict, List, Tuple
+from sqlalchemy import func, desc, case, and_
 import requests
-import json
 import asyncio
 import logging
+import os
 import uuid
-from .printer_manager import printer_manager
+from .ws_hub import hub
+from .print_queue import print_queue, STATION_CASHIER
+from .printer_health import printer_monitor
+from app.core.bill_renderer import shift_report_lines, paper_width_cache
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+SHIFT_KEYS = ("morning", "afternoon", "evening")
+
+def shift_totals(db: Session, start_dt: datetime, end_dt: datetime) -> Dict:
+    """
+    Doanh thu và số hóa đơn trong các ngày của khoảng thời gian, cả ngày và theo từng ca.
+    Một câu GROUP BY shift trên rollup sales_hourly (order không có ca có shift = "", chỉ vào tổng),
+    dùng chung cho /summary và in biên bản đóng ca.
+    """
+    rows = db.query(
+        SalesHourly.shift,
+        func.coalesce(func.sum(SalesHourly.order_count), 0),
+        func.coalesce(func.sum(SalesHourly.revenue), 0)
+    ).filter(
+        SalesHourly.sale_date >= start_dt.date(),
+        SalesHourly.sale_date <= end_dt.date()
+    ).group_by(SalesHourly.shift).all()
+
+    result = {
+        "total": {"revenue": 0, "orders": 0},
+        "shifts": {key: {"revenue": 0, "orders": 0} for key in SHIFT_KEYS}
+    }
+    for name, orders, revenue in rows:
+        result["total"]["revenue"] += revenue
+        result["total"]["orders"] += orders
+        if name in result["shifts"]:
+            result["shifts"][name]["revenue"] += revenue
+            result["shifts"][name]["orders"] += orders
+    return result
 
 @router.get("/summary")
 def dashboard_summary(date: str = Query(..., description="YYYY-MM-DD"), db: Session = Depends(get_db)) -> Dict:
@@ -22,35 +55,9 @@ def dashboard_summary(date: str = Query(..., description="YYYY-MM-DD"), db: Sess
     except Exception:
         return {"error": "Sai định dạng ngày. Đúng: YYYY-MM-DD"}
 
-    # Lấy tất cả order trong ngày
     start_dt = datetime.combine(target_date, time(0, 0, 0))
     end_dt = datetime.combine(target_date, time(23, 59, 59))
-    orders = db.query(Order).filter(Order.time_in >= start_dt, Order.time_in <= end_dt).all()
-
-    # Tổng doanh thu và hóa đơn cả ngày
-    result = {
-        "total": {
-            "revenue": sum(o.total_amount or 0 for o in orders),
-            "orders": len(orders)
-        },
-        "shifts": {
-            "morning": {"revenue": 0, "orders": 0},
-            "afternoon": {"revenue": 0, "orders": 0},
-            "evening": {"revenue": 0, "orders": 0}
-        }
-    }
-
-    # Thống kê theo ca dựa vào shift_id
-    for order in orders:
-        if order.shift_id:
-            shift = db.query(Shift).filter(Shift.id == order.shift_id).first()
-            if shift:
-                shift_name = shift.shift_type.lower()  # Chuyển về chữ thường để so sánh
-                if shift_name in result["shifts"]:
-                    result["shifts"][shift_name]["revenue"] += order.total_amount or 0
-                    result["shifts"][shift_name]["orders"] += 1
-
-    return result
+    return shift_totals(db, start_dt, end_dt)
 
 @router.get("/cigarettes")
 def cigarettes_summary(date: str = Query(..., description="YYYY-MM-DD"), db: Session = Depends(get_db)) -> Dict:
@@ -175,55 +182,10 @@ def shift_report(date: str = Query(..., description="YYYY-MM-DD"), shift: str =
 @router.websocket("/ws/printer")
 async def printer_websocket_endpoint(websocket: WebSocket):
     printer_id = str(uuid.uuid4())
-    try:
-        # Chấp nhận kết nối trước khi thêm vào manager
-        await websocket.accept()
-        
-        # Gửi thông tin kết nối thành công
-        await websocket.send_json({
-            "type": "connection",
-            "data": {
-                "status": "connected",
-                "printer_id": printer_id,
-                "timestamp": datetime.now().isoformat()
-            }
-        })
-        
-        # Thêm vào manager sau khi đã kết nối thành công
-        await printer_manager.connect(printer_id, websocket)
-        
-        while True:
-            try:
-                data = await websocket.receive_text()
-                try:
-                    message = json.loads(data)
-                    logger.info(f"Received message from printer {printer_id}: {message}")
-                    
-                    if message.get("type") == "ping":
-                        await websocket.send_json({
-                            "type": "pong",
-                            "data": {
-                                "timestamp": datetime.now().isoformat()
-                            }
-                        })
-                    elif message.get("type") == "printer_info":
-                        # Cập nhật thông tin printer
-                        printer_info = message.get("data", {})
-                        logger.info(f"Printer {printer_id} info: {printer_info}")
-                        
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON from printer {printer_id}: {data}")
-                    
-            except WebSocketDisconnect:
-                logger.info(f"Printer {printer_id} disconnected")
-                break
-            except Exception as e:
-                logger.error(f"Error receiving message from printer {printer_id}: {str(e)}")
-                break
-    except Exception as e:
-        logger.error(f"WebSocket error for printer {printer_id}: {str(e)}")
-    finally:
-        printer_manager.disconnect(printer_id)
+    await hub.serve(
+        websocket, printer_id, ["printers"],
+        on_message=print_queue.on_printer_message, on_connect=printer_monitor.register
+    )
 
 @router.post("/print-shift-report")
 async def print_shift_report(
@@ -245,75 +207,111 @@ async def print_shift_report(
     except Exception:
         return {"error": "Sai định dạng ngày. Đúng: YYYY-MM-DD"}
 
-    # Tái sử dụng logic tổng hợp
-    summary = dashboard_summary(date, db)
-    cigarettes = cigarettes_summary(date, db)
-
     # Lấy dữ liệu theo ca
     shift_key = shift.lower()
-    if shift_key not in summary["shifts"]:
+    if shift_key not in SHIFT_KEYS:
         return {"error": "Không tìm thấy dữ liệu ca"}
+
+    # Tái sử dụng logic tổng hợp
+    start_dt = datetime.combine(target_date, time(0, 0, 0))
+    end_dt = datetime.combine(target_date, time(23, 59, 59))
+    summary = shift_totals(db, start_dt, end_dt)
+    cigarettes = cigarettes_summary(date, db)
     shift_data = summary["shifts"][shift_key]
     cigarette_items = cigarettes["shifts"][shift_key]["items"]
 
     # Format bill tổng kết ca
-    summary_lines = [
-        {"text": "TỔNG KẾT CA", "fontSize": 14, "fontName": "Arial", "bold": True, "align": "center"},
-        {"text": f"Ngày: {target_date.strftime('%d/%m/%Y')}", "fontSize": 10, "bold": False, "align": "left"},
-        {"text": f"{'Ca sáng' if shift_key == 'morning' else 'Ca chiều' if shift_key == 'afternoon' else 'Ca tối'}", "fontSize": 10, "bold": False, "align": "left"},
-        {"text": "--------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-        # Thông tin nhân viên 1
-        {"text": f"Nhân viên : {staff1_name}", "fontSize": 12, "bold": True, "align": "left"},
-        {"text": f"  Mã order đầu: {staff1_start_order}", "fontSize": 12, "bold": False, "align": "left"},
-        {"text": f"  Mã order cuối: {staff1_end_order}", "fontSize": 12, "bold": False, "align": "left"},
-        {"text": f"  Tổng số order: {staff1_total}", "fontSize": 12, "bold": False, "align": "left"},
-    ]
+    staffs = [{"name": staff1_name, "start_order": staff1_start_order, "end_order": staff1_end_order, "total": staff1_total}]
     if staff2_name:
-        summary_lines += [
-            {"text": f"Nhân viên : {staff2_name}", "fontSize": 12, "bold": True, "align": "left"},
-            {"text": f"  Mã order đầu: {staff2_start_order}", "fontSize": 12, "bold": False, "align": "left"},
-            {"text": f"  Mã order cuối: {staff2_end_order}", "fontSize": 12, "bold": False, "align": "left"},
-            {"text": f"  Tổng số order: {staff2_total}", "fontSize": 12, "bold": False, "align": "left"},
-        ]
-    summary_lines += [
-        {"text": f"Tổng cộng: {(staff1_total or 0) + (staff2_total or 0)} cuống", "fontSize": 12, "bold": True, "align": "left"},
-        {"text": f"Tổng cuống trên máy: {shift_data['orders']}", "fontSize": 12, "bold": False, "align": "left"},
-        {"text": "--------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-        {"text": f"Tổng doanh thu: {shift_data['revenue']:,.0f} ₫", "fontSize": 12, "bold": True, "align": "left"},
-        {"text": f"Tổng số hóa đơn: {shift_data['orders']}", "fontSize": 12, "bold": False, "align": "left"},
-        {"text": "--------------------------------", "fontSize": 12, "bold": False, "align": "left"},
-        {"text": "Thống kê thuốc lá:", "fontSize": 13, "bold": True, "align": "left"},
-    ]
-    if cigarette_items:
-        for item in cigarette_items:
-            summary_lines.append({
-                "text": f"{item['name']} x{item['quantity']} gói", "fontSize": 12, "bold": False, "align": "left"
-            })
-    else:
-        summary_lines.append({"text": "Không có dữ liệu thuốc lá", "fontSize": 12, "bold": False, "align": "left"})
-    summary_lines.append({"text": "--------------------------------", "fontSize": 12, "bold": False, "align": "left"})
-    summary_lines.append({"text": "Người lập biên bản", "fontSize": 12, "bold": False, "align": "center"})
-    summary_lines.append({"text": "(Ký, ghi rõ họ tên)", "fontSize": 12, "bold": False, "align": "center"})
-
-    # Gửi tới tất cả các máy in đang kết nối
-    success = False
-    for printer_id in printer_manager.active_printers.keys():
-        try:
-            result = await printer_manager.send_to_printer(printer_id, {
-                "type": "print",
-                "data": summary_lines
-            })
-            if result:
-                success = True
-                logger.info(f"Đã gửi dữ liệu tới printer {printer_id}")
-        except Exception as e:
-            logger.error(f"Lỗi khi gửi dữ liệu tới printer {printer_id}: {str(e)}")
-    
-    if not success:
+        staffs.append({"name": staff2_name, "start_order": staff2_start_order, "end_order": staff2_end_order, "total": staff2_total})
+    shift_label = 'Ca sáng' if shift_key == 'morning' else 'Ca chiều' if shift_key == 'afternoon' else 'Ca tối'
+    summary_lines = shift_report_lines(
+        target_date.strftime('%d/%m/%Y'), shift_label, staffs, shift_data, cigarette_items,
+        paper_width_cache.columns()
+    )
+
+    # Xếp vào print spool; không có máy in thì lệnh in chờ tới khi máy in kết nối (ở worker bất kỳ)
+    print_job = print_queue.submit(summary_lines, kind="shift_report", station=STATION_CASHIER)
+    if not print_job.spooled and not print_queue.has_printers():
         logger.error("Không thể gửi dữ liệu tới bất kỳ máy in nào")
         return {"error": "Không thể gửi dữ liệu tới máy in. Vui lòng kiểm tra kết nối máy in."}
-        
-    return {"success": True, "message": "Đã gửi biên bản đóng ca tới máy in"}
+
+    return {"success": True, "message": "Đã gửi biên bản đóng ca tới máy in", "job_id": print_job.id}
+
+# Rollup sales_hourly_items lưu theo giờ nên mốc ca phải là giờ chẵn
+DEFAULT_SHIFT_WINDOWS = "06:00-12:00,12:00-18:00,18:00-24:00"
+
+def parse_minute(value: str) -> int:
+    """Chuỗi HH:00 → số phút từ 0h; 24:00 là hết ngày. Mốc không phải giờ chẵn thì ValueError"""
+    hour, minute = (int(part) for part in value.strip().split(":"))
+    if minute != 0 or not 0 <= hour <= 24:
+        raise ValueError(f"mốc {value.strip()} phải là giờ chẵn từ 00:00 đến 24:00")
+    return hour * 60
+
+def parse_shift_windows(value: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Chuỗi 06:00-12:00,12:00-18:00,18:00-24:00 → {"morning": (360, 720), ...} (phút) theo thứ tự SHIFT_KEYS.
+    Sai định dạng, thiếu/thừa ca hoặc mốc không phải giờ chẵn thì ValueError.
+    """
+    parts = value.split(",")
+    if len(parts) != len(SHIFT_KEYS):
+        raise ValueError(f"cần {len(SHIFT_KEYS)} ca, nhận {len(parts)}")
+    windows = {}
+    for key, window in zip(SHIFT_KEYS, parts):
+        start, end = window.split("-")
+        windows[key] = (parse_minute(start), parse_minute(end))
+        if windows[key][0] >= windows[key][1]:
+            raise ValueError(f"ca {window.strip()} phải bắt đầu trước khi kết thúc")
+    return windows
+
+def load_shift_windows(value: str) -> Dict[str, Tuple[int, int]]:
+    """Khung giờ ca từ biến môi trường; giá trị sai thì ghi log và dùng mặc định (không làm app dừng khi import)"""
+    try:
+        return parse_shift_windows(value)
+    except ValueError as e:
+        logger.error(f"MENU_STATS_SHIFT_WINDOWS={value!r} không hợp lệ ({str(e)}), dùng mặc định {DEFAULT_SHIFT_WINDOWS}")
+        return parse_shift_windows(DEFAULT_SHIFT_WINDOWS)
+
+# Khung giờ từng ca cho thống kê món [bắt đầu, kết thúc), theo giờ tạo order
+MENU_STATS_SHIFT_WINDOWS = load_shift_windows(os.getenv("MENU_STATS_SHIFT_WINDOWS", DEFAULT_SHIFT_WINDOWS))
+
+def menu_item_totals(
+    db: Session, start_dt: datetime, end_dt: datetime,
+    windows: Dict[str, Tuple[int, int]] = MENU_STATS_SHIFT_WINDOWS
+):
+    """
+    Tổng số lượng/doanh thu của từng món trong các ngày của khoảng thời gian (order đã hoàn thành),
+    kèm số lượng theo từng ca (morning_quantity, ...) bằng SUM(CASE ...) trên rollup sales_hourly_items.
+    """
+    hour_minute = SalesHourlyItem.hour * 60
+    shift_columns = []
+    for key in SHIFT_KEYS:
+        shift_start, shift_end = windows[key]
+        in_shift = and_(hour_minute >= shift_start, hour_minute < shift_end)
+        shift_columns.append(
+            func.coalesce(func.sum(case((in_shift, SalesHourlyItem.quantity), else_=0)), 0).label(f"{key}_quantity")
+        )
+
+    return db.query(
+        MenuItem.id,
+        MenuItem.name,
+        MenuItem.price,
+        func.sum(SalesHourlyItem.quantity).label('total_quantity'),
+        (func.sum(SalesHourlyItem.quantity) * MenuItem.price).label('total_revenue'),
+        *shift_columns
+    ).join(
+        SalesHourlyItem, MenuItem.id == SalesHourlyItem.menu_item_id
+    ).filter(
+        SalesHourlyItem.sale_date >= start_dt.date(),
+        SalesHourlyItem.sale_date <= end_dt.date(),
+        SalesHourlyItem.status == 'completed'
+    ).group_by(
+        MenuItem.id, MenuItem.name, MenuItem.price
+    ).having(
+        func.sum(SalesHourlyItem.quantity) != 0
+    ).order_by(
+        desc('total_quantity')
+    ).all()
 
 @router.get("/menu-stats")
 def menu_stats(
@@ -336,55 +334,8 @@ def menu_stats(
     start_dt = datetime.combine(start_target_date, time(0, 0, 0))
     end_dt = datetime.combine(end_target_date, time(23, 59, 59))
 
-    # Truy vấn tổng thống kê món ăn
-    total_query = db.query(
-        MenuItem.id,
-        MenuItem.name,
-        MenuItem.price,
-        func.sum(OrderItem.quantity).label('total_quantity'),
-        func.sum(OrderItem.quantity * MenuItem.price).label('total_revenue')
-    ).join(
-        OrderItem, MenuItem.id == OrderItem.menu_item_id
-    ).join(
-        Order, OrderItem.order_id == Order.id
-    ).filter(
-        Order.time_in >= start_dt,
-        Order.time_in <= end_dt,
-        Order.status == 'completed'
-    ).group_by(
-        MenuItem.id, MenuItem.name, MenuItem.price
-    ).order_by(
-        desc('total_quantity')
-    ).all()
-
-    # Hàm helper để lấy số lượng theo ca dựa trên thời gian
-    def get_shift_quantity_by_time(menu_item_id, shift_type):
-        # Xác định khoảng thời gian cho từng ca
-        if shift_type == 'morning':
-            shift_start = time(6, 0)  # 6:00 AM
-            shift_end = time(12, 0)   # 12:00 PM
-        elif shift_type == 'afternoon':
-            shift_start = time(12, 0)  # 12:00 PM
-            shift_end = time(18, 0)    # 6:00 PM
-        elif shift_type == 'evening':
-            shift_start = time(18, 0)  # 6:00 PM
-            shift_end = time(23, 59)   # 11:59 PM
-        else:
-            return 0
-            
-        result = db.query(
-            func.sum(OrderItem.quantity).label('quantity')
-        ).join(
-            Order, OrderItem.order_id == Order.id
-        ).filter(
-            OrderItem.menu_item_id == menu_item_id,
-            Order.time_in >= start_dt,
-            Order.time_in <= end_dt,
-            Order.status == 'completed',
-            cast(Order.time_in, Time) >= shift_start,
-            cast(Order.time_in, Time) < shift_end
-        ).scalar()
-        return result or 0
+    # Một câu truy vấn: tổng và số lượng theo từng ca của mỗi món
+    total_query = menu_item_totals(db, start_dt, end_dt)
 
     # Tính tổng số lượng và doanh thu
     total_quantity = sum(item.total_quantity for item in total_query)
@@ -394,19 +345,15 @@ def menu_stats(
     # Format dữ liệu trả về với thông tin theo ca
     menu_items = []
     for item in total_query:
-        morning_qty = get_shift_quantity_by_time(item.id, 'morning')
-        afternoon_qty = get_shift_quantity_by_time(item.id, 'afternoon')
-        evening_qty = get_shift_quantity_by_time(item.id, 'evening')
-        
         percentage = (item.total_quantity / total_quantity * 100) if total_quantity > 0 else 0
         menu_items.append({
             "id": item.id,
             "name": item.name,
             "price": item.price,
             "total_quantity": item.total_quantity,
-            "morning_quantity": morning_qty,
-            "afternoon_quantity": afternoon_qty,
-            "evening_quantity": evening_qty,
+            "morning_quantity": item.morning_quantity,
+            "afternoon_quantity": item.afternoon_quantity,
+            "evening_quantity": item.evening_quantity,
             "revenue": item.total_revenue,
             "percentage": round(percentage, 2)
         })
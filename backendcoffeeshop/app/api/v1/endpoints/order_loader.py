@@ -0,0 +1,211 @@
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import tuple_, and_, or_
+from sqlalchemy.orm import Session, Query
+from app.database.database import SessionLocal
+from app.models import Order, OrderItem
+from app.core.menu_cache import menu_cache
+import base64
+import json
+
+# Cấu hình timezone cho Việt Nam
+VIETNAM_TIMEZONE = timezone(timedelta(hours=7))
+
+# Số order_id tối đa trong một câu IN để tránh câu SQL quá dài
+ITEM_QUERY_CHUNK_SIZE = 1000
+
+# Số order đọc mỗi lượt từ server-side cursor khi stream export
+ORDER_STREAM_BATCH_SIZE = 500
+
+# Các cột của Order cần cho OrderResponse (query theo cột để không giữ object trong identity map)
+ORDER_RESPONSE_COLUMNS = (
+    Order.id,
+    Order.table_id,
+    Order.staff_id,
+    Order.shift_id,
+    Order.status,
+    Order.total_amount,
+    Order.note,
+    Order.order_code,
+    Order.payment_status,
+    Order.time_in,
+    Order.time_out
+)
+
+# Thứ tự danh sách order: mới nhất trước. Order chưa có time_in (hiển thị như giờ hiện tại) đứng đầu;
+# ghi rõ NULLS FIRST vì SQLite mặc định để NULL cuối, còn Postgres duyệt ngược index (time_in, id) cho đúng thứ tự này
+ORDER_LIST_ORDERING = (Order.time_in.desc().nulls_first(), Order.id.desc())
+
+def ensure_timezone(dt: datetime) -> datetime:
+    """Đảm bảo datetime có timezone"""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=VIETNAM_TIMEZONE)
+    return dt
+
+def normalize_status(value, default: str) -> str:
+    """Chuẩn hóa status/payment_status về chuỗi chữ thường (hỗ trợ cả enum)"""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.lower()
+    return str(value).split('.')[-1].lower()
+
+def fetch_order_items(db: Session, order_ids: Iterable[int]) -> Dict[int, List[dict]]:
+    """
+    Lấy items của nhiều order bằng một câu IN thay vì một query cho mỗi order,
+    tên món tra từ menu cache. Trả về dict order_id -> danh sách item dict.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    items_by_order: Dict[int, List[dict]] = defaultdict(list)
+
+    for start in range(0, len(order_ids), ITEM_QUERY_CHUNK_SIZE):
+        chunk = order_ids[start:start + ITEM_QUERY_CHUNK_SIZE]
+        rows = db.query(
+            OrderItem.id,
+            OrderItem.order_id,
+            OrderItem.menu_item_id,
+            OrderItem.quantity,
+            OrderItem.unit_price,
+            OrderItem.total_price,
+            OrderItem.note
+        ).filter(
+            OrderItem.order_id.in_(chunk)
+        ).order_by(
+            OrderItem.order_id, OrderItem.id
+        ).all()
+
+        for row in rows:
+            items_by_order[row.order_id].append({
+                "id": row.id,
+                "order_id": row.order_id,
+                "menu_item_id": row.menu_item_id,
+                "quantity": row.quantity,
+                "unit_price": row.unit_price,
+                "total_price": row.total_price,
+                "note": row.note,
+                "name": menu_cache.item_name(db, row.menu_item_id)
+            })
+
+    return items_by_order
+
+def empty_order_item(order_id: int) -> dict:
+    """Item giữ chỗ cho order không có món"""
+    return {
+        "id": 0,
+        "order_id": order_id,
+        "menu_item_id": 0,
+        "quantity": 0,
+        "unit_price": 0,
+        "total_price": 0,
+        "note": "",
+        "name": "Không có món ăn"
+    }
+
+def build_order_dict(order, order_items: List[dict], current_time: Optional[datetime] = None) -> dict:
+    """Chuyển một order (model hoặc row) và danh sách item thành dict theo OrderResponse"""
+    return {
+        "id": order.id,
+        "table_id": order.table_id,
+        "staff_id": order.staff_id,
+        "shift_id": order.shift_id,
+        "status": normalize_status(order.status, "pending"),
+        "total_amount": order.total_amount,
+        "note": order.note,
+        "order_code": order.order_code,
+        "payment_status": normalize_status(order.payment_status, "unpaid"),
+        "time_in": ensure_timezone(order.time_in) if order.time_in else current_time,
+        "time_out": ensure_timezone(order.time_out) if order.time_out else None,
+        "items": order_items if order_items else [empty_order_item(order.id)]
+    }
+
+def load_order_responses(db: Session, orders: List, current_time: Optional[datetime] = None) -> List[dict]:
+    """
+    Dựng danh sách OrderResponse dict cho một trang order:
+    một query lấy toàn bộ items, sau đó ghép vào từng order trong một lượt duyệt.
+    """
+    if current_time is None:
+        current_time = datetime.now(VIETNAM_TIMEZONE).replace(tzinfo=None)
+    items_by_order = fetch_order_items(db, (order.id for order in orders))
+    return [
+        build_order_dict(order, items_by_order.get(order.id, []), current_time)
+        for order in orders
+    ]
+
+def encode_cursor(order) -> Optional[str]:
+    """Mã hóa vị trí (time_in, id) của order cuối trang thành cursor dạng chuỗi (time_in NULL: phần giờ để trống)"""
+    if order is None:
+        return None
+    raw = f"{order.time_in.isoformat() if order.time_in else ''}|{order.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """Giải mã cursor thành (time_in, id) (time_in None nếu order cuối trang chưa có time_in), lỗi 400 nếu cursor không hợp lệ"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        time_part, id_part = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return (datetime.fromisoformat(time_part) if time_part else None), int(id_part)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate_orders(query: Query, skip: int = 0, limit: Optional[int] = 100, cursor: Optional[str] = None) -> Tuple[List, Optional[str]]:
+    """
+    Phân trang danh sách order theo (time_in, id) giảm dần, order chưa có time_in đứng đầu (ORDER_LIST_ORDERING).
+    Có cursor thì dùng keyset (dùng index ix_orders_time_in_id, không phụ thuộc độ sâu trang),
+    không có thì giữ cách offset cũ. limit=None lấy hết. Trả về (orders, next_cursor).
+    """
+    query = query.order_by(*ORDER_LIST_ORDERING)
+    if cursor:
+        cursor_time, cursor_id = decode_cursor(cursor)
+        if cursor_time is None:
+            # Còn các order chưa có time_in với id nhỏ hơn, sau đó là mọi order có time_in
+            query = query.filter(or_(
+                and_(Order.time_in.is_(None), Order.id < cursor_id),
+                Order.time_in.isnot(None)
+            ))
+        else:
+            # So sánh tuple loại các dòng time_in NULL, vốn đã nằm ở các trang trước
+            query = query.filter(tuple_(Order.time_in, Order.id) < tuple_(cursor_time, cursor_id))
+    elif skip:
+        query = query.offset(skip)
+
+    if limit is None:
+        return query.all(), None
+    orders = query.limit(limit).all()
+    next_cursor = encode_cursor(orders[-1]) if orders and len(orders) == limit else None
+    return orders, next_cursor
+
+def json_default(value):
+    """default cho json.dumps: datetime -> ISO string"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def iter_order_responses(db: Session, filters: List, batch_size: int = ORDER_STREAM_BATCH_SIZE) -> Iterator[dict]:
+    """
+    Duyệt orders thỏa filters bằng server-side cursor (yield_per), mỗi lô batch_size order
+    lấy items bằng một query rồi trả ra từng order dict ngay, bộ nhớ không tăng theo số order.
+    """
+    query = db.query(*ORDER_RESPONSE_COLUMNS).filter(*filters).order_by(*ORDER_LIST_ORDERING).yield_per(batch_size)
+
+    batch = []
+    for order in query:
+        batch.append(order)
+        if len(batch) >= batch_size:
+            yield from load_order_responses(db, batch)
+            batch = []
+    if batch:
+        yield from load_order_responses(db, batch)
+
+def stream_orders_ndjson(filters: List, batch_size: int = ORDER_STREAM_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Sinh NDJSON (mỗi dòng một order) cho StreamingResponse.
+    Dùng session riêng vì response được gửi sau khi dependency get_db đã kết thúc.
+    """
+    db = SessionLocal()
+    try:
+        for order_dict in iter_order_responses(db, filters, batch_size):
+            yield (json.dumps(order_dict, ensure_ascii=False, default=json_default) + "\n").encode("utf-8")
+    finally:
+        db.close()
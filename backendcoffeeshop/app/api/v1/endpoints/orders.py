@@ -1,39 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status, Request
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from app.models import Order, OrderItem, MenuItem, Table, Shift
+from app.models import Order, OrderItem, Table, Shift
 from app.database.database import get_db
 from app.schemas.order import OrderResponse, OrderCreate, OrderItemResponse, OrderUpdate, OrderItemCreate
 from datetime import datetime, timezone, timedelta, time
 import uuid
-from typing import List, Dict, Optional
+from typing import List, Optional
 import logging
-import json
-import asyncio
-import sys
+import os
 from pydantic import BaseModel
 from sqlalchemy import func, cast, Date
 import requests
 import websockets
-import textwrap
-from .printer_manager import printer_manager
-
-# Cấu hình logging
-logger = logging.getLogger(__name__)
-
-# Thêm handler cho console
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.INFO)
-console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(console_formatter)
-logger.addHandler(console_handler)
-
-# Thêm handler cho file
-file_handler = logging.FileHandler('orders.log')
-file_handler.setLevel(logging.INFO)
-file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(file_formatter)
-logger.addHandler(file_handler)
+from .ws_hub import hub, parse_topics
+from .print_queue import print_queue, split_items_by_station, STATION_CASHIER
+from .table_feed import table_feed
+from app.core.logging_config import get_file_logger
+from app.core.sales_rollup import sales_rollup
+from app.core.bill_renderer import (
+    bill_items, merge_bill_items, kitchen_ticket_lines, delta_ticket_lines, ticket_changes,
+    order_receipt_lines, receipt_lines, paper_width_cache
+)
+from .order_loader import fetch_order_items, load_order_responses, paginate_orders
+from app.crud import get_menu_items_by_ids, bulk_create_order_items, sync_order_items
+
+# Cấu hình logging: ghi thêm ra orders.log qua queue, stdout/app.log do root logger đảm nhận
+logger = get_file_logger(__name__, 'orders.log')
 
 # Cấu hình timezone cho Việt Nam
 VIETNAM_TIMEZONE = timezone(timedelta(hours=7))
@@ -48,126 +41,69 @@ def ensure_timezone(dt: datetime) -> datetime:
         return dt.replace(tzinfo=VIETNAM_TIMEZONE)
     return dt
 
-# Constants for bill formatting
-TOTAL_BILL_WIDTH = 33
-QTY_COL_WIDTH = 4 # e.g., " x3 "
-PRICE_COL_WIDTH = 9 # e.g., "120.000" (max 7 digits + 2 for thousands separator/padding)
-NAME_COL_WIDTH = TOTAL_BILL_WIDTH - QTY_COL_WIDTH - PRICE_COL_WIDTH # This will be 20
+# Phiếu bếp khi sửa order: "delta" chỉ in các món thay đổi, "full" in lại cả order như trước
+KITCHEN_TICKET_MODE = os.getenv("KITCHEN_TICKET_MODE", "delta")
+
+def table_label(db: Session, table_id: int) -> str:
+    table = db.query(Table).filter(Table.id == table_id).first()
+    return table.name if table else 'Bàn ' + str(table_id)
+
+def submit_kitchen_tickets(
+    db: Session, order_id: int, table_id: int, time_text: str, items: List[dict], kind: str,
+    station: Optional[str] = None
+) -> list:
+    """Xếp phiếu làm đồ đầy đủ: mỗi quầy (bar, bếp...) nhận phiếu chỉ gồm các món của quầy đó"""
+    label = table_label(db, table_id)
+    width = paper_width_cache.columns()
+    jobs = []
+    for item_station, station_items in split_items_by_station(db, items).items():
+        if station and item_station != station:
+            continue
+        bill_lines = kitchen_ticket_lines(label, time_text, bill_items(db, station_items), width)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Dữ liệu in ({item_station}): {bill_lines}")
+        # Xếp lệnh in vào hàng đợi, dispatcher gửi tới máy in ở nền (không chờ máy in)
+        jobs.append(print_queue.submit(
+            bill_lines, kind=kind, order_id=order_id, station=item_station
+        ))
+    return jobs
+
+def submit_delta_tickets(db: Session, order_id: int, table_id: int, time_text: str, item_changes: List[dict]) -> list:
+    """Xếp phiếu sửa đồ: mỗi quầy chỉ nhận các món thêm / tăng / giảm / hủy của quầy đó"""
+    label = table_label(db, table_id)
+    width = paper_width_cache.columns()
+    edited_text = get_vietnam_time().strftime('%H:%M:%S')
+    jobs = []
+    for station, station_changes in split_items_by_station(db, item_changes).items():
+        bill_lines = delta_ticket_lines(label, time_text, edited_text, ticket_changes(db, station_changes), width)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Phiếu sửa đồ ({station}): {bill_lines}")
+        jobs.append(print_queue.submit(
+            bill_lines, kind="order_delta", order_id=order_id, station=station
+        ))
+    return jobs
 
 router = APIRouter()
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.logger = logging.getLogger(__name__)
-
-    def connect(self, client_id: str, websocket: WebSocket):
-        self.active_connections[client_id] = websocket
-        self.logger.info(f"Client {client_id} connected")
-
-    def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
-            self.logger.info(f"Client {client_id} disconnected")
-
-    async def broadcast(self, message: dict):
-        start_time = datetime.now()
-        self.logger.info(f"Starting broadcast at {start_time}")
-        
-        disconnected_clients = []
-        for client_id, connection in self.active_connections.items():
-            retry_count = 0
-            max_retries = 3
-            
-            while retry_count < max_retries:
-                try:
-                    # Thêm timeout 1 giây khi gửi thông báo
-                    await asyncio.wait_for(
-                        connection.send_json(message),
-                        timeout=1.0
-                    )
-                    self.logger.info(f"Message sent to client {client_id}")
-                    break
-                except asyncio.TimeoutError:
-                    retry_count += 1
-                    if retry_count == max_retries:
-                        self.logger.error(f"Timeout sending to client {client_id} after {max_retries} retries")
-                        disconnected_clients.append(client_id)
-                    else:
-                        self.logger.warning(f"Timeout sending to client {client_id}, retry {retry_count}/{max_retries}")
-                        await asyncio.sleep(0.1)  # Đợi 100ms trước khi retry
-                except Exception as e:
-                    retry_count += 1
-                    if retry_count == max_retries:
-                        self.logger.error(f"Error sending to client {client_id} after {max_retries} retries: {str(e)}")
-                        disconnected_clients.append(client_id)
-                    else:
-                        self.logger.warning(f"Error sending to client {client_id}, retry {retry_count}/{max_retries}: {str(e)}")
-                        await asyncio.sleep(0.1)  # Đợi 100ms trước khi retry
-        
-        # Xóa các client đã ngắt kết nối
-        for client_id in disconnected_clients:
-            self.disconnect(client_id)
-            
-        end_time = datetime.now()
-        self.logger.info(f"Broadcast completed in {(end_time - start_time).total_seconds()} seconds")
-
-manager = ConnectionManager()
-
 @router.websocket("/ws/order")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, topics: Optional[str] = None):
+    """Màn hình order: mặc định nhận topic "orders", có thể chọn thêm qua ?topics=orders,kitchen"""
     client_id = str(uuid.uuid4())
-    try:
-        await websocket.accept()
-        await printer_manager.connect(client_id, websocket)
-        
-        await websocket.send_json({
-            "type": "connection",
-            "data": {
-                "status": "connected",
-                "client_id": client_id,
-                "timestamp": datetime.now().isoformat()
-            }
-        })
-        
-        while True:
-            try:
-                data = await websocket.receive_text()
-                try:
-                    message = json.loads(data)
-                    logger.info(f"Received message from client {client_id}: {message}")
-                    
-                    if message.get("type") == "ping":
-                        await websocket.send_json({
-                            "type": "pong",
-                            "data": {
-                                "timestamp": datetime.now().isoformat()
-                            }
-                        })
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON from client {client_id}: {data}")
-                    
-            except WebSocketDisconnect:
-                logger.info(f"Client {client_id} disconnected")
-                break
-            except Exception as e:
-                logger.error(f"Error receiving message from client {client_id}: {str(e)}")
-                break
-    except Exception as e:
-        logger.error(f"WebSocket error for client {client_id}: {str(e)}")
-    finally:
-        printer_manager.disconnect(client_id)
+    await hub.serve(websocket, client_id, parse_topics(topics, ["orders"]))
 
 @router.get("/", response_model=List[OrderResponse])
 async def get_orders(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     db: Session = Depends(get_db)
 ):
     try:
         logger.info(f"=== BẮT ĐẦU GET ORDERS ===")
-        logger.info(f"Params: skip={skip}, limit={limit}, date={date}")
+        logger.info(f"Params: skip={skip}, limit={limit}, date={date}, cursor={cursor}")
 
         # Tạo base query - lấy tất cả orders không phân biệt trạng thái
         query = db.query(Order)
@@ -188,118 +124,50 @@ async def get_orders(
                 
                 logger.info(f"Added date filter: {start_dt} to {end_dt}")
                 
-                # Log số lượng orders theo từng trạng thái
-                status_counts = db.query(Order.status, func.count(Order.id)).filter(
-                    Order.time_in >= start_dt,
-                    Order.time_in <= end_dt
-                ).group_by(Order.status).all()
-                
-                logger.info("Orders count by status:")
-                for status, count in status_counts:
-                    logger.info(f"- Status {status}: {count} orders")
+                # Log số lượng orders theo từng trạng thái (query chẩn đoán, chỉ chạy ở mức DEBUG)
+                if logger.isEnabledFor(logging.DEBUG):
+                    status_counts = db.query(Order.status, func.count(Order.id)).filter(
+                        Order.time_in >= start_dt,
+                        Order.time_in <= end_dt
+                    ).group_by(Order.status).all()
+                    
+                    logger.debug("Orders count by status:")
+                    for status, count in status_counts:
+                        logger.debug(f"- Status {status}: {count} orders")
                 
             except Exception as e:
                 logger.error(f"Invalid date format: {str(e)}")
                 raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-        # Log SQL query
-        logger.info(f"SQL Query: {query.statement.compile(compile_kwargs={'literal_binds': True})}")
+        # Log SQL query (compile literal_binds tốn CPU, chỉ làm khi bật DEBUG)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"SQL Query: {query.statement.compile(compile_kwargs={'literal_binds': True})}")
 
-        # Lấy tổng số orders trước khi phân trang
-        total_orders = query.count()
-        logger.info(f"Total orders found before pagination: {total_orders}")
+        # Chỉ đếm tổng số orders khi client yêu cầu (COUNT(*) tốn kém khi lịch sử lớn)
+        if include_total:
+            total_orders = query.count()
+            response.headers["X-Total-Count"] = str(total_orders)
+            logger.info(f"Total orders found before pagination: {total_orders}")
 
         # Lấy danh sách orders với phân trang - sắp xếp theo thời gian mới nhất
-        orders = query.order_by(Order.time_in.desc()).offset(skip).limit(limit).all()
+        orders, next_cursor = paginate_orders(query, skip=skip, limit=limit, cursor=cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         logger.info(f"Orders after pagination: {len(orders)}")
         
         # Log chi tiết từng order
-        for order in orders:
-            logger.info(f"Order {order.id}: status={order.status}, payment_status={order.payment_status}, time_in={order.time_in}, shift_id={order.shift_id}")
+        if logger.isEnabledFor(logging.DEBUG):
+            for order in orders:
+                logger.debug(f"Order {order.id}: status={order.status}, payment_status={order.payment_status}, time_in={order.time_in}, shift_id={order.shift_id}")
         
-        result = []
-        current_time = get_vietnam_time()
-        
-        for order in orders:
-            try:
-                # Lấy thông tin items và join với menu_items để lấy tên món
-                items = db.query(
-                    OrderItem,
-                    MenuItem.name.label('name')
-                ).join(
-                    MenuItem,
-                    OrderItem.menu_item_id == MenuItem.id
-                ).filter(
-                    OrderItem.order_id == order.id
-                ).all()
-                
-                # Chuyển đổi kết quả thành dict và thêm trường name
-                order_items = []
-                for item, name in items:
-                    item_dict = {
-                        "id": item.id,
-                        "order_id": item.order_id,
-                        "menu_item_id": item.menu_item_id,
-                        "quantity": item.quantity,
-                        "unit_price": item.unit_price,
-                        "total_price": item.total_price,
-                        "note": item.note,
-                        "name": name
-                    }
-                    order_items.append(item_dict)
-                
-                # Xử lý trạng thái order
-                status = order.status
-                if status is None:
-                    status = "pending"
-                elif isinstance(status, str):
-                    status = status.lower()
-                else:
-                    status = str(status).lower()
-                
-                # Xử lý payment_status
-                payment_status = order.payment_status
-                if payment_status is None:
-                    payment_status = "unpaid"
-                elif isinstance(payment_status, str):
-                    payment_status = payment_status.lower()
-                else:
-                    payment_status = str(payment_status).lower()
-                
-                order_dict = {
-                    "id": order.id,
-                    "table_id": order.table_id,
-                    "staff_id": order.staff_id,
-                    "shift_id": order.shift_id,
-                    "status": status,
-                    "total_amount": order.total_amount,
-                    "note": order.note,
-                    "order_code": order.order_code,
-                    "payment_status": payment_status,
-                    "time_in": ensure_timezone(order.time_in) if order.time_in else current_time,
-                    "time_out": ensure_timezone(order.time_out) if order.time_out else None,
-                    "items": order_items if order_items else [{
-                        "id": 0,
-                        "order_id": order.id,
-                        "menu_item_id": 0,
-                        "quantity": 0,
-                        "unit_price": 0,
-                        "total_price": 0,
-                        "note": "",
-                        "name": "Không có món ăn"
-                    }]
-                }
-                
-                result.append(order_dict)
-                logger.info(f"Successfully processed order {order.id} with status={status}, payment_status={payment_status}")
-                
-            except Exception as e:
-                logger.error(f"Error processing order {order.id}: {str(e)}")
-                continue
+        # Lấy items của cả trang order bằng một query rồi dựng response
+        result = load_order_responses(db, orders, get_vietnam_time())
         
         logger.info(f"=== KẾT THÚC GET ORDERS - Trả về {len(result)} orders ===")
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in get_orders: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -314,31 +182,8 @@ async def get_order_by_id(
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
         
-        # Lấy thông tin items và join với menu_items để lấy tên món
-        items = db.query(
-            OrderItem,
-            MenuItem.name.label('name')
-        ).join(
-            MenuItem,
-            OrderItem.menu_item_id == MenuItem.id
-        ).filter(
-            OrderItem.order_id == order_id
-        ).all()
-        
-        # Chuyển đổi kết quả thành dict và thêm trường name
-        order_items = []
-        for item, name in items:
-            item_dict = {
-                "id": item.id,
-                "order_id": item.order_id,
-                "menu_item_id": item.menu_item_id,
-                "quantity": item.quantity,
-                "unit_price": item.unit_price,
-                "total_price": item.total_price,
-                "note": item.note,
-                "name": name
-            }
-            order_items.append(item_dict)
+        # Lấy thông tin items, tên món tra từ menu cache
+        order_items = fetch_order_items(db, [order_id]).get(order_id, [])
         
         # Tạo response
         response = {
@@ -367,6 +212,12 @@ async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
         start_time = get_vietnam_time()
         logger.info(f"Starting order creation at {start_time}")
 
+        # Kiểm tra toàn bộ menu_item_id bằng một câu IN trước khi ghi
+        menu_items = get_menu_items_by_ids(db, (item.menu_item_id for item in order.items))
+        missing_ids = sorted({item.menu_item_id for item in order.items} - menu_items.keys())
+        if missing_ids:
+            raise HTTPException(status_code=400, detail=f"Không tìm thấy món với ID: {missing_ids}")
+
         # Tạo order mới với time_in theo múi giờ Việt Nam
         new_order = Order(
             table_id=order.table_id,
@@ -384,24 +235,16 @@ async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
         db.flush()
         logger.info(f"Order created with ID: {new_order.id}")
 
-        # Tạo các order items
-        for item in order.items:
-            new_item = OrderItem(
-                order_id=new_order.id,
-                menu_item_id=item.menu_item_id,
-                quantity=item.quantity,
-                unit_price=item.unit_price,
-                total_price=item.total_price,
-                note=item.note
-            )
-            db.add(new_item)
-
-        # Cập nhật trạng thái bàn thành available
-        table = db.query(Table).filter(Table.id == new_order.table_id).first()
-        if table:
-            table.status = "available"
-            db.add(table) # Mark as dirty to ensure update
-            logger.info(f"Đã cập nhật trạng thái bàn {table.id} thành available")
+        # Tạo các order items bằng một lệnh INSERT nhiều dòng
+        bulk_create_order_items(db, new_order.id, order.items)
+        sales_rollup.apply(db, [new_order.id])
+
+        # Cập nhật trạng thái bàn thành available (cùng transaction)
+        updated = db.query(Table).filter(Table.id == new_order.table_id).update(
+            {Table.status: "available"}, synchronize_session=False
+        )
+        if updated:
+            logger.info(f"Đã cập nhật trạng thái bàn {new_order.table_id} thành available")
         else:
             logger.warning(f"Không tìm thấy bàn với ID {new_order.table_id} để cập nhật trạng thái.")
 
@@ -409,31 +252,11 @@ async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
         db.refresh(new_order)
         logger.info("Order items created and committed")
 
-        # Lấy thông tin items và join với menu_items để lấy tên món
-        items = db.query(
-            OrderItem,
-            MenuItem.name.label('name')
-        ).join(
-            MenuItem,
-            OrderItem.menu_item_id == MenuItem.id
-        ).filter(
-            OrderItem.order_id == new_order.id
-        ).all()
-
-        # Chuyển đổi kết quả thành dict và thêm trường name
-        order_items = []
-        for item, name in items:
-            item_dict = {
-                "id": item.id,
-                "order_id": item.order_id,
-                "menu_item_id": item.menu_item_id,
-                "quantity": item.quantity,
-                "unit_price": item.unit_price,
-                "total_price": item.total_price,
-                "note": item.note,
-                "name": name
-            }
-            order_items.append(item_dict)
+        # Đẩy trạng thái bàn mới tới các màn hình sơ đồ bàn
+        await table_feed.publish(db, [new_order.table_id])
+
+        # Lấy items vừa ghi kèm tên món bằng một query
+        order_items = fetch_order_items(db, [new_order.id]).get(new_order.id, [])
 
         # Tạo response
         response = {
@@ -453,7 +276,7 @@ async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
 
         # Gửi thông báo cập nhật order chung (không phải lệnh in tới máy in vật lý)
         logger.info("Broadcasting order update to general connections")
-        await manager.broadcast({
+        hub.publish("orders", {
             "type": "order_update",
             "data": {
                 "type": "created",
@@ -465,110 +288,31 @@ async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
                 }
             }
         })
-        
-        # Lấy thông tin bàn
-        table = db.query(Table).filter(Table.id == response['table_id']).first()
-
-        # Gửi bill tới tất cả các máy in đang kết nối qua WebSocket
-        bill_lines = [
-            {"text": "PHIẾU LÀM ĐỒ", "fontSize": 14, "fontName": "Arial Black", "bold": True, "align": "center"},
-            {"text": f"Bàn: {table.name if table else 'Bàn ' + str(response['table_id'])}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": f"Thời gian: {response['time_in'].strftime('%H:%M')} --- {response['time_in'].strftime('%d/%m/%Y')}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-        ]
 
-        # Header của bảng (33 ký tự tổng cộng)
-        # Tên hàng (20) | SL (4) | TIỀN (9) = 33
-        header_name_part = "TÊN HÀNG".ljust(NAME_COL_WIDTH)
-        header_qty_part = "SL".center(QTY_COL_WIDTH)
-        header_total_price_part = "TIỀN".rjust(PRICE_COL_WIDTH)
-        bill_lines.append({"text": f"{header_name_part}{header_qty_part}{header_total_price_part}", "fontSize": 12, "bold": True, "align": "left"})
-        bill_lines.append({"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"})
-
-        total_amount = 0
-        for item in response["items"]:
-            item_total = item['total_price']
-            total_amount += item_total
-            
-            # Format quantity and total price
-            qty_str = f"x{item['quantity']}" # "x3"
-            total_price_str = f"{int(item_total):,}" # e.g., "120,000"
-
-            # Pad quantity and total price to fixed widths
-            item_qty_part = qty_str.center(QTY_COL_WIDTH)
-            item_total_price_part = total_price_str.rjust(PRICE_COL_WIDTH)
-
-            # Wrap the item name, first line will take full width
-            wrapped_name_lines = textwrap.wrap(item['name'], width=NAME_COL_WIDTH)
-
-            # Add the first line with name, quantity, total price
-            if wrapped_name_lines:
-                first_name_part = wrapped_name_lines[0].ljust(NAME_COL_WIDTH)
-                item_line_text = f"{first_name_part}{item_qty_part}{item_total_price_part}"
-                bill_lines.append({
-                    "text": item_line_text,
-                    "fontSize": 12, "bold": False, "align": "left"
-                })
-
-                # Add subsequent lines for wrapped name parts (indented)
-                for i in range(1, len(wrapped_name_lines)):
-                    bill_lines.append({
-                        "text": "  " + wrapped_name_lines[i].ljust(NAME_COL_WIDTH - 2), # Indent wrapped lines by 2 spaces
-                        "fontSize": 12, "bold": False, "align": "left"
-                    })
-            else:
-                # Handle empty name (should not happen with menu items)
-                item_line_text = f"{''.ljust(NAME_COL_WIDTH)}{item_qty_part}{item_total_price_part}"
-                bill_lines.append({
-                    "text": item_line_text,
-                    "fontSize": 12, "bold": False, "align": "left"
-                })
-            
-            if item.get("note"):
-                # Ghi chú thụt lề
-                bill_lines.append({"text": f"  Ghi chú: {item['note']}", "fontSize": 12, "bold": False, "align": "left"})
-
-        # Thêm tổng tiền (33 ký tự tổng cộng)
-        total_amount_str = f"{int(total_amount):,}" # e.g., "120,000"
-        
-        # Định dạng dòng tổng tiền
-        total_label_width = NAME_COL_WIDTH + QTY_COL_WIDTH
-        total_label_part = "TỔNG TIỀN:".ljust(total_label_width)
-        total_amount_part = total_amount_str.rjust(PRICE_COL_WIDTH)
-        
-        bill_lines.extend([
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-            {"text": f"{total_label_part}{total_amount_part}", "fontSize": 14, "bold": True, "align": "left"},
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-        ])
-
-        # Gửi tới tất cả các máy in đang kết nối qua WebSocket
-        logger.info("Gửi dữ liệu in qua WebSocket")
-        logger.info(f"Số lượng kết nối đang hoạt động: {len(printer_manager.active_printers)}")
-        logger.info(f"Dữ liệu in: {bill_lines}")
-        
-        success = False
-        for printer_id in printer_manager.active_printers.keys():
-            try:
-                result = await printer_manager.send_to_printer(printer_id, {
-                    "type": "print",
-                    "data": bill_lines,
-                    "timestamp": datetime.now().isoformat()  # Chuyển datetime thành string
-                })
-                if result:
-                    success = True
-                    logger.info(f"Đã gửi dữ liệu tới printer {printer_id}")
-            except Exception as e:
-                logger.error(f"Lỗi khi gửi dữ liệu tới printer {printer_id}: {str(e)}")
+        # Màn hình bếp chỉ cần danh sách món của order
+        hub.publish("kitchen", {
+            "type": "kitchen_ticket",
+            "data": {
+                "event": "created",
+                "order_id": response["id"],
+                "table_id": response["table_id"],
+                "items": order_items,
+                "timestamp": datetime.now().isoformat()
+            }
+        })
         
-        if not success:
-            logger.error("Không thể gửi dữ liệu tới bất kỳ máy in nào")
+        # Mỗi quầy (bar, bếp...) nhận phiếu chỉ gồm các món của quầy đó
+        time_text = f"{response['time_in'].strftime('%H:%M')} --- {response['time_in'].strftime('%d/%m/%Y')}"
+        submit_kitchen_tickets(db, response["id"], response["table_id"], time_text, response["items"], kind="order_created")
 
         end_time = get_vietnam_time()
         logger.info(f"Order creation completed in {(end_time - start_time).total_seconds()} seconds")
 
         return response
 
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Error creating order: {str(e)}")
@@ -584,18 +328,23 @@ async def pay_order(order_id: int, db: Session = Depends(get_db)):
         if not order:
             logger.error(f"Order {order_id} không tồn tại")
             raise HTTPException(status_code=404, detail="Order not found")
+        rollup_before = sales_rollup.snapshot(db, [order_id])
             
         # Cập nhật trạng thái order
         order.status = "completed"
         order.payment_status = "paid"
         order.time_out = get_vietnam_time()
+        sales_rollup.apply(db, [order_id], rollup_before)
         
         try:
             db.commit()
             logger.info(f"Đã cập nhật trạng thái order {order_id} thành công")
+
+            # Đẩy trạng thái bàn mới tới các màn hình sơ đồ bàn
+            await table_feed.publish(db, [order.table_id])
             
             # Broadcast thông báo cập nhật order
-            await manager.broadcast({
+            hub.publish("orders", {
                 "type": "order_status_update",
                 "data": {
                     "order_id": order_id,
@@ -604,7 +353,7 @@ async def pay_order(order_id: int, db: Session = Depends(get_db)):
                     "timestamp": datetime.now().isoformat(),
                     "date": order.time_out.strftime("%d/%m/%Y") if order.time_out else None
                 }
-            })
+            }, coalesce_key=("order_status_update", order_id))
             
             return order
             
@@ -646,27 +395,27 @@ async def update_order(order_id: int, order: OrderUpdate, db: Session = Depends(
     
     try:
         # Log thông tin order được gửi lên
-        logger.info(f"Payload nhận được: {order.dict()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Payload nhận được: {order.dict()}")
         
         # Lấy order hiện tại
         current_order = db.query(Order).filter(Order.id == order_id).first()
         if not current_order:
             logger.error(f"Order {order_id} not found")
             raise HTTPException(status_code=404, detail="Order not found")
+        rollup_before = sales_rollup.snapshot(db, [order_id])
 
         # Log thông tin order hiện tại
-        logger.info(f"\nThông tin order hiện tại:")
-        logger.info(f"- ID: {current_order.id}")
-        logger.info(f"- Table ID: {current_order.table_id}")
-        logger.info(f"- Staff ID: {current_order.staff_id}")
-        logger.info(f"- Shift ID: {current_order.shift_id}")
-        logger.info(f"- Status: {current_order.status}")
-        logger.info(f"- Time In: {current_order.time_in}")
-        logger.info(f"- Payment Status: {current_order.payment_status}")
-
-        # Lưu lại time_in cũ và shift_id cũ
+        logger.debug(
+            "Thông tin order hiện tại: id=%s table_id=%s staff_id=%s shift_id=%s status=%s time_in=%s payment_status=%s",
+            current_order.id, current_order.table_id, current_order.staff_id, current_order.shift_id,
+            current_order.status, current_order.time_in, current_order.payment_status
+        )
+
+        # Lưu lại time_in cũ, shift_id cũ và bàn cũ (trước khi áp update_data)
         old_time_in = ensure_timezone(current_order.time_in)
         old_shift_id = current_order.shift_id
+        old_table_id = current_order.table_id
         logger.info(f"\nLưu lại time_in cũ: {old_time_in}")
         logger.info(f"Lưu lại shift_id cũ: {old_shift_id}")
 
@@ -686,69 +435,26 @@ async def update_order(order_id: int, order: OrderUpdate, db: Session = Depends(
         current_order.time_in = old_time_in
         current_order.shift_id = old_shift_id
 
-        # Lấy danh sách món cũ từ database trước khi xóa
-        old_items_db = db.query(OrderItem).filter(OrderItem.order_id == order_id).all()
-        # Gom nhóm theo (menu_item_id, note) và cộng dồn quantity
-        old_items_map = {}
-        for item in old_items_db:
-            key = (item.menu_item_id, item.note or "")
-            old_items_map[key] = old_items_map.get(key, 0) + item.quantity
-
-        # Xử lý items nếu có
+        # Đồng bộ items theo (menu_item_id, note): chỉ ghi các dòng thay đổi,
+        # item_changes là delta số lượng để in phiếu bếp dùng lại
+        item_changes = []
         if order.items:
-            # Xóa tất cả items cũ
-            db.query(OrderItem).filter(OrderItem.order_id == order_id).delete()
-            # Tạo items mới
-            for item in order.items:
-                new_item = OrderItem(
-                    order_id=order_id,
-                    menu_item_id=item.menu_item_id,
-                    quantity=item.quantity,
-                    unit_price=item.unit_price,
-                    total_price=item.total_price,
-                    note=item.note
-                )
-                db.add(new_item)
-                logger.info(f"Thêm item mới: menu_item_id={item.menu_item_id}, quantity={item.quantity}")
+            item_changes = sync_order_items(db, order_id, order.items)
+            logger.info(f"Số món thay đổi: {len(item_changes)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Delta items: {item_changes}")
+        sales_rollup.apply(db, [order_id], rollup_before)
 
         # Commit thay đổi
         db.commit()
         db.refresh(current_order)
         logger.info("\nĐã commit thay đổi")
 
+        # Đẩy trạng thái bàn (cả bàn cũ nếu order đổi bàn) tới các màn hình sơ đồ bàn
+        await table_feed.publish(db, [old_table_id, current_order.table_id])
+
         # Lấy thông tin items mới với tên
-        items = db.query(
-            OrderItem,
-            MenuItem.name.label('name')
-        ).join(
-            MenuItem,
-            OrderItem.menu_item_id == MenuItem.id
-        ).filter(
-            OrderItem.order_id == current_order.id
-        ).all()
-
-        # Gom nhóm món mới theo (menu_item_id, note)
-        new_items_map = {}
-        name_map = {}
-        for item, name in items:
-            key = (item.menu_item_id, item.note or "")
-            new_items_map[key] = new_items_map.get(key, 0) + item.quantity
-            name_map[key] = name
-
-        # Tạo danh sách items cho response
-        order_items = []
-        for item, name in items:
-            item_dict = {
-                "id": item.id,
-                "order_id": item.order_id,
-                "menu_item_id": item.menu_item_id,
-                "quantity": item.quantity,
-                "unit_price": item.unit_price,
-                "total_price": item.total_price,
-                "note": item.note,
-                "name": name
-            }
-            order_items.append(item_dict)
+        order_items = fetch_order_items(db, [current_order.id]).get(current_order.id, [])
 
         # Tạo response
         response_dict = {
@@ -768,114 +474,37 @@ async def update_order(order_id: int, order: OrderUpdate, db: Session = Depends(
 
         # Gửi thông báo cập nhật order chung (không phải lệnh in tới máy in vật lý)
         logger.info("Broadcasting order update to general connections")
-        await manager.broadcast({
+        hub.publish("orders", {
             "type": "order_update",
             "data": {
                 "type": "updated",
                 "order": {
                     **response_dict,
                     "date": response_dict["time_in"].strftime("%d/%m/%Y") if response_dict["time_in"] else None
-                }
+                },
+                "item_changes": item_changes
             }
-        })
-        
-        # Lấy thông tin bàn
-        table = db.query(Table).filter(Table.id == response_dict['table_id']).first()
-
-        # Gửi bill tới tất cả các máy in đang kết nối qua WebSocket
-        bill_lines = [
-            {"text": "PHIẾU LÀM ĐỒ", "fontSize": 14, "fontName": "Arial Black", "bold": True, "align": "center"},
-            {"text": f"Bàn: {table.name if table else 'Bàn ' + str(response_dict['table_id'])}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": f"Thời gian: {response_dict['time_in'].strftime('%H:%M')}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-        ]
+        }, coalesce_key=("order_update", order_id))
 
-        # Header của bảng (33 ký tự tổng cộng)
-        # Tên hàng (20) | SL (4) | TIỀN (9) = 33
-        header_name_part = "TÊN HÀNG".ljust(NAME_COL_WIDTH)
-        header_qty_part = "SL".center(QTY_COL_WIDTH)
-        header_total_price_part = "TIỀN".rjust(PRICE_COL_WIDTH)
-        bill_lines.append({"text": f"{header_name_part}{header_qty_part}{header_total_price_part}", "fontSize": 12, "bold": True, "align": "left"})
-        bill_lines.append({"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"})
-
-        total_amount = 0
-        for item in response_dict["items"]:
-            item_total = item['total_price']
-            total_amount += item_total
-            
-            # Format quantity and total price
-            qty_str = f"x{item['quantity']}" # "x3"
-            total_price_str = f"{int(item_total):,}" # e.g., "120,000"
-
-            # Pad quantity and total price to fixed widths
-            item_qty_part = qty_str.center(QTY_COL_WIDTH)
-            item_total_price_part = total_price_str.rjust(PRICE_COL_WIDTH)
-
-            # Wrap the item name, first line will take full width
-            wrapped_name_lines = textwrap.wrap(item['name'], width=NAME_COL_WIDTH)
-
-            # Add the first line with name, quantity, total price
-            if wrapped_name_lines:
-                first_name_part = wrapped_name_lines[0].ljust(NAME_COL_WIDTH)
-                item_line_text = f"{first_name_part}{item_qty_part}{item_total_price_part}"
-                bill_lines.append({
-                    "text": item_line_text,
-                    "fontSize": 12, "bold": False, "align": "left"
-                })
-
-                # Add subsequent lines for wrapped name parts (indented)
-                for i in range(1, len(wrapped_name_lines)):
-                    bill_lines.append({
-                        "text": "  " + wrapped_name_lines[i].ljust(NAME_COL_WIDTH - 2), # Indent wrapped lines by 2 spaces
-                        "fontSize": 12, "bold": False, "align": "left"
-                    })
-            else:
-                # Handle empty name (should not happen with menu items)
-                item_line_text = f"{''.ljust(NAME_COL_WIDTH)}{item_qty_part}{item_total_price_part}"
-                bill_lines.append({
-                    "text": item_line_text,
-                    "fontSize": 12, "bold": False, "align": "left"
-                })
-            
-            if item.get("note"):
-                # Ghi chú thụt lề
-                bill_lines.append({"text": f"  Ghi chú: {item['note']}", "fontSize": 12, "bold": False, "align": "left"})
-
-        # Thêm tổng tiền (33 ký tự tổng cộng)
-        total_amount_str = f"{int(total_amount):,}" # e.g., "120,000"
-        
-        # Định dạng dòng tổng tiền
-        total_label_width = NAME_COL_WIDTH + QTY_COL_WIDTH
-        total_label_part = "TỔNG TIỀN:".ljust(total_label_width)
-        total_amount_part = total_amount_str.rjust(PRICE_COL_WIDTH)
-        
-        bill_lines.extend([
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-            {"text": f"{total_label_part}{total_amount_part}", "fontSize": 14, "bold": True, "align": "left"},
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-        ])
-
-        # Gửi tới tất cả các máy in đang kết nối qua WebSocket
-        logger.info("Gửi dữ liệu in qua WebSocket")
-        logger.info(f"Số lượng kết nối đang hoạt động: {len(printer_manager.active_printers)}")
-        logger.info(f"Dữ liệu in: {bill_lines}")
-        
-        success = False
-        for printer_id in printer_manager.active_printers.keys():
-            try:
-                result = await printer_manager.send_to_printer(printer_id, {
-                    "type": "print",
-                    "data": bill_lines,
-                    "timestamp": datetime.now().isoformat()  # Chuyển datetime thành string
-                })
-                if result:
-                    success = True
-                    logger.info(f"Đã gửi dữ liệu tới printer {printer_id}")
-            except Exception as e:
-                logger.error(f"Lỗi khi gửi dữ liệu tới printer {printer_id}: {str(e)}")
+        if item_changes:
+            hub.publish("kitchen", {
+                "type": "kitchen_ticket",
+                "data": {
+                    "event": "updated",
+                    "order_id": order_id,
+                    "table_id": response_dict["table_id"],
+                    "items": order_items,
+                    "item_changes": item_changes,
+                    "timestamp": datetime.now().isoformat()
+                }
+            })
         
-        if not success:
-            logger.error("Không thể gửi dữ liệu tới bất kỳ máy in nào")
+        time_text = response_dict['time_in'].strftime('%H:%M')
+        if KITCHEN_TICKET_MODE == "full" or old_table_id != current_order.table_id:
+            submit_kitchen_tickets(db, order_id, response_dict["table_id"], time_text, response_dict["items"], kind="order_updated")
+        elif item_changes:
+            # Chỉ in các món thay đổi; phiếu đầy đủ in lại qua POST /{order_id}/kitchen-ticket
+            submit_delta_tickets(db, order_id, response_dict["table_id"], time_text, item_changes)
 
         return response_dict
 
@@ -918,7 +547,8 @@ async def transfer_table(
         #     raise HTTPException(status_code=400, detail="Bàn mới đang được sử dụng")
 
         # Lấy bàn cũ
-        old_table = db.query(Table).filter(Table.id == current_order.table_id).first()
+        old_table_id = current_order.table_id
+        old_table = db.query(Table).filter(Table.id == old_table_id).first()
         
         # Cập nhật trạng thái bàn cũ
         if old_table:
@@ -941,31 +571,11 @@ async def transfer_table(
         db.refresh(current_order)
         logger.info("Đã commit thay đổi")
 
+        # Đẩy trạng thái bàn cũ và bàn mới tới các màn hình sơ đồ bàn
+        await table_feed.publish(db, [old_table_id, current_order.table_id])
+
         # Lấy thông tin items mới với tên
-        items = db.query(
-            OrderItem,
-            MenuItem.name.label('name')
-        ).join(
-            MenuItem,
-            OrderItem.menu_item_id == MenuItem.id
-        ).filter(
-            OrderItem.order_id == current_order.id
-        ).all()
-
-        # Tạo danh sách items cho response
-        order_items = []
-        for item, name in items:
-            item_dict = {
-                "id": item.id,
-                "order_id": item.order_id,
-                "menu_item_id": item.menu_item_id,
-                "quantity": item.quantity,
-                "unit_price": item.unit_price,
-                "total_price": item.total_price,
-                "note": item.note,
-                "name": name
-            }
-            order_items.append(item_dict)
+        order_items = fetch_order_items(db, [current_order.id]).get(current_order.id, [])
 
         # Tạo response
         response_dict = {
@@ -985,7 +595,7 @@ async def transfer_table(
 
         # Gửi thông báo cập nhật order chung (không phải lệnh in tới máy in vật lý)
         logger.info("Broadcasting order update to general connections")
-        await manager.broadcast({
+        hub.publish("orders", {
             "type": "order_update",
             "data": {
                 "type": "transferred",
@@ -994,105 +604,13 @@ async def transfer_table(
                     "date": response_dict["time_in"].strftime("%d/%m/%Y") if response_dict["time_in"] else None
                 }
             }
-        })
+        }, coalesce_key=("order_update", order_id))
         
-        # Lấy thông tin bàn
-        table = db.query(Table).filter(Table.id == response_dict['table_id']).first()
-
-        # Gửi bill tới tất cả các máy in đang kết nối qua WebSocket
-        bill_lines = [
-            {"text": "PHIẾU LÀM ĐỒ", "fontSize": 14, "fontName": "Arial Black", "bold": True, "align": "center"},
-            {"text": f"Bàn: {table.name if table else 'Bàn ' + str(response_dict['table_id'])}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": f"Thời gian: {response_dict['time_in'].strftime('%H:%M')}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-        ]
-
-        # Header của bảng (33 ký tự tổng cộng)
-        # Tên hàng (20) | SL (4) | TIỀN (9) = 33
-        header_name_part = "TÊN HÀNG".ljust(NAME_COL_WIDTH)
-        header_qty_part = "SL".center(QTY_COL_WIDTH)
-        header_total_price_part = "TIỀN".rjust(PRICE_COL_WIDTH)
-        bill_lines.append({"text": f"{header_name_part}{header_qty_part}{header_total_price_part}", "fontSize": 12, "bold": True, "align": "left"})
-        bill_lines.append({"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"})
-
-        total_amount = 0
-        for item in response_dict["items"]:
-            item_total = item['total_price']
-            total_amount += item_total
-            
-            # Format quantity and total price
-            qty_str = f"x{item['quantity']}" # "x3"
-            total_price_str = f"{int(item_total):,}" # e.g., "120,000"
-
-            # Pad quantity and total price to fixed widths
-            item_qty_part = qty_str.center(QTY_COL_WIDTH)
-            item_total_price_part = total_price_str.rjust(PRICE_COL_WIDTH)
-
-            # Wrap the item name, first line will take full width
-            wrapped_name_lines = textwrap.wrap(item['name'], width=NAME_COL_WIDTH)
-
-            # Add the first line with name, quantity, total price
-            if wrapped_name_lines:
-                first_name_part = wrapped_name_lines[0].ljust(NAME_COL_WIDTH)
-                item_line_text = f"{first_name_part}{item_qty_part}{item_total_price_part}"
-                bill_lines.append({
-                    "text": item_line_text,
-                    "fontSize": 12, "bold": False, "align": "left"
-                })
-
-                # Add subsequent lines for wrapped name parts (indented)
-                for i in range(1, len(wrapped_name_lines)):
-                    bill_lines.append({
-                        "text": "  " + wrapped_name_lines[i].ljust(NAME_COL_WIDTH - 2), # Indent wrapped lines by 2 spaces
-                        "fontSize": 12, "bold": False, "align": "left"
-                    })
-            else:
-                # Handle empty name (should not happen with menu items)
-                item_line_text = f"{''.ljust(NAME_COL_WIDTH)}{item_qty_part}{item_total_price_part}"
-                bill_lines.append({
-                    "text": item_line_text,
-                    "fontSize": 12, "bold": False, "align": "left"
-                })
-            
-            if item.get("note"):
-                # Ghi chú thụt lề
-                bill_lines.append({"text": f"  Ghi chú: {item['note']}", "fontSize": 12, "bold": False, "align": "left"})
-
-        # Thêm tổng tiền (33 ký tự tổng cộng)
-        total_amount_str = f"{int(total_amount):,}" # e.g., "120,000"
-        
-        # Định dạng dòng tổng tiền
-        total_label_width = NAME_COL_WIDTH + QTY_COL_WIDTH
-        total_label_part = "TỔNG TIỀN:".ljust(total_label_width)
-        total_amount_part = total_amount_str.rjust(PRICE_COL_WIDTH)
-        
-        bill_lines.extend([
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-            {"text": f"{total_label_part}{total_amount_part}", "fontSize": 14, "bold": True, "align": "left"},
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-        ])
-
-        # Gửi tới tất cả các máy in đang kết nối qua WebSocket
-        logger.info("Gửi dữ liệu in qua WebSocket")
-        logger.info(f"Số lượng kết nối đang hoạt động: {len(printer_manager.active_printers)}")
-        logger.info(f"Dữ liệu in: {bill_lines}")
-        
-        success = False
-        for printer_id in printer_manager.active_printers.keys():
-            try:
-                result = await printer_manager.send_to_printer(printer_id, {
-                    "type": "print",
-                    "data": bill_lines,
-                    "timestamp": datetime.now().isoformat()  # Chuyển datetime thành string
-                })
-                if result:
-                    success = True
-                    logger.info(f"Đã gửi dữ liệu tới printer {printer_id}")
-            except Exception as e:
-                logger.error(f"Lỗi khi gửi dữ liệu tới printer {printer_id}: {str(e)}")
-        
-        if not success:
-            logger.error("Không thể gửi dữ liệu tới bất kỳ máy in nào")
+        # Mỗi quầy (bar, bếp...) nhận phiếu đầy đủ với bàn mới
+        submit_kitchen_tickets(
+            db, order_id, response_dict["table_id"], response_dict['time_in'].strftime('%H:%M'),
+            response_dict["items"], kind="table_transfer"
+        )
 
         logger.info(f"{'='*50}")
         logger.info("KẾT THÚC CHUYỂN BÀN")
@@ -1121,6 +639,8 @@ async def merge_orders(request: MergeOrdersRequest, db: Session = Depends(get_db
     if len(orders) < 2:
         raise HTTPException(status_code=400, detail="Không đủ order để gộp")
     table_id = orders[0].table_id
+    affected_table_ids = [order.table_id for order in orders]
+    rollup_before = sales_rollup.snapshot(db, [order.id for order in orders])
     # Gộp các món giống nhau
     merged_items = {}
     for order in orders:
@@ -1165,6 +685,7 @@ async def merge_orders(request: MergeOrdersRequest, db: Session = Depends(get_db
     for order in orders:
         db.query(OrderItem).filter(OrderItem.order_id == order.id).delete()
         db.delete(order)
+    sales_rollup.apply(db, [order.id for order in orders] + [new_order.id], rollup_before)
 
     # Cập nhật trạng thái của bàn liên quan đến order mới thành 'available'
     table = db.query(Table).filter(Table.id == new_order.table_id).first()
@@ -1176,6 +697,9 @@ async def merge_orders(request: MergeOrdersRequest, db: Session = Depends(get_db
         logger.warning(f"Không tìm thấy bàn với ID {new_order.table_id} để cập nhật trạng thái sau khi gộp order.")
 
     db.commit()
+
+    # Đẩy trạng thái các bàn liên quan tới các màn hình sơ đồ bàn
+    await table_feed.publish(db, affected_table_ids)
     return {"success": True, "order_id": new_order.id}
 
 class OrderRecentResponse(BaseModel):
@@ -1202,6 +726,30 @@ def get_recent_orders(db: Session = Depends(get_db)):
         })
     return result
 
+@router.post("/{order_id}/kitchen-ticket")
+async def print_kitchen_ticket(order_id: int, station: Optional[str] = None, db: Session = Depends(get_db)):
+    """In lại phiếu làm đồ đầy đủ của order (ví dụ sau các phiếu sửa đồ), có thể chỉ cho một quầy"""
+    try:
+        order = db.query(Order).filter(Order.id == order_id).first()
+        if not order:
+            return {"error": "Không tìm thấy order"}
+
+        items = fetch_order_items(db, [order_id]).get(order_id, [])
+        if not items:
+            return {"error": "Order không có món nào"}
+
+        jobs = submit_kitchen_tickets(
+            db, order_id, order.table_id, ensure_timezone(order.time_in).strftime('%H:%M'), items,
+            kind="kitchen_reprint", station=station
+        )
+        if not jobs:
+            return {"error": "Order không có món nào của quầy này"}
+        return {"success": True, "message": "Đã gửi phiếu làm đồ tới máy in", "job_ids": [job.id for job in jobs]}
+
+    except Exception as e:
+        logger.error(f"Lỗi khi in phiếu làm đồ: {str(e)}")
+        return {"error": f"Lỗi khi in phiếu làm đồ: {str(e)}"}
+
 @router.post("/print-order")
 async def print_order(order_id: int, db: Session = Depends(get_db)):
     try:
@@ -1220,107 +768,15 @@ async def print_order(order_id: int, db: Session = Depends(get_db)):
         if not shift:
             return {"error": "Không tìm thấy thông tin ca"}
 
-        # Lấy danh sách items
-        items = db.query(OrderItem, MenuItem).join(
-            MenuItem, OrderItem.menu_item_id == MenuItem.id
-        ).filter(OrderItem.order_id == order_id).all()
+        # Format bill theo khổ giấy của máy in
+        bill_lines = order_receipt_lines(db, order, table.name, shift.shift_type, paper_width_cache.columns())
 
-        # Format bill
-        bill_lines = [
-            {"text": "HÓA ĐƠN", "fontSize": 14, "fontName": "Arial Black", "bold": True, "align": "center"},
-            {"text": f"Bàn: {table.name}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": f"Ca: {shift.shift_type}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": f"Thời gian: {order.time_in.strftime('%d/%m/%Y %H:%M')}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": "---------------------------------", "fontSize": 12, "bold": False, "align": "left"},
-        ]
-
-        # Header của bảng (33 ký tự tổng cộng)
-        # Tên món (20) | SL (4) | TIỀN (9) = 33
-        header_name_part = "TÊN MÓN".ljust(NAME_COL_WIDTH)
-        header_qty_part = "SL".center(QTY_COL_WIDTH)
-        header_total_price_part = "TIỀN".rjust(PRICE_COL_WIDTH)
-        bill_lines.append({"text": f"{header_name_part}{header_qty_part}{header_total_price_part}", "fontSize": 12, "bold": True, "align": "left"})
-        bill_lines.append({"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"})
-
-        for item, menu_item in items:
-            item_total = item.total_price
-            
-            # Format quantity and total price
-            qty_str = f"x{item.quantity}" # "x3"
-            total_price_str = f"{int(item_total):,}" # e.g., "120,000"
-
-            # Pad quantity and total price to fixed widths
-            item_qty_part = qty_str.center(QTY_COL_WIDTH)
-            item_total_price_part = total_price_str.rjust(PRICE_COL_WIDTH)
-
-            # Wrap the item name, first line will take full width
-            wrapped_name_lines = textwrap.wrap(menu_item.name, width=NAME_COL_WIDTH)
-
-            # Add the first line with name, quantity, total price
-            if wrapped_name_lines:
-                first_name_part = wrapped_name_lines[0].ljust(NAME_COL_WIDTH)
-                item_line_text = f"{first_name_part}{item_qty_part}{item_total_price_part}"
-                bill_lines.append({
-                    "text": item_line_text,
-                    "fontSize": 12, "bold": False, "align": "left"
-                })
-
-                # Add subsequent lines for wrapped name parts (indented)
-                for i in range(1, len(wrapped_name_lines)):
-                    bill_lines.append({
-                        "text": "  " + wrapped_name_lines[i].ljust(NAME_COL_WIDTH - 2), # Indent wrapped lines by 2 spaces
-                        "fontSize": 12, "bold": False, "align": "left"
-                    })
-            else:
-                # Handle empty name (should not happen with menu items)
-                item_line_text = f"{''.ljust(NAME_COL_WIDTH)}{item_qty_part}{item_total_price_part}"
-                bill_lines.append({
-                    "text": item_line_text,
-                    "fontSize": 12, "bold": False, "align": "left"
-                })
-            
-            if item.note:
-                # Ghi chú thụt lề
-                bill_lines.append({"text": f"  Ghi chú: {item.note}", "fontSize": 12, "bold": False, "align": "left"})
-        
-        # Thêm tổng tiền (33 ký tự tổng cộng)
-        total_amount_str = f"{int(order.total_amount):,}" # e.g., "120,000"
-        
-        # Định dạng dòng tổng tiền
-        total_label_width = NAME_COL_WIDTH + QTY_COL_WIDTH
-        total_label_part = "Tổng tiền:".ljust(total_label_width)
-        total_amount_part = total_amount_str.rjust(PRICE_COL_WIDTH)
-        
-        bill_lines.extend([
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-            {"text": f"{total_label_part}{total_amount_part}", "fontSize": 14, "bold": True, "align": "left"},
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-            {"text": "Cảm ơn quý khách!", "fontSize": 12, "bold": False, "align": "center"},
-        ])
-
-        # Gửi tới tất cả các máy in đang kết nối qua WebSocket
-        logger.info("Gửi dữ liệu in qua WebSocket")
-        logger.info(f"Số lượng kết nối đang hoạt động: {len(printer_manager.active_printers)}")
-        logger.info(f"Dữ liệu in: {bill_lines}")
-        
-        success = False
-        for printer_id in printer_manager.active_printers.keys():
-            try:
-                result = await printer_manager.send_to_printer(printer_id, {
-                    "type": "print",
-                    "data": bill_lines,
-                    "timestamp": datetime.now().isoformat()  # Chuyển datetime thành string
-                })
-                if result:
-                    success = True
-                    logger.info(f"Đã gửi dữ liệu tới printer {printer_id}")
-            except Exception as e:
-                logger.error(f"Lỗi khi gửi dữ liệu tới printer {printer_id}: {str(e)}")
-        
-        if not success:
-            logger.warning("Không có máy in nào đang kết nối hoặc không thể gửi dữ liệu tới máy in")
+        # Xếp lệnh in vào hàng đợi, dispatcher gửi tới máy in ở nền (không chờ máy in)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Dữ liệu in: {bill_lines}")
+        print_job = print_queue.submit(bill_lines, kind="bill", order_id=order_id, station=STATION_CASHIER)
 
-        return {"success": True, "message": "Đã gửi hóa đơn tới máy in"}
+        return {"success": True, "message": "Đã gửi hóa đơn tới máy in", "job_id": print_job.id}
 
     except Exception as e:
         logger.error(f"Lỗi khi in hóa đơn: {str(e)}")
@@ -1351,122 +807,26 @@ async def print_combined_orders(request: CombinedOrdersRequest, db: Session = De
         if not shift:
             return {"error": "Không tìm thấy thông tin ca"}
 
-        # Lấy tất cả items từ các orders và gộp lại
-        all_items = db.query(OrderItem, MenuItem).join(
-            MenuItem, OrderItem.menu_item_id == MenuItem.id
-        ).filter(OrderItem.order_id.in_(request.order_ids)).all()
-
-        # Gộp items theo menu_item_id và note
-        items_map = {}
-        total_amount = 0
-        
-        for item, menu_item in all_items:
-            key = (item.menu_item_id, item.note or "")
-            if key not in items_map:
-                items_map[key] = {
-                    "menu_item": menu_item,
-                    "quantity": 0,
-                    "unit_price": item.unit_price,
-                    "total_price": 0,
-                    "note": item.note
-                }
-            items_map[key]["quantity"] += item.quantity
-            items_map[key]["total_price"] += item.total_price
-            total_amount += item.total_price
+        # Lấy tất cả items từ các orders và gộp lại theo menu_item_id và note
+        order_items = db.query(OrderItem).filter(OrderItem.order_id.in_(request.order_ids)).all()
+        items = merge_bill_items(bill_items(db, order_items))
+        total_amount = sum(item.total_price for item in items)
 
         # Format bill
-        bill_lines = [
-            {"text": "HÓA ĐƠN GỘP", "fontSize": 14, "fontName": "Arial Black", "bold": True, "align": "center"},
-            {"text": f"Bàn: {table.name}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": f"Ca: {shift.shift_type}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": f"Số order: {len(request.order_ids)}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": f"Thời gian: {get_vietnam_time().strftime('%d/%m/%Y %H:%M')}", "fontSize": 10, "bold": False, "align": "left"},
-            {"text": "---------------------------------", "fontSize": 12, "bold": False, "align": "left"},
+        info = [
+            f"Bàn: {table.name}",
+            f"Ca: {shift.shift_type}",
+            f"Số order: {len(request.order_ids)}",
+            f"Thời gian: {get_vietnam_time().strftime('%d/%m/%Y %H:%M')}",
         ]
+        bill_lines = receipt_lines("HÓA ĐƠN GỘP", info, items, total_amount, paper_width_cache.columns())
 
-        # Header của bảng
-        header_name_part = "TÊN MÓN".ljust(NAME_COL_WIDTH)
-        header_qty_part = "SL".center(QTY_COL_WIDTH)
-        header_total_price_part = "TIỀN".rjust(PRICE_COL_WIDTH)
-        bill_lines.append({"text": f"{header_name_part}{header_qty_part}{header_total_price_part}", "fontSize": 12, "bold": True, "align": "left"})
-        bill_lines.append({"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"})
-
-        # Thêm các items đã gộp
-        for (menu_item_id, note), item_data in items_map.items():
-            menu_item = item_data["menu_item"]
-            quantity = item_data["quantity"]
-            total_price = item_data["total_price"]
-            item_note = item_data["note"]
-            
-            # Format quantity and total price
-            qty_str = f"x{quantity}"
-            total_price_str = f"{int(total_price):,}"
-            
-            # Pad quantity and total price to fixed widths
-            item_qty_part = qty_str.center(QTY_COL_WIDTH)
-            item_total_price_part = total_price_str.rjust(PRICE_COL_WIDTH)
-            
-            # Wrap the item name
-            wrapped_name_lines = textwrap.wrap(menu_item.name, width=NAME_COL_WIDTH)
-            
-            # Add the first line with name, quantity, total price
-            if wrapped_name_lines:
-                first_name_part = wrapped_name_lines[0].ljust(NAME_COL_WIDTH)
-                item_line_text = f"{first_name_part}{item_qty_part}{item_total_price_part}"
-                bill_lines.append({
-                    "text": item_line_text,
-                    "fontSize": 12, "bold": False, "align": "left"
-                })
-                
-                # Add subsequent lines for wrapped name parts (indented)
-                for i in range(1, len(wrapped_name_lines)):
-                    bill_lines.append({
-                        "text": "  " + wrapped_name_lines[i].ljust(NAME_COL_WIDTH - 2),
-                        "fontSize": 12, "bold": False, "align": "left"
-                    })
-            
-            if item_note:
-                # Ghi chú thụt lề
-                bill_lines.append({"text": f"  Ghi chú: {item_note}", "fontSize": 12, "bold": False, "align": "left"})
-        
-        # Thêm tổng tiền
-        total_amount_str = f"{int(total_amount):,}"
-        
-        # Định dạng dòng tổng tiền
-        total_label_width = NAME_COL_WIDTH + QTY_COL_WIDTH
-        total_label_part = "TỔNG TIỀN:".ljust(total_label_width)
-        total_amount_part = total_amount_str.rjust(PRICE_COL_WIDTH)
-        
-        bill_lines.extend([
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-            {"text": f"{total_label_part}{total_amount_part}", "fontSize": 14, "bold": True, "align": "left"},
-            {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
-            {"text": "Cảm ơn quý khách!", "fontSize": 12, "bold": False, "align": "center"},
-        ])
-
-        # Gửi tới tất cả các máy in đang kết nối qua WebSocket
-        logger.info("Gửi dữ liệu in gộp qua WebSocket")
-        logger.info(f"Số lượng kết nối đang hoạt động: {len(printer_manager.active_printers)}")
-        logger.info(f"Dữ liệu in: {bill_lines}")
-        
-        success = False
-        for printer_id in printer_manager.active_printers.keys():
-            try:
-                result = await printer_manager.send_to_printer(printer_id, {
-                    "type": "print",
-                    "data": bill_lines,
-                    "timestamp": datetime.now().isoformat()
-                })
-                if result:
-                    success = True
-                    logger.info(f"Đã gửi dữ liệu tới printer {printer_id}")
-            except Exception as e:
-                logger.error(f"Lỗi khi gửi dữ liệu tới printer {printer_id}: {str(e)}")
-        
-        if not success:
-            logger.warning("Không có máy in nào đang kết nối hoặc không thể gửi dữ liệu tới máy in")
+        # Xếp lệnh in vào hàng đợi, dispatcher gửi tới máy in ở nền (không chờ máy in)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Dữ liệu in: {bill_lines}")
+        print_job = print_queue.submit(bill_lines, kind="combined_bill", station=STATION_CASHIER)
 
-        return {"success": True, "message": "Đã gửi hóa đơn gộp tới máy in"}
+        return {"success": True, "message": "Đã gửi hóa đơn gộp tới máy in", "job_id": print_job.id}
 
     except Exception as e:
         logger.error(f"Lỗi khi in hóa đơn gộp: {str(e)}")
@@ -0,0 +1,545 @@
+from fastapi import APIRouter, HTTPException
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple, Union
+from datetime import datetime, timedelta
+from app.core.menu_cache import menu_cache
+from app.core.escpos import encode_bill, resolve_encoding
+from .ws_hub import hub, ClientConnection
+from .printer_health import printer_monitor
+from .print_spool import print_spool, PRINT_SPOOL_BATCH
+import asyncio
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Số dispatcher chạy song song (mỗi dispatcher xử lý một job tại một thời điểm)
+PRINT_DISPATCH_WORKERS = 4
+# Thời gian chờ máy in xác nhận (print_ack) trước khi gửi lại / chuyển máy khác
+PRINT_ACK_TIMEOUT = 10.0
+# Số lần thử tối đa của một job
+PRINT_MAX_ATTEMPTS = 3
+# Chờ máy in vừa kết nối gửi printer_info (quầy, ack, escpos...) trước khi xả spool
+PRINT_SPOOL_DRAIN_DELAY = 1.0
+# Số job giữ lại trong bộ nhớ để tra cứu trạng thái
+PRINT_JOB_HISTORY = 500
+# Nhiều worker: chờ bao lâu (giây) cho máy in đúng quầy ở worker khác nhận job trước khi in ở máy quầy khác
+PRINT_STATION_FALLBACK_DELAY = 10.0
+# Topic nội bộ giữa các worker: có lệnh in mới chờ trong spool
+PRINT_SPOOL_TOPIC = "print_spool"
+
+# Quầy in: máy in khai báo {"station": ...} trong printer_info, nhóm món khai báo menu_groups.station
+STATION_BAR = "bar"
+STATION_KITCHEN = "kitchen"
+STATION_CASHIER = "cashier"
+# Quầy của các món thuộc nhóm chưa gán quầy
+DEFAULT_ITEM_STATION = STATION_BAR
+
+def split_items_by_station(db: Session, items: List[dict]) -> Dict[str, List[dict]]:
+    """Chia các món của order theo quầy in (giữ thứ tự món), tra quầy qua menu cache"""
+    stations: Dict[str, List[dict]] = {}
+    for item in items:
+        station = menu_cache.item_station(db, item["menu_item_id"], DEFAULT_ITEM_STATION)
+        stations.setdefault(station, []).append(item)
+    return stations
+
+class PrintJob:
+    """
+    Một lệnh in. Trạng thái:
+    queued → sending → printed (máy in đã xác nhận) / sent (máy in không hỗ trợ ack)
+    / failed (hết số lần thử).
+    pending: worker này không có máy in nhận được, nằm trong spool chờ máy in kết nối
+    (ở worker này hoặc worker khác, worker nào nhận dòng spool thì gửi và chờ ack).
+    Mỗi lần submit là một dòng spool riêng; chống in trùng theo dòng spool (chỉ một lần xả nhận được dòng).
+    """
+    def __init__(
+        self, lines: List[dict], kind: str, order_id: Optional[int] = None,
+        target: Optional[str] = None, station: Optional[str] = None
+    ):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.order_id = order_id
+        self.lines = lines
+        # Quầy cần in (None = máy in bất kỳ)
+        self.station = station
+        # Máy in chỉ định (None = máy in bất kỳ)
+        self.target = target
+        self.status = "queued"
+        self.attempts = 0
+        self.printer_id: Optional[str] = None
+        self.tried: Set[str] = set()
+        self.error: Optional[str] = None
+        # Đã ghi vào print_spool / đang được worker này nhận gửi (pending → sending trong spool)
+        self.spooled = False
+        self.claimed = False
+        # Luồng ESC/POS đã biên dịch, theo (encoding, codepage) của máy in
+        self._escpos: Dict[Tuple[str, Optional[int]], bytes] = {}
+        self.created_at = datetime.now()
+        self.updated_at = self.created_at
+
+    @classmethod
+    def from_spool(cls, entry) -> "PrintJob":
+        """Dựng lại lệnh in từ dòng print_spool (sau khi khởi động lại)"""
+        job = cls(entry.lines, entry.kind, order_id=entry.order_id, target=entry.target, station=entry.station)
+        job.id = entry.job_id
+        job.attempts = entry.attempts or 0
+        job.spooled = True
+        job.status = "pending"
+        return job
+
+    def set_status(self, status: str, error: Optional[str] = None):
+        self.status = status
+        if error is not None:
+            self.error = error
+        self.updated_at = datetime.now()
+
+    def message(self) -> dict:
+        return {
+            "type": "print",
+            "job_id": self.id,
+            "station": self.station,
+            "data": self.lines,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def escpos(self, encoding: str, codepage: Optional[int] = None) -> bytes:
+        key = (encoding, codepage)
+        if key not in self._escpos:
+            self._escpos[key] = encode_bill(self.lines, encoding, codepage)
+        return self._escpos[key]
+
+    def escpos_message(self, length: int) -> dict:
+        """Header gửi ngay trước binary frame ESC/POS, để máy in biết frame đó thuộc job nào"""
+        return {
+            "type": "print",
+            "format": "escpos",
+            "job_id": self.id,
+            "station": self.station,
+            "length": length,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "order_id": self.order_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "printer_id": self.printer_id,
+            "target": self.target,
+            "station": self.station,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat()
+        }
+
+class PrintQueue:
+    """
+    Hàng đợi lệnh in: endpoint chỉ submit() rồi trả response ngay, các dispatcher chạy nền
+    gửi job tới máy in song song, chờ print_ack, hết thời gian thì gửi lại hoặc chuyển máy khác.
+    Máy in khai báo {"ack": true} trong printer_info mới được chờ xác nhận; máy in cũ
+    coi như in xong khi writer đã gửi xong lệnh in xuống socket. Máy in khai báo {"escpos": true}
+    (kèm "encoding", "codepage" nếu có) nhận luồng byte ESC/POS thay cho bill_lines JSON.
+
+    Mọi lệnh in được ghi vào print_spool trước khi gửi. Không có máy in thì lệnh nằm lại
+    trong spool (pending) và được xả theo thứ tự FIFO khi có máy in kết nối / khỏe lại;
+    máy in khai báo {"batch": true} nhận cả loạt phiếu trong một frame. Chạy nhiều worker
+    thì các worker khác được báo qua event bus để xả spool tới máy in của chúng.
+    Các lệnh đọc/ghi print_spool (session đồng bộ) chạy ở thread riêng qua asyncio.to_thread,
+    để DB chậm không chặn event loop (mọi client WebSocket và hàng đợi in).
+    """
+    def __init__(self, workers: int = PRINT_DISPATCH_WORKERS):
+        self.workers = workers
+        self.jobs: "OrderedDict[str, PrintJob]" = OrderedDict()
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+        # job_id -> (printer_id, future chờ ack)
+        self.waiting: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._drain_task: Optional[asyncio.Task] = None
+        self._drain_again = False
+        self.logger = logging.getLogger(__name__)
+        hub.connect_listeners.append(self._on_printer_connect)
+        hub.disconnect_listeners.append(self._on_printer_disconnect)
+        hub.worker_listeners.setdefault(PRINT_SPOOL_TOPIC, []).append(self._on_spool_notice)
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self.tasks and self.tasks[0].get_loop() is loop and not all(task.done() for task in self.tasks):
+            return
+        self.queue = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        tasks = self.tasks + ([self._drain_task] if self._drain_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks = []
+        self._drain_task = None
+
+    def restore(self) -> int:
+        """Gọi lúc khởi động: đưa lệnh gửi dở về pending (chờ máy in kết nối để in tiếp), dọn lệnh cũ"""
+        count = print_spool.release_stale()
+        if count:
+            self.logger.warning(f"Khôi phục {count} lệnh in đang gửi dở từ print spool")
+        print_spool.purge()
+        return count
+
+    def _remember(self, job: PrintJob):
+        self.jobs[job.id] = job
+        while len(self.jobs) > PRINT_JOB_HISTORY:
+            self.jobs.popitem(last=False)
+
+    def submit(
+        self, lines: List[dict], kind: str, order_id: Optional[int] = None,
+        target: Optional[str] = None, station: Optional[str] = None
+    ) -> PrintJob:
+        """Ghi lệnh in vào spool rồi đưa vào hàng đợi, không chờ máy in"""
+        job = PrintJob(lines, kind, order_id=order_id, target=target, station=station)
+        job.spooled = print_spool.add(job)
+        self._remember(job)
+        self._ensure_started()
+        self.queue.put_nowait(job)
+        self.logger.info(f"Đã xếp lệnh in {job.id} ({kind}, order {order_id}, quầy {station})")
+        return job
+
+    def get(self, job_id: str) -> Optional[PrintJob]:
+        return self.jobs.get(job_id)
+
+    def has_printers(self) -> bool:
+        """Worker này có máy in đang kết nối không (máy in ở worker khác nhận job qua spool)"""
+        return bool(hub.subscribers("printers"))
+
+    def _route(self, job: PrintJob, fallback: bool = True) -> List[ClientConnection]:
+        """
+        Các máy in có thể nhận job: máy in của đúng quầy; không có thì máy in chưa khai báo quầy;
+        vẫn không có thì máy in bất kỳ nếu fallback (thà in nhầm quầy còn hơn mất phiếu).
+        Máy in đang lỗi heartbeat / hết hạn chờ ack bị bỏ qua cho tới khi phản hồi lại.
+        """
+        printers = [
+            printer for printer in hub.subscribers("printers").values()
+            if printer_monitor.is_healthy(printer.client_id)
+        ]
+        if job.target:
+            return [printer for printer in printers if printer.client_id == job.target]
+        if not job.station:
+            return printers
+        for candidates in (
+            [printer for printer in printers if printer.info.get("station") == job.station],
+            [printer for printer in printers if not printer.info.get("station")]
+        ):
+            if candidates:
+                return candidates
+        if not fallback:
+            return []
+        if printers:
+            self.logger.warning(f"Không có máy in quầy {job.station}, gửi lệnh in {job.id} tới máy in khác")
+        return printers
+
+    def _pick_printer(self, job: PrintJob, fallback: bool = True) -> Optional[ClientConnection]:
+        printers = self._route(job, fallback)
+        if not printers:
+            return None
+        # Ưu tiên máy chưa thử, sau đó máy có ít message đang chờ gửi nhất
+        return min(printers, key=lambda printer: (printer.client_id in job.tried, printer.queue.qsize()))
+
+    async def _claim(self, job: PrintJob) -> bool:
+        """Nhận job trong spool trước khi gửi; False nếu worker khác / lần xả spool khác đã nhận"""
+        if not job.spooled or job.claimed:
+            return True
+        job.claimed = bool(await asyncio.to_thread(print_spool.claim, [job.id]))
+        return job.claimed
+
+    async def _finish(self, job: PrintJob, status: str, error: Optional[str] = None):
+        job.set_status(status, error)
+        job.claimed = False
+        if job.spooled:
+            await asyncio.to_thread(print_spool.update, job)
+
+    async def _park(self, job: PrintJob):
+        """
+        Worker này không có máy in nhận được job: để job nằm trong spool, xả lại khi có máy in kết nối.
+        Chạy nhiều worker thì báo các worker khác xả spool; worker nào nhận được dòng spool
+        cho máy in của nó thì gửi và chờ ack ở đó.
+        """
+        if not job.spooled:
+            await self._finish(job, "failed", "Không có máy in và không ghi được print spool")
+            self.logger.error(f"Lệnh in {job.id}: không có máy in, lệnh in bị bỏ")
+            return
+        job.set_status("pending", "Không có máy in nào đang kết nối và hoạt động tốt")
+        if job.claimed:
+            job.claimed = False
+            await asyncio.to_thread(print_spool.update, job, "pending")
+        self.logger.warning(f"Lệnh in {job.id}: không có máy in, chờ trong print spool")
+        if hub.bus.distributed:
+            hub.notify_workers(PRINT_SPOOL_TOPIC, {"type": "spool_pending", "job_id": job.id})
+            self._schedule_fallback_drain()
+
+    def _schedule_fallback_drain(self):
+        """Hết thời gian chờ máy in đúng quầy ở worker khác thì xả lại, cho phép in ở máy quầy khác"""
+        asyncio.get_running_loop().call_later(PRINT_STATION_FALLBACK_DELAY + 0.1, self.drain)
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._dispatch(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Lỗi khi xử lý lệnh in {job.id}: {str(e)}")
+                await self._finish(job, "failed", str(e))
+
+    async def _dispatch(self, job: PrintJob):
+        while job.attempts < PRINT_MAX_ATTEMPTS:
+            # Nhiều worker: máy in đúng quầy có thể đang kết nối ở worker khác, chưa in ở máy quầy khác ngay
+            printer = self._pick_printer(job, fallback=not hub.bus.distributed)
+            if printer is None:
+                await self._park(job)
+                return
+            if not await self._claim(job):
+                # Đã được gửi trong một lần xả spool
+                return
+            if not await self._deliver(printer, [job]):
+                return
+
+        await self._finish(job, "failed")
+        self.logger.error(f"Lệnh in {job.id} thất bại sau {job.attempts} lần: {job.error}")
+
+    async def _deliver(self, printer: ClientConnection, jobs: List[PrintJob]) -> List[PrintJob]:
+        """Gửi các job (đã nhận trong spool) tới một máy in, chờ ack nếu máy in hỗ trợ; trả về các job lỗi"""
+        for job in jobs:
+            job.attempts += 1
+            job.printer_id = printer.client_id
+            job.tried.add(printer.client_id)
+            job.set_status("sending")
+
+        if not printer.info.get("ack"):
+            # Chỉ coi là đã gửi khi writer đã ghi xong mọi frame xuống socket; socket đứt trước đó
+            # thì job lỗi và được gửi lại (trong spool job vẫn ở sending, release_stale trả về pending)
+            frames = self._send_batch(printer, jobs)
+            if frames is None or not await self._written(frames):
+                for job in jobs:
+                    job.error = "Máy in ngắt kết nối trước khi gửi xong lệnh in"
+                return jobs
+            for job in jobs:
+                await self._finish(job, "sent")
+                self.logger.info(f"Đã gửi lệnh in {job.id} tới printer {printer.client_id}")
+            return []
+
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for job in jobs:
+            futures[job.id] = loop.create_future()
+            self.waiting[job.id] = (printer.client_id, futures[job.id])
+        try:
+            if self._send_batch(printer, jobs) is not None:
+                await asyncio.wait(list(futures.values()), timeout=PRINT_ACK_TIMEOUT)
+        finally:
+            for job in jobs:
+                self.waiting.pop(job.id, None)
+
+        failed = []
+        timed_out = False
+        for job in jobs:
+            future = futures[job.id]
+            if future.done():
+                ok, error = future.result()
+            else:
+                ok, error = False, "Hết thời gian chờ máy in xác nhận"
+                timed_out = True
+            if ok:
+                await self._finish(job, "printed")
+                self.logger.info(f"Printer {printer.client_id} đã in lệnh {job.id}")
+            else:
+                job.error = error
+                failed.append(job)
+                self.logger.warning(f"Lệnh in {job.id} lỗi trên printer {printer.client_id} (lần {job.attempts}): {error}")
+        if timed_out:
+            # Máy in không phản hồi: bỏ qua nó cho tới heartbeat thành công tiếp theo
+            printer_monitor.record_failure(printer.client_id)
+        elif len(failed) < len(jobs):
+            printer_monitor.record_success(printer.client_id)
+        return failed
+
+    @staticmethod
+    def _enqueue(printer: ClientConnection, frames: List[Union[dict, bytes]]) -> Optional[List[asyncio.Future]]:
+        """Đưa các frame vào hàng đợi gửi của máy in; trả về future của từng frame, None nếu máy in đã ngắt"""
+        futures = []
+        for frame in frames:
+            future = hub.send_tracked(printer.client_id, frame)
+            if future is None:
+                return None
+            futures.append(future)
+        return futures
+
+    @staticmethod
+    async def _written(frames: List[asyncio.Future]) -> bool:
+        """Chờ writer gửi xong các frame (tối đa PRINT_ACK_TIMEOUT)"""
+        try:
+            return all(await asyncio.wait_for(asyncio.gather(*frames), timeout=PRINT_ACK_TIMEOUT))
+        except asyncio.TimeoutError:
+            return False
+
+    def _send(self, printer: ClientConnection, job: PrintJob) -> Optional[List[asyncio.Future]]:
+        if not printer.info.get("escpos"):
+            return self._enqueue(printer, [job.message()])
+        data = job.escpos(*self._escpos_options(printer))
+        # Header và binary frame cùng đi qua hàng đợi của máy in nên giữ đúng thứ tự
+        return self._enqueue(printer, [job.escpos_message(len(data)), data])
+
+    def _send_batch(self, printer: ClientConnection, jobs: List[PrintJob]) -> Optional[List[asyncio.Future]]:
+        """Máy in khai báo {"batch": true} nhận nhiều job trong một frame, máy in khác nhận từng job"""
+        if len(jobs) == 1 or not printer.info.get("batch"):
+            futures = []
+            for job in jobs:
+                frames = self._send(printer, job)
+                if frames is None:
+                    return None
+                futures.extend(frames)
+            return futures
+        timestamp = datetime.now().isoformat()
+        if not printer.info.get("escpos"):
+            return self._enqueue(printer, [{
+                "type": "print_batch",
+                "jobs": [job.message() for job in jobs],
+                "timestamp": timestamp
+            }])
+        options = self._escpos_options(printer)
+        streams = [job.escpos(*options) for job in jobs]
+        header = {
+            "type": "print_batch",
+            "format": "escpos",
+            "jobs": [
+                {"job_id": job.id, "station": job.station, "length": len(data)}
+                for job, data in zip(jobs, streams)
+            ],
+            "timestamp": timestamp
+        }
+        return self._enqueue(printer, [header, b"".join(streams)])
+
+    @staticmethod
+    def _escpos_options(printer: ClientConnection) -> Tuple[str, Optional[int]]:
+        codepage = printer.info.get("codepage")
+        return resolve_encoding(printer.info.get("encoding")), codepage if isinstance(codepage, int) else None
+
+    def drain(self):
+        """Xả spool (chạy nền); gọi khi có máy in kết nối, khai báo printer_info hoặc khỏe lại"""
+        self._ensure_started()
+        if self._drain_task and not self._drain_task.done():
+            self._drain_again = True
+            return
+        self._drain_task = asyncio.create_task(self._drain())
+
+    async def _drain(self):
+        while True:
+            self._drain_again = False
+            try:
+                await asyncio.to_thread(print_spool.release_stale)
+                entries = await asyncio.to_thread(print_spool.pending)
+            except Exception as e:
+                self.logger.error(f"Không thể đọc print spool: {str(e)}")
+                return
+            batches: Dict[str, Tuple[ClientConnection, List[PrintJob]]] = {}
+            fallback_after = datetime.utcnow() - timedelta(seconds=PRINT_STATION_FALLBACK_DELAY)
+            for entry in entries:
+                job = self.jobs.get(entry.job_id)
+                if job is None:
+                    job = PrintJob.from_spool(entry)
+                    self._remember(job)
+                if job.claimed:
+                    continue
+                fallback = not hub.bus.distributed or (entry.created_at or datetime.utcnow()) <= fallback_after
+                printer = self._pick_printer(job, fallback)
+                if printer is None:
+                    continue
+                batches.setdefault(printer.client_id, (printer, []))[1].append(job)
+
+            flushed = 0
+            for printer, jobs in batches.values():
+                claimed = set(await asyncio.to_thread(print_spool.claim, [job.id for job in jobs]))
+                jobs = [job for job in jobs if job.id in claimed]
+                for job in jobs:
+                    job.claimed = True
+                if jobs:
+                    flushed += len(jobs)
+                    self.logger.info(f"Xả {len(jobs)} lệnh in từ spool tới printer {printer.client_id}")
+                    asyncio.create_task(self._flush(printer, jobs))
+            # Còn lệnh trong spool (lấy theo lô) hoặc có máy in mới trong lúc xả
+            if not self._drain_again and (len(entries) < PRINT_SPOOL_BATCH or not flushed):
+                return
+
+    async def _flush(self, printer: ClientConnection, jobs: List[PrintJob]):
+        try:
+            failed = await self._deliver(printer, jobs)
+        except Exception as e:
+            self.logger.error(f"Lỗi khi xả spool tới printer {printer.client_id}: {str(e)}")
+            failed = jobs
+        for job in failed:
+            # Gửi lại / chuyển máy khác theo đường thường
+            if job.attempts < PRINT_MAX_ATTEMPTS:
+                self.queue.put_nowait(job)
+            else:
+                await self._finish(job, "failed")
+
+    def _resolve(self, job_id: str, printer_id: str, ok: bool, error: Optional[str] = None):
+        entry = self.waiting.get(job_id)
+        if entry and entry[0] == printer_id and not entry[1].done():
+            entry[1].set_result((ok, error))
+
+    def _on_printer_connect(self, connection: ClientConnection):
+        if "printers" in connection.topics:
+            asyncio.get_running_loop().call_later(PRINT_SPOOL_DRAIN_DELAY, self.drain)
+
+    def _on_spool_notice(self, message: dict):
+        """Worker khác vừa để lệnh in chờ trong spool: xả tới máy in của worker này (nếu có)"""
+        if hub.subscribers("printers"):
+            self.drain()
+            self._schedule_fallback_drain()
+
+    def _on_printer_disconnect(self, connection: ClientConnection):
+        for job_id, (printer_id, _) in list(self.waiting.items()):
+            if printer_id == connection.client_id:
+                self._resolve(job_id, printer_id, False, "Máy in ngắt kết nối")
+
+    async def on_printer_message(self, client_id: str, message: dict):
+        """Xử lý message từ máy in: {"type": "print_ack", "job_id": ..., "status": "ok"|"error", "error": ...}"""
+        was_healthy = printer_monitor.is_healthy(client_id)
+        printer_monitor.on_message(client_id, message)
+        message_type = message.get("type")
+        if message_type == "printer_info" or (not was_healthy and printer_monitor.is_healthy(client_id)):
+            # Máy in đã khai báo quầy / phản hồi lại: in các phiếu đang chờ
+            self.drain()
+        if message_type != "print_ack":
+            return
+        self._resolve(
+            message.get("job_id"), client_id,
+            message.get("status", "ok") == "ok", message.get("error")
+        )
+
+print_queue = PrintQueue()
+
+router = APIRouter()
+
+@router.get("/")
+def list_print_jobs(
+    status: Optional[str] = None, order_id: Optional[int] = None,
+    station: Optional[str] = None, limit: int = 50
+) -> List[dict]:
+    """Các lệnh in gần nhất ở worker này, mới nhất trước"""
+    jobs = [
+        job for job in reversed(print_queue.jobs.values())
+        if (status is None or job.status == status)
+        and (order_id is None or job.order_id == order_id)
+        and (station is None or job.station == station)
+    ]
+    return [job.to_dict() for job in jobs[:limit]]
+
+@router.get("/{job_id}")
+def get_print_job(job_id: str) -> dict:
+    job = print_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Không tìm thấy lệnh in")
+    return job.to_dict()
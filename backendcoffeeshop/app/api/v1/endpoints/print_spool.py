@@ -0,0 +1,143 @@
+from typing import List, Optional
+from datetime import datetime, timedelta
+from app.database.database import SessionLocal
+from app.models import PrintSpoolEntry
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Số lệnh tối đa lấy ra mỗi lần xả spool
+PRINT_SPOOL_BATCH = 50
+# Lệnh ở trạng thái sending lâu hơn (giây) coi như worker gửi nó đã dừng giữa chừng
+# (lớn hơn tổng thời gian chờ ack của mọi lần thử)
+PRINT_SPOOL_STALE_AFTER = 120.0
+# Giữ lại lệnh đã xong bao nhiêu ngày trước khi dọn
+PRINT_SPOOL_RETENTION_DAYS = 3
+# Trạng thái còn phải in
+SPOOL_PENDING = "pending"
+SPOOL_SENDING = "sending"
+
+class PrintSpool:
+    """
+    Bảng print_spool: mọi lệnh in được ghi trước khi gửi, cập nhật khi in xong/thất bại.
+    Dùng session riêng (lệnh in được xếp sau khi request đã commit) và chỉ chạy các câu ngắn.
+    """
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def add(self, job) -> bool:
+        """Ghi lệnh in mới. False: lỗi DB, lệnh in vẫn được gửi nhưng không bền"""
+        db = SessionLocal()
+        try:
+            db.add(PrintSpoolEntry(
+                job_id=job.id, kind=job.kind, order_id=job.order_id, station=job.station,
+                target=job.target, lines=job.lines, status=SPOOL_PENDING, attempts=0
+            ))
+            db.commit()
+            return True
+        except Exception as e:
+            # Không ghi được spool vẫn phải in như trước
+            db.rollback()
+            self.logger.error(f"Không thể ghi lệnh in {job.id} vào spool: {str(e)}")
+            return False
+        finally:
+            db.close()
+
+    def update(self, job, status: Optional[str] = None):
+        db = SessionLocal()
+        try:
+            db.query(PrintSpoolEntry).filter(PrintSpoolEntry.job_id == job.id).update({
+                PrintSpoolEntry.status: status or job.status,
+                PrintSpoolEntry.attempts: job.attempts,
+                PrintSpoolEntry.error: (job.error or "")[:200] or None,
+                PrintSpoolEntry.updated_at: datetime.utcnow()
+            }, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"Không thể cập nhật lệnh in {job.id} trong spool: {str(e)}")
+        finally:
+            db.close()
+
+    def pending(self, limit: int = PRINT_SPOOL_BATCH) -> List[PrintSpoolEntry]:
+        """Các lệnh đang chờ, theo thứ tự xếp (FIFO)"""
+        db = SessionLocal()
+        try:
+            return db.query(PrintSpoolEntry).filter(
+                PrintSpoolEntry.status == SPOOL_PENDING
+            ).order_by(PrintSpoolEntry.id).limit(limit).all()
+        finally:
+            db.close()
+
+    def claim(self, job_ids: List[str]) -> List[str]:
+        """
+        Nhận các lệnh để gửi (pending → sending). Mỗi dòng chỉ một worker nhận được,
+        nên máy in kết nối lại nhiều lần hoặc nhiều worker cùng xả spool không in trùng.
+        """
+        if not job_ids:
+            return []
+        table = PrintSpoolEntry.__table__
+        db = SessionLocal()
+        try:
+            if db.get_bind().dialect.update_returning:
+                # Một câu UPDATE ... RETURNING cho cả lô: chỉ các dòng còn pending được trả về
+                claimed = db.execute(
+                    table.update().where(
+                        table.c.job_id.in_(job_ids), table.c.status == SPOOL_PENDING
+                    ).values(status=SPOOL_SENDING, updated_at=datetime.utcnow()).returning(table.c.job_id)
+                ).scalars().all()
+            else:
+                # DB không hỗ trợ RETURNING: UPDATE từng dòng để biết dòng nào nhận được
+                claimed = [
+                    job_id for job_id in job_ids
+                    if db.execute(table.update().where(
+                        table.c.job_id == job_id, table.c.status == SPOOL_PENDING
+                    ).values(status=SPOOL_SENDING, updated_at=datetime.utcnow())).rowcount
+                ]
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"Không thể nhận lệnh in từ spool: {str(e)}")
+            return []
+        finally:
+            db.close()
+        return claimed
+
+    def release_stale(self, older_than: float = PRINT_SPOOL_STALE_AFTER) -> int:
+        """
+        Lệnh đã nhận gửi (sending) quá lâu mà chưa xong, do worker nhận nó đã dừng,
+        được đưa về pending để in lại (thà in lại một phiếu còn hơn mất phiếu).
+        """
+        db = SessionLocal()
+        try:
+            count = db.query(PrintSpoolEntry).filter(
+                PrintSpoolEntry.status == SPOOL_SENDING,
+                PrintSpoolEntry.updated_at < datetime.utcnow() - timedelta(seconds=older_than)
+            ).update({PrintSpoolEntry.status: SPOOL_PENDING}, synchronize_session=False)
+            db.commit()
+            return count
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"Không thể trả lại lệnh in gửi dở trong spool: {str(e)}")
+            return 0
+        finally:
+            db.close()
+
+    def purge(self, days: int = PRINT_SPOOL_RETENTION_DAYS) -> int:
+        """Dọn các lệnh đã xong quá số ngày giữ lại"""
+        db = SessionLocal()
+        try:
+            count = db.query(PrintSpoolEntry).filter(
+                PrintSpoolEntry.status.notin_([SPOOL_PENDING, SPOOL_SENDING]),
+                PrintSpoolEntry.updated_at < datetime.utcnow() - timedelta(days=days)
+            ).delete(synchronize_session=False)
+            db.commit()
+            return count
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"Không thể dọn print spool: {str(e)}")
+            return 0
+        finally:
+            db.close()
+
+print_spool = PrintSpool()
@@ -0,0 +1,201 @@
+from fastapi import APIRouter
+from typing import Dict, List, Optional
+from datetime import datetime
+from .ws_hub import hub, ClientConnection
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Chu kỳ server gửi heartbeat tới máy in (giây)
+PRINTER_HEARTBEAT_INTERVAL = float(os.getenv("PRINTER_HEARTBEAT_INTERVAL", "15"))
+# Số heartbeat liên tiếp không có phản hồi (và không nhận message nào khác) trước khi đóng kết nối
+PRINTER_MAX_MISSED_HEARTBEATS = int(os.getenv("PRINTER_MAX_MISSED_HEARTBEATS", "3"))
+# Thời gian chờ đóng websocket của máy in đã chết
+PRINTER_CLOSE_TIMEOUT = 2.0
+# Hệ số làm mượt RTT trung bình
+RTT_SMOOTHING = 0.2
+
+class PrinterHealth:
+    """Số liệu sức khỏe của một máy in đang kết nối"""
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self.connected_at = datetime.now()
+        self.last_seen = time.monotonic()
+        self.last_seen_at = self.connected_at
+        # RTT heartbeat gần nhất và trung bình (ms)
+        self.rtt_ms: Optional[float] = None
+        self.rtt_avg_ms: Optional[float] = None
+        # Số lần lỗi liên tiếp (heartbeat không phản hồi, lệnh in hết hạn chờ ack); 0 = khỏe
+        self.failures = 0
+        self.total_failures = 0
+        self.heartbeats = 0
+        self.heartbeat_seq = 0
+        self.heartbeat_sent: Optional[float] = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.failures == 0
+
+    def seen(self):
+        self.last_seen = time.monotonic()
+        self.last_seen_at = datetime.now()
+
+    def fail(self):
+        self.failures += 1
+        self.total_failures += 1
+
+    def to_dict(self, connection: Optional[ClientConnection] = None) -> dict:
+        info = connection.info if connection else {}
+        return {
+            "printer_id": self.client_id,
+            "status": "healthy" if self.healthy else "unhealthy",
+            "station": info.get("station"),
+            "escpos": bool(info.get("escpos")),
+            "ack": bool(info.get("ack")),
+            "connected_at": self.connected_at.isoformat(),
+            "last_seen": self.last_seen_at.isoformat(),
+            "seconds_since_seen": round(time.monotonic() - self.last_seen, 1),
+            "rtt_ms": self.rtt_ms,
+            "rtt_avg_ms": self.rtt_avg_ms,
+            "failures": self.failures,
+            "total_failures": self.total_failures,
+            "heartbeats": self.heartbeats,
+            "queued_messages": connection.queue.qsize() if connection else 0,
+            "dropped_messages": connection.dropped if connection else 0
+        }
+
+class PrinterMonitor:
+    """
+    Heartbeat do server chủ động gửi tới các máy in: {"type": "heartbeat", "seq": n}, máy in trả
+    {"type": "heartbeat_ack", "seq": n}. Máy in cũ không trả heartbeat_ack vẫn được tính là còn sống
+    nếu có gửi message bất kỳ (ví dụ ping của chính nó) giữa hai heartbeat.
+    Máy in lỗi liên tiếp PRINTER_MAX_MISSED_HEARTBEATS lần bị đóng kết nối; hàng đợi in bỏ qua máy in đang lỗi.
+    """
+    def __init__(
+        self, interval: float = PRINTER_HEARTBEAT_INTERVAL,
+        max_missed: int = PRINTER_MAX_MISSED_HEARTBEATS
+    ):
+        self.interval = interval
+        self.max_missed = max_missed
+        self.printers: Dict[str, PrinterHealth] = {}
+        self.reaped = 0
+        self.task: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+        hub.disconnect_listeners.append(self._on_disconnect)
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self.task and self.task.get_loop() is loop and not self.task.done():
+            return
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def register(self, client_id: str):
+        """on_connect của endpoint máy in"""
+        self.printers[client_id] = PrinterHealth(client_id)
+        self._ensure_started()
+
+    def is_healthy(self, client_id: str) -> bool:
+        # Máy in không được theo dõi (ví dụ kết nối qua /ws?topics=printers) coi như khỏe
+        health = self.printers.get(client_id)
+        return health is None or health.healthy
+
+    def record_success(self, client_id: str):
+        health = self.printers.get(client_id)
+        if health:
+            health.seen()
+            health.failures = 0
+
+    def record_failure(self, client_id: str):
+        health = self.printers.get(client_id)
+        if health:
+            health.fail()
+
+    def on_message(self, client_id: str, message: dict):
+        """Mọi message từ máy in đều là dấu hiệu còn sống; heartbeat_ack cho thêm RTT"""
+        health = self.printers.get(client_id)
+        if not health:
+            return
+        health.seen()
+        if message.get("type") == "heartbeat_ack" and message.get("seq") == health.heartbeat_seq and health.heartbeat_sent is not None:
+            rtt = (health.last_seen - health.heartbeat_sent) * 1000
+            health.rtt_ms = round(rtt, 1)
+            health.rtt_avg_ms = round(rtt if health.rtt_avg_ms is None else health.rtt_avg_ms + RTT_SMOOTHING * (rtt - health.rtt_avg_ms), 1)
+            health.heartbeat_sent = None
+            health.failures = 0
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f"Lỗi khi kiểm tra heartbeat máy in: {str(e)}")
+
+    def check(self):
+        """Một vòng heartbeat: đánh giá heartbeat trước, đóng máy in chết, gửi heartbeat mới"""
+        now = time.monotonic()
+        for client_id, health in list(self.printers.items()):
+            if health.heartbeat_sent is not None:
+                if health.last_seen < health.heartbeat_sent:
+                    health.fail()
+                    self.logger.warning(f"Printer {client_id} không phản hồi heartbeat ({health.failures}/{self.max_missed})")
+                else:
+                    # Máy in cũ: không trả heartbeat_ack nhưng vẫn gửi message khác
+                    health.failures = 0
+            if health.failures >= self.max_missed:
+                self.reap(client_id)
+                continue
+            health.heartbeat_seq += 1
+            health.heartbeat_sent = now
+            health.heartbeats += 1
+            if not hub.send(client_id, {"type": "heartbeat", "seq": health.heartbeat_seq, "timestamp": datetime.now().isoformat()}):
+                self.printers.pop(client_id, None)
+
+    def reap(self, client_id: str):
+        """Đóng kết nối máy in chết (half-open socket không tự báo ngắt)"""
+        connection = hub.clients.get(client_id)
+        self.printers.pop(client_id, None)
+        self.reaped += 1
+        self.logger.error(f"Đóng kết nối printer {client_id}: không phản hồi {self.max_missed} heartbeat liên tiếp")
+        hub.disconnect(client_id)
+        if connection:
+            asyncio.create_task(self._close(connection))
+
+    async def _close(self, connection: ClientConnection):
+        try:
+            await asyncio.wait_for(connection.websocket.close(code=1001), timeout=PRINTER_CLOSE_TIMEOUT)
+        except Exception:
+            pass
+
+    def _on_disconnect(self, connection: ClientConnection):
+        self.printers.pop(connection.client_id, None)
+
+    def snapshot(self) -> List[dict]:
+        return [health.to_dict(hub.clients.get(client_id)) for client_id, health in self.printers.items()]
+
+printer_monitor = PrinterMonitor()
+
+router = APIRouter()
+
+@router.get("/health")
+def printers_health() -> dict:
+    """Sức khỏe các máy in đang kết nối ở worker này"""
+    printers = printer_monitor.snapshot()
+    return {
+        "worker_id": hub.worker_id,
+        "heartbeat_interval": printer_monitor.interval,
+        "max_missed_heartbeats": printer_monitor.max_missed,
+        "healthy": sum(1 for printer in printers if printer["status"] == "healthy"),
+        "unhealthy": sum(1 for printer in printers if printer["status"] != "healthy"),
+        "reaped": printer_monitor.reaped,
+        "printers": printers
+    }
@@ -0,0 +1,98 @@
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional
+from datetime import datetime
+from app.database.database import SessionLocal
+from app.models import Order, Table
+from .ws_hub import hub
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Các trạng thái order được coi là bàn đang có khách (giống TableGrid ở frontend)
+ACTIVE_ORDER_STATUSES = ("active", "pending")
+
+def _table_states(db: Session, table_ids: Optional[Iterable[int]] = None) -> List[dict]:
+    """
+    Trạng thái rút gọn của các bàn: status của bàn + các order active/pending đang mở.
+    table_ids=None lấy tất cả (snapshot). Hai query bất kể số bàn.
+    """
+    table_query = db.query(Table.id, Table.status)
+    order_query = db.query(
+        Order.id, Order.table_id, Order.status, Order.total_amount, Order.time_in
+    ).filter(Order.status.in_(ACTIVE_ORDER_STATUSES))
+    if table_ids is not None:
+        table_ids = list(dict.fromkeys(table_id for table_id in table_ids if table_id is not None))
+        if not table_ids:
+            return []
+        table_query = table_query.filter(Table.id.in_(table_ids))
+        order_query = order_query.filter(Order.table_id.in_(table_ids))
+
+    orders_by_table: Dict[int, List[dict]] = {}
+    for order in order_query.order_by(Order.time_in):
+        orders_by_table.setdefault(order.table_id, []).append({
+            "id": order.id,
+            "status": order.status,
+            "total_amount": order.total_amount or 0,
+            "time_in": order.time_in.isoformat() if order.time_in else None
+        })
+
+    states = {
+        table.id: {"table_id": table.id, "status": table.status, "orders": orders_by_table.pop(table.id, [])}
+        for table in table_query
+    }
+    # Order gắn với bàn không có trong bảng tables (bàn cấu hình cứng ở frontend)
+    for table_id, orders in orders_by_table.items():
+        states[table_id] = {"table_id": table_id, "status": None, "orders": orders}
+    if table_ids is not None:
+        for table_id in table_ids:
+            states.setdefault(table_id, {"table_id": table_id, "status": None, "orders": []})
+    return list(states.values())
+
+class TableStatusFeed:
+    """
+    Topic "tables" của hub: client nhận snapshot khi kết nối,
+    sau đó là các delta {"type": "table_status", "seq": n, "tables": [...]}.
+    seq tăng liên tục theo từng worker (source); client thấy hụt seq của một source
+    thì gửi {"type": "resync"} để nhận snapshot mới.
+    """
+    def __init__(self):
+        self.seq = 0
+        self.logger = logging.getLogger(__name__)
+
+    def snapshot_message(self, db: Session) -> dict:
+        return {
+            "type": "snapshot",
+            "source": hub.worker_id,
+            "seq": self.seq,
+            "tables": _table_states(db),
+            "timestamp": datetime.now().isoformat()
+        }
+
+    async def send_snapshot(self, client_id: str):
+        db = SessionLocal()
+        try:
+            message = self.snapshot_message(db)
+        finally:
+            db.close()
+        hub.send(client_id, message)
+
+    async def publish(self, db: Session, table_ids: Iterable[int]):
+        """Gửi trạng thái mới của các bàn vừa thay đổi (gọi sau khi commit)"""
+        if not hub.subscribers("tables") and not hub.bus.distributed:
+            return
+        try:
+            tables = _table_states(db, table_ids)
+            if not tables:
+                return
+            self.seq += 1
+            hub.publish("tables", {
+                "type": "table_status",
+                "source": hub.worker_id,
+                "seq": self.seq,
+                "tables": tables,
+                "timestamp": datetime.now().isoformat()
+            })
+        except Exception as e:
+            self.logger.error(f"Lỗi khi tạo delta trạng thái bàn: {str(e)}")
+
+table_feed = TableStatusFeed()
@@ -0,0 +1,303 @@
+from fastapi import WebSocket, WebSocketDisconnect
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Union
+from datetime import datetime
+from .order_loader import json_default
+from app.core.event_bus import EventBus, create_event_bus
+import asyncio
+import json
+import logging
+import uuid
+
+# Các kênh của hub: màn hình order, sơ đồ bàn, máy in, màn hình bếp
+TOPICS = ("orders", "tables", "printers", "kitchen")
+
+# Số message tối đa chờ gửi cho mỗi client; đầy thì bỏ message cũ nhất
+CLIENT_QUEUE_SIZE = 100
+# Thời gian tối đa gửi một message, quá thì coi như client đã chết
+CLIENT_SEND_TIMEOUT = 5.0
+
+def encode_message(message: dict) -> str:
+    """Serialize message một lần, dùng chung cho mọi client nhận"""
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=json_default)
+
+def parse_topics(value: Optional[str], default: Iterable[str]) -> List[str]:
+    """Đọc danh sách topic từ query string dạng "orders,tables", bỏ topic không hợp lệ"""
+    if not value:
+        return list(default)
+    return [topic for topic in (part.strip() for part in value.split(",")) if topic in TOPICS]
+
+class ClientConnection:
+    """
+    Một client WebSocket với hàng đợi gửi riêng (bounded) và writer task riêng.
+    Message cùng coalesce_key đang chờ gửi sẽ bị thay bằng bản mới nhất.
+    """
+    def __init__(self, client_id: str, websocket: WebSocket, max_queue: int = CLIENT_QUEUE_SIZE):
+        self.client_id = client_id
+        self.websocket = websocket
+        self.topics: Set[str] = set()
+        # Thông tin client tự khai báo (ví dụ printer_info của máy in)
+        self.info: dict = {}
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        # Message chờ gửi: str gửi dạng text frame, bytes gửi dạng binary frame
+        self.pending: Dict[object, Union[str, bytes]] = {}
+        # Future của các message cần biết đã gửi xong chưa (xem enqueue_tracked)
+        self.sent: Dict[object, asyncio.Future] = {}
+        self.dropped = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def enqueue(self, text: Union[str, bytes], coalesce_key=None):
+        """Đưa message vào hàng đợi, không chờ mạng; trả về key của message trong hàng đợi"""
+        if coalesce_key is not None and coalesce_key in self.pending:
+            self.pending[coalesce_key] = text
+            return coalesce_key
+        key = coalesce_key if coalesce_key is not None else object()
+        if self.queue.full():
+            # Client chậm: bỏ message cũ nhất để giữ hàng đợi có giới hạn
+            oldest = self.queue.get_nowait()
+            self.pending.pop(oldest, None)
+            self._settle(oldest, False)
+            self.dropped += 1
+        self.pending[key] = text
+        self.queue.put_nowait(key)
+        return key
+
+    def enqueue_tracked(self, text: Union[str, bytes]) -> asyncio.Future:
+        """
+        Như enqueue, kèm future: True khi writer đã gửi xong message xuống socket,
+        False khi message bị bỏ (hàng đợi đầy) hoặc client ngắt kết nối trước khi gửi
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.sent[self.enqueue(text)] = future
+        return future
+
+    def _settle(self, key, sent: bool):
+        future = self.sent.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(sent)
+
+    async def run(self, on_error):
+        """Writer task: lần lượt gửi message trong hàng đợi của client này"""
+        try:
+            while True:
+                key = await self.queue.get()
+                payload = self.pending.pop(key, None)
+                if payload is None:
+                    continue
+                if isinstance(payload, bytes):
+                    await asyncio.wait_for(self.websocket.send_bytes(payload), timeout=CLIENT_SEND_TIMEOUT)
+                else:
+                    await asyncio.wait_for(self.websocket.send_text(payload), timeout=CLIENT_SEND_TIMEOUT)
+                self._settle(key, True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            on_error(self.client_id, e)
+        finally:
+            # Writer dừng: các message chưa gửi sẽ không bao giờ được gửi
+            for key in list(self.sent):
+                self._settle(key, False)
+
+class WebSocketHub:
+    """
+    Registry WebSocket duy nhất của backend (thay cho các ConnectionManager riêng lẻ).
+    Client đăng ký topic khi kết nối; publish() serialize một lần và chỉ gửi tới
+    các client đã đăng ký topic đó, ở worker này và (qua event bus) ở các worker khác.
+    """
+    def __init__(self, bus: Optional[EventBus] = None):
+        self.clients: Dict[str, ClientConnection] = {}
+        self.topics: Dict[str, Dict[str, ClientConnection]] = {topic: {} for topic in TOPICS}
+        self.bus = bus or create_event_bus()
+        # Định danh worker, để client phân biệt dãy seq của từng worker
+        self.worker_id = uuid.uuid4().hex[:12]
+        # Callback gọi khi một client kết nối (ví dụ hàng đợi in xả spool khi có máy in)
+        self.connect_listeners: List[Callable[[ClientConnection], None]] = []
+        # Callback gọi khi một client ngắt kết nối (ví dụ hàng đợi in chuyển job sang máy khác)
+        self.disconnect_listeners: List[Callable[[ClientConnection], None]] = []
+        # Callback nhận message nội bộ giữa các worker theo topic, không gửi cho client (ví dụ xả print spool)
+        self.worker_listeners: Dict[str, List[Callable[[dict], None]]] = {}
+        self.logger = logging.getLogger(__name__)
+
+    async def start(self):
+        """Gọi khi app khởi động: bắt đầu nhận message từ các worker khác"""
+        try:
+            await self.bus.start(self.deliver)
+        except Exception as e:
+            self.logger.error(f"Không thể khởi động event bus, chỉ gửi trong worker này: {str(e)}")
+
+    async def stop(self):
+        await self.bus.stop()
+
+    def connect(self, client_id: str, websocket: WebSocket, topics: Iterable[str]) -> ClientConnection:
+        """Đăng ký client (websocket đã accept) và khởi động writer task của nó"""
+        connection = ClientConnection(client_id, websocket)
+        connection.task = asyncio.create_task(connection.run(self._on_send_error))
+        self.clients[client_id] = connection
+        self.subscribe(client_id, topics)
+        self.logger.info(f"Client {client_id} connected, topics={sorted(connection.topics)}")
+        for listener in self.connect_listeners:
+            try:
+                listener(connection)
+            except Exception as e:
+                self.logger.error(f"Lỗi trong connect listener: {str(e)}")
+        return connection
+
+    def subscribe(self, client_id: str, topics: Iterable[str]):
+        connection = self.clients.get(client_id)
+        if not connection:
+            return
+        for topic in topics:
+            if topic in self.topics:
+                self.topics[topic][client_id] = connection
+                connection.topics.add(topic)
+
+    def unsubscribe(self, client_id: str, topics: Iterable[str]):
+        connection = self.clients.get(client_id)
+        if not connection:
+            return
+        for topic in topics:
+            if topic in self.topics:
+                self.topics[topic].pop(client_id, None)
+                connection.topics.discard(topic)
+
+    def disconnect(self, client_id: str):
+        connection = self.clients.pop(client_id, None)
+        if not connection:
+            return
+        for topic in connection.topics:
+            self.topics[topic].pop(client_id, None)
+        if connection.task and connection.task is not asyncio.current_task():
+            connection.task.cancel()
+        for listener in self.disconnect_listeners:
+            try:
+                listener(connection)
+            except Exception as e:
+                self.logger.error(f"Lỗi trong disconnect listener: {str(e)}")
+        self.logger.info(f"Client {client_id} disconnected (dropped {connection.dropped} messages)")
+
+    def _on_send_error(self, client_id: str, error: Exception):
+        self.logger.error(f"Error sending to client {client_id}: {str(error) or type(error).__name__}")
+        self.disconnect(client_id)
+
+    def subscribers(self, topic: str) -> Dict[str, ClientConnection]:
+        return self.topics.get(topic, {})
+
+    def deliver(self, topic: str, text: str, coalesce_key=None) -> int:
+        """Đưa message đã serialize vào hàng đợi của các client cục bộ đăng ký topic"""
+        if topic in self.worker_listeners:
+            self._notify_worker_listeners(topic, text)
+            return 0
+        subscribers = list(self.subscribers(topic).values())
+        for connection in subscribers:
+            connection.enqueue(text, coalesce_key)
+        return len(subscribers)
+
+    def publish(self, topic: str, message: dict, coalesce_key=None) -> int:
+        """
+        Serialize message một lần rồi đưa vào hàng đợi của các client đăng ký topic,
+        không chờ gửi xong, đồng thời chuyển cho các worker khác qua event bus.
+        Trả về số client nhận ở worker này.
+        """
+        if not self.subscribers(topic) and not self.bus.distributed:
+            return 0
+        text = encode_message(message)
+        count = self.deliver(topic, text, coalesce_key)
+        self.bus.publish(topic, text, coalesce_key, origin=self.deliver)
+        self.logger.debug(f"Queued {message.get('type')} on '{topic}' for {count} local clients")
+        return count
+
+    def notify_workers(self, topic: str, message: dict):
+        """Gửi message nội bộ tới các worker khác qua event bus (không gửi cho client nào)"""
+        if self.bus.distributed:
+            self.bus.publish(topic, encode_message(message), origin=self.deliver)
+
+    def _notify_worker_listeners(self, topic: str, text: str):
+        message = json.loads(text)
+        for listener in self.worker_listeners[topic]:
+            try:
+                listener(message)
+            except Exception as e:
+                self.logger.error(f"Lỗi trong worker listener '{topic}': {str(e)}")
+
+    def send(self, client_id: str, message: dict) -> bool:
+        """Gửi riêng cho một client (qua hàng đợi của client đó)"""
+        connection = self.clients.get(client_id)
+        if not connection:
+            return False
+        connection.enqueue(encode_message(message))
+        return True
+
+    def send_bytes(self, client_id: str, data: bytes) -> bool:
+        """Gửi riêng cho một client một binary frame (ví dụ luồng ESC/POS cho máy in)"""
+        connection = self.clients.get(client_id)
+        if not connection:
+            return False
+        connection.enqueue(data)
+        return True
+
+    def send_tracked(self, client_id: str, payload: Union[dict, bytes]) -> Optional[asyncio.Future]:
+        """
+        Như send / send_bytes nhưng trả về future cho biết writer đã gửi xong frame chưa
+        (xem ClientConnection.enqueue_tracked); None nếu client không còn kết nối
+        """
+        connection = self.clients.get(client_id)
+        if not connection:
+            return None
+        return connection.enqueue_tracked(payload if isinstance(payload, bytes) else encode_message(payload))
+
+    async def serve(
+        self,
+        websocket: WebSocket,
+        client_id: str,
+        topics: Iterable[str],
+        on_message: Optional[Callable[[str, dict], Awaitable[None]]] = None,
+        on_connect: Optional[Callable[[str], Awaitable[None]]] = None
+    ):
+        """
+        Vòng đời chung của một kết nối: accept, đăng ký topic, xử lý ping/subscribe/unsubscribe/
+        printer_info, chuyển các message khác cho on_message, hủy đăng ký khi ngắt kết nối.
+        """
+        try:
+            await websocket.accept()
+            connection = self.connect(client_id, websocket, topics)
+            hello = {
+                "status": "connected",
+                "client_id": client_id,
+                "topics": sorted(connection.topics),
+                "timestamp": datetime.now().isoformat()
+            }
+            if "printers" in connection.topics:
+                # App máy in cũ đọc printer_id
+                hello["printer_id"] = client_id
+            self.send(client_id, {"type": "connection", "data": hello})
+            if on_connect:
+                await on_connect(client_id)
+
+            while True:
+                data = await websocket.receive_text()
+                try:
+                    message = json.loads(data)
+                except json.JSONDecodeError:
+                    self.logger.error(f"Invalid JSON from client {client_id}: {data}")
+                    continue
+                self.logger.debug(f"Received message from client {client_id}: {message}")
+
+                message_type = message.get("type")
+                if message_type == "ping":
+                    self.send(client_id, {"type": "pong", "data": {"timestamp": datetime.now().isoformat()}})
+                elif message_type == "subscribe":
+                    self.subscribe(client_id, message.get("topics", []))
+                elif message_type == "unsubscribe":
+                    self.unsubscribe(client_id, message.get("topics", []))
+                elif message_type == "printer_info":
+                    connection.info.update(message.get("data") or {})
+                    self.logger.info(f"Client {client_id} info: {connection.info}")
+                if on_message:
+                    await on_message(client_id, message)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            self.logger.error(f"WebSocket error for client {client_id}: {str(e)}")
+        finally:
+            self.disconnect(client_id)
+
+hub = WebSocketHub()
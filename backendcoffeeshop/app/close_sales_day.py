@@ -0,0 +1,41 @@
+"""
+Chốt doanh số ngày vào sales_reports / product_performance (chạy lại cho cùng ngày thì ghi đè).
+
+    python -m app.close_sales_day                           # các ngày chưa chốt, đến hôm qua
+    python -m app.close_sales_day --date 2025-06-01
+    python -m app.close_sales_day --start 2025-01-01 --end 2025-01-31
+"""
+import argparse
+from datetime import datetime, timedelta
+from .database.database import SessionLocal, init_tables
+from .core.sales_reports import close_business_day, close_pending_days
+
+def parse_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def main():
+    parser = argparse.ArgumentParser(description="Chốt doanh số ngày vào sales_reports và product_performance")
+    parser.add_argument("--date", type=parse_date, help="Chốt một ngày YYYY-MM-DD")
+    parser.add_argument("--start", type=parse_date, help="Ngày bắt đầu YYYY-MM-DD")
+    parser.add_argument("--end", type=parse_date, help="Ngày kết thúc YYYY-MM-DD (mặc định: bằng --start)")
+    args = parser.parse_args()
+
+    init_tables()
+    db = SessionLocal()
+    try:
+        if args.date or args.start:
+            day = args.date or args.start
+            end = args.date or args.end or args.start
+            days = []
+            while day <= end:
+                close_business_day(db, day)
+                days.append(day)
+                day += timedelta(days=1)
+        else:
+            days = close_pending_days(db)
+        print(f"Đã chốt {len(days)} ngày: {', '.join(str(day) for day in days) or '-'}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import logging
+import textwrap
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy.orm import Session
+from app.database.database import SessionLocal
+from app.models import PrinterSettings
+from app.core.menu_cache import menu_cache
+
+logger = logging.getLogger(__name__)
+
+# Khổ mặc định (số ký tự một dòng) khi chưa cấu hình PrinterSettings
+DEFAULT_BILL_WIDTH = 33
+QTY_COL_WIDTH = 4 # e.g., " x3 "
+PRICE_COL_WIDTH = 9 # e.g., "120.000" (max 7 digits + 2 for thousands separator/padding)
+# Số ký tự một dòng theo khổ giấy (mm) trong PrinterSettings.paper_width
+PAPER_WIDTH_COLUMNS = {58: 33, 80: 48}
+# Khoảng thời gian (giây) giữa hai lần đọc lại PrinterSettings (ghi trong process thì invalidate ngay)
+PAPER_SETTINGS_CHECK_INTERVAL = 30.0
+
+BillItem = namedtuple("BillItem", ["menu_item_id", "name", "quantity", "total_price", "note"])
+# Một dòng thay đổi của phiếu sửa đồ (số lượng trước/sau khi sửa order)
+TicketChange = namedtuple("TicketChange", ["menu_item_id", "name", "old_quantity", "new_quantity", "note"])
+# Đánh dấu ở cột cuối của phiếu sửa đồ
+CHANGE_MARKERS = {"added": "MỚI", "increased": "THÊM", "decreased": "BỚT", "removed": "HỦY"}
+
+def text_line(text: str, font_size: int = 12, bold: bool = False, align: str = "left", font_name: Optional[str] = None) -> dict:
+    if font_name:
+        return {"text": text, "fontSize": font_size, "fontName": font_name, "bold": bold, "align": align}
+    return {"text": text, "fontSize": font_size, "bold": bold, "align": align}
+
+@lru_cache(maxsize=16)
+def _separator_text(width: int) -> str:
+    return "-" * width
+
+def separator(width: int = DEFAULT_BILL_WIDTH, font_size: int = 16) -> dict:
+    return text_line(_separator_text(width), font_size)
+
+def name_col_width(width: int) -> int:
+    return width - QTY_COL_WIDTH - PRICE_COL_WIDTH
+
+@lru_cache(maxsize=4096)
+def item_name_layout(menu_item_id: int, name: str, width: int) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Bố cục tên món đã wrap cho khổ width: (phần tên ở dòng đầu đã căn cột, các dòng tiếp theo thụt 2 ký tự).
+    Nhớ theo (menu_item_id, width); tên nằm trong key nên đổi tên món không dùng nhầm bố cục cũ.
+    """
+    name_width = name_col_width(width)
+    wrapped = textwrap.wrap(name, width=name_width)
+    if not wrapped:
+        return "".ljust(name_width), ()
+    return wrapped[0].ljust(name_width), tuple("  " + part.ljust(name_width - 2) for part in wrapped[1:])
+
+@lru_cache(maxsize=32)
+def _table_header_text(name_label: str, width: int, last_label: str = "TIỀN") -> str:
+    return f"{name_label.ljust(name_col_width(width))}{'SL'.center(QTY_COL_WIDTH)}{last_label.rjust(PRICE_COL_WIDTH)}"
+
+def item_lines(item: BillItem, width: int = DEFAULT_BILL_WIDTH) -> List[dict]:
+    """Các dòng in của một món: tên (wrap) | SL | TIỀN, kèm ghi chú"""
+    first_name_part, continuation = item_name_layout(item.menu_item_id, item.name or "", width)
+    qty_part = f"x{item.quantity}".center(QTY_COL_WIDTH)
+    price_part = f"{int(item.total_price):,}".rjust(PRICE_COL_WIDTH)
+    lines = [text_line(f"{first_name_part}{qty_part}{price_part}")]
+    for text in continuation:
+        lines.append(text_line(text))
+    if item.note:
+        # Ghi chú thụt lề
+        lines.append(text_line(f"  Ghi chú: {item.note}"))
+    return lines
+
+def change_kind(change: TicketChange) -> str:
+    if change.old_quantity == 0:
+        return "added"
+    if change.new_quantity == 0:
+        return "removed"
+    return "increased" if change.new_quantity > change.old_quantity else "decreased"
+
+def change_lines(change: TicketChange, width: int = DEFAULT_BILL_WIDTH) -> List[dict]:
+    """Các dòng in của một món thay đổi: tên (wrap) | +/- SL | MỚI/THÊM/BỚT/HỦY, kèm số còn lại và ghi chú"""
+    kind = change_kind(change)
+    first_name_part, continuation = item_name_layout(change.menu_item_id, change.name or "", width)
+    difference = change.new_quantity - change.old_quantity
+    qty_part = f"{difference:+d}".center(QTY_COL_WIDTH)
+    lines = [text_line(f"{first_name_part}{qty_part}{CHANGE_MARKERS[kind].rjust(PRICE_COL_WIDTH)}", bold=kind == "removed")]
+    for text in continuation:
+        lines.append(text_line(text))
+    if kind in ("increased", "decreased"):
+        lines.append(text_line(f"  Còn: x{change.new_quantity}"))
+    if change.note:
+        lines.append(text_line(f"  Ghi chú: {change.note}"))
+    return lines
+
+def total_line(total_amount: float, label: str = "TỔNG TIỀN:", width: int = DEFAULT_BILL_WIDTH) -> dict:
+    label_part = label.ljust(name_col_width(width) + QTY_COL_WIDTH)
+    return text_line(f"{label_part}{f'{int(total_amount):,}'.rjust(PRICE_COL_WIDTH)}", 14, bold=True)
+
+def bill_items(db: Session, items: Iterable) -> List[BillItem]:
+    """
+    Chuẩn hóa món của order (OrderItem model hoặc dict từ fetch_order_items) thành BillItem.
+    Tên lấy từ menu cache; món không còn trong menu bị bỏ qua như trước.
+    """
+    result = []
+    for item in items:
+        if isinstance(item, dict):
+            menu_item_id, quantity, total_price, note = item["menu_item_id"], item["quantity"], item["total_price"], item.get("note")
+            name = item.get("name")
+        else:
+            menu_item_id, quantity, total_price, note = item.menu_item_id, item.quantity, item.total_price, item.note
+            name = None
+        if name is None:
+            menu_item = menu_cache.get_item(db, menu_item_id)
+            if menu_item is None:
+                continue
+            name = menu_item.name
+        result.append(BillItem(menu_item_id, name, quantity, total_price, note))
+    return result
+
+def merge_bill_items(items: Iterable[BillItem]) -> List[BillItem]:
+    """Gộp các món trùng (menu_item_id, note), dùng cho hóa đơn gộp"""
+    merged = {}
+    for item in items:
+        key = (item.menu_item_id, item.note or "")
+        current = merged.get(key)
+        if current is None:
+            merged[key] = item
+        else:
+            merged[key] = current._replace(
+                quantity=current.quantity + item.quantity,
+                total_price=current.total_price + item.total_price
+            )
+    return list(merged.values())
+
+def bill_lines(
+    title: str,
+    info: Sequence[str],
+    items: Sequence[BillItem],
+    width: int = DEFAULT_BILL_WIDTH,
+    name_label: str = "TÊN HÀNG",
+    total_label: str = "TỔNG TIỀN:",
+    total_amount: Optional[float] = None,
+    info_separator_size: int = 16,
+    footer: Sequence[str] = ()
+) -> List[dict]:
+    """
+    Dựng danh sách dòng in: tiêu đề, các dòng thông tin, bảng món, tổng tiền, lời cuối.
+    total_amount=None thì cộng từ items.
+    """
+    lines = [text_line(title, 14, bold=True, align="center", font_name="Arial Black")]
+    lines.extend(text_line(text, 10) for text in info)
+    lines.append(separator(width, info_separator_size))
+    lines.append(text_line(_table_header_text(name_label, width), bold=True))
+    lines.append(separator(width))
+    for item in items:
+        lines.extend(item_lines(item, width))
+    if total_amount is None:
+        total_amount = sum(item.total_price for item in items)
+    lines.extend([
+        separator(width),
+        total_line(total_amount, total_label, width),
+        separator(width),
+    ])
+    lines.extend(text_line(text, align="center") for text in footer)
+    return lines
+
+def kitchen_ticket_lines(table_label: str, time_text: str, items: Sequence[BillItem], width: int = DEFAULT_BILL_WIDTH) -> List[dict]:
+    """Phiếu làm đồ cho quầy pha chế / bếp"""
+    return bill_lines("PHIẾU LÀM ĐỒ", [f"Bàn: {table_label}", f"Thời gian: {time_text}"], items, width)
+
+def ticket_changes(db: Session, item_changes: Iterable[dict]) -> List[TicketChange]:
+    """Delta số lượng của sync_order_items → TicketChange (tên tra qua menu cache)"""
+    return [
+        TicketChange(
+            change["menu_item_id"], menu_cache.item_name(db, change["menu_item_id"]),
+            change["old_quantity"], change["new_quantity"], change["note"] or None
+        )
+        for change in item_changes
+    ]
+
+def delta_ticket_lines(
+    table_label: str, time_text: str, edited_text: str,
+    changes: Sequence[TicketChange], width: int = DEFAULT_BILL_WIDTH
+) -> List[dict]:
+    """Phiếu sửa đồ: chỉ các món thêm / tăng / giảm / hủy khi sửa order"""
+    lines = [
+        text_line("PHIẾU SỬA ĐỒ", 14, bold=True, align="center", font_name="Arial Black"),
+        text_line(f"Bàn: {table_label}", 10),
+        text_line(f"Thời gian: {time_text}", 10),
+        text_line(f"Sửa lúc: {edited_text}", 10),
+        separator(width),
+        text_line(_table_header_text("TÊN HÀNG", width, "THAY ĐỔI"), bold=True),
+        separator(width),
+    ]
+    for change in changes:
+        lines.extend(change_lines(change, width))
+    lines.append(separator(width))
+    return lines
+
+def receipt_lines(
+    title: str, info: Sequence[str], items: Sequence[BillItem], total_amount: float,
+    width: int = DEFAULT_BILL_WIDTH, total_label: str = "TỔNG TIỀN:"
+) -> List[dict]:
+    """Hóa đơn thanh toán (HÓA ĐƠN / HÓA ĐƠN GỘP)"""
+    return bill_lines(
+        title, info, items, width,
+        name_label="TÊN MÓN", total_label=total_label, total_amount=total_amount,
+        info_separator_size=12, footer=["Cảm ơn quý khách!"]
+    )
+
+def order_receipt_lines(db: Session, order, table_name: str, shift_type: str, width: int = DEFAULT_BILL_WIDTH) -> List[dict]:
+    """Hóa đơn của một order (Order model)"""
+    info = [
+        f"Bàn: {table_name}",
+        f"Ca: {shift_type}",
+        f"Thời gian: {order.time_in.strftime('%d/%m/%Y %H:%M')}",
+    ]
+    return receipt_lines("HÓA ĐƠN", info, bill_items(db, order.items), order.total_amount, width, total_label="Tổng tiền:")
+
+def shift_report_lines(
+    date_text: str, shift_label: str, staffs: Sequence[dict], shift_data: dict,
+    cigarette_items: Sequence[dict], width: int = DEFAULT_BILL_WIDTH
+) -> List[dict]:
+    """Biên bản tổng kết ca. staffs: [{"name", "start_order", "end_order", "total"}]"""
+    # Dòng kẻ của biên bản ngắn hơn bill một ký tự (giữ như mẫu in cũ)
+    rule_width = width - 1
+    lines = [
+        text_line("TỔNG KẾT CA", 14, bold=True, align="center", font_name="Arial"),
+        text_line(f"Ngày: {date_text}", 10),
+        text_line(shift_label, 10),
+        separator(rule_width),
+    ]
+    for staff in staffs:
+        lines += [
+            text_line(f"Nhân viên : {staff['name']}", bold=True),
+            text_line(f"  Mã order đầu: {staff['start_order']}"),
+            text_line(f"  Mã order cuối: {staff['end_order']}"),
+            text_line(f"  Tổng số order: {staff['total']}"),
+        ]
+    lines += [
+        text_line(f"Tổng cộng: {sum(staff['total'] or 0 for staff in staffs)} cuống", bold=True),
+        text_line(f"Tổng cuống trên máy: {shift_data['orders']}"),
+        separator(rule_width),
+        text_line(f"Tổng doanh thu: {shift_data['revenue']:,.0f} ₫", bold=True),
+        text_line(f"Tổng số hóa đơn: {shift_data['orders']}"),
+        separator(rule_width, 12),
+        text_line("Thống kê thuốc lá:", 13, bold=True),
+    ]
+    if cigarette_items:
+        lines.extend(text_line(f"{item['name']} x{item['quantity']} gói") for item in cigarette_items)
+    else:
+        lines.append(text_line("Không có dữ liệu thuốc lá"))
+    lines += [
+        separator(rule_width, 12),
+        text_line("Người lập biên bản", align="center"),
+        text_line("(Ký, ghi rõ họ tên)", align="center"),
+    ]
+    return lines
+
+class PaperWidthCache:
+    """Số ký tự một dòng theo PrinterSettings đang dùng, đọc lại mỗi PAPER_SETTINGS_CHECK_INTERVAL giây"""
+    def __init__(self, check_interval: float = PAPER_SETTINGS_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._columns: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._columns = None
+
+    def columns(self) -> int:
+        if self._columns is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._columns
+        with self._lock:
+            # Session riêng: lỗi khi đọc settings không được rollback order chưa commit của request
+            db = SessionLocal()
+            try:
+                paper_width = db.query(PrinterSettings.paper_width).filter(
+                    PrinterSettings.is_active == True,
+                    PrinterSettings.paper_width.isnot(None)
+                ).order_by(PrinterSettings.id).limit(1).scalar()
+            except Exception as e:
+                logger.error(f"Không đọc được PrinterSettings: {str(e)}")
+                paper_width = None
+            finally:
+                db.close()
+            self._columns = PAPER_WIDTH_COLUMNS.get(paper_width, DEFAULT_BILL_WIDTH)
+            self._checked_at = time.monotonic()
+            return self._columns
+
+paper_width_cache = PaperWidthCache()
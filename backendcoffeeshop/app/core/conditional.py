@@ -0,0 +1,48 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Optional, Tuple
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+def model_version(db: Session, model) -> Tuple[int, Optional[datetime]]:
+    """Version rẻ của một bảng: (số dòng, updated_at lớn nhất), một câu aggregate không tải dòng nào"""
+    count, last_updated = db.query(func.count(model.id), func.max(model.updated_at)).one()
+    return count, last_updated
+
+def make_etag(request: Request, version) -> str:
+    """ETag yếu theo path + query string (skip/limit) + version của dữ liệu"""
+    raw = repr((request.url.path, request.url.query, version)).encode()
+    return f'W/"{hashlib.sha1(raw).hexdigest()[:20]}"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # So sánh yếu: bỏ tiền tố W/ ở cả hai phía
+    return etag[2:] in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+def conditional_get(request: Request, response: Response, version, last_modified: Optional[datetime] = None) -> Optional[Response]:
+    """
+    Gắn ETag/Last-Modified vào response. Nếu If-None-Match khớp version hiện tại
+    thì trả về luôn Response 304 (endpoint không cần query dữ liệu), ngược lại trả về None.
+    Chỉ dựa vào If-None-Match vì xóa dòng không làm tăng updated_at lớn nhất.
+    """
+    headers = {
+        "ETag": make_etag(request, version),
+        # Trình duyệt luôn phải hỏi lại server, nhưng nhận 304 nếu dữ liệu không đổi
+        "Cache-Control": "no-cache"
+    }
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+
+    if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,110 @@
+import codecs
+import unicodedata
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+# Lệnh ESC/POS dùng cho máy in nhiệt
+ESC = b"\x1b"
+GS = b"\x1d"
+INIT = ESC + b"@"
+LF = b"\n"
+# Đẩy giấy n dòng rồi cắt một phần
+FEED_LINES = 4
+CUT = GS + b"V" + bytes([66, 0])
+
+ALIGN = {"left": 0, "center": 1, "right": 2}
+# Mã hóa chữ mặc định: bỏ dấu tiếng Việt, máy in nào cũng in được
+DEFAULT_ENCODING = "ascii"
+# Dấu thanh tiếng Việt (huyền, sắc, ngã, hỏi, nặng): cp1258 có dạng tổ hợp của các dấu này
+TONE_MARKS = "\u0300\u0301\u0303\u0309\u0323"
+
+def font_and_size(font_size: int) -> Tuple[int, int]:
+    """
+    fontSize của bill_lines → (font ESC M, hệ số GS !).
+    Chữ nhỏ (<= 10) dùng font B; từ 13 trở lên chỉ phóng chiều cao để không đổi số cột.
+    """
+    font = 1 if font_size <= 10 else 0
+    size = 0x01 if font_size >= 13 else 0x00
+    return font, size
+
+@lru_cache(maxsize=64)
+def style_commands(font_size: int, bold: bool, align: str, font_name: Optional[str] = None) -> bytes:
+    """Chuỗi lệnh font/đậm/căn lề của một kiểu dòng, nhớ theo kiểu (mỗi bill chỉ có vài kiểu)"""
+    font, size = font_and_size(font_size)
+    # Font "Arial Black" của tiêu đề: in đậm
+    emphasized = bold or (font_name or "").lower().endswith("black")
+    return (
+        ESC + b"M" + bytes([font])
+        + GS + b"!" + bytes([size])
+        + ESC + b"E" + bytes([1 if emphasized else 0])
+        + ESC + b"a" + bytes([ALIGN.get(align, 0)])
+    )
+
+@lru_cache(maxsize=8)
+def header_commands(codepage: Optional[int]) -> bytes:
+    """Khởi tạo máy in và chọn bảng mã (ESC t n) nếu máy in khai báo"""
+    if not isinstance(codepage, int) or not 0 <= codepage <= 255:
+        return INIT
+    return INIT + ESC + b"t" + bytes([codepage])
+
+def resolve_encoding(name: Optional[str]) -> str:
+    """Tên bảng mã máy in khai báo; không hợp lệ thì dùng DEFAULT_ENCODING"""
+    if not name:
+        return DEFAULT_ENCODING
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return DEFAULT_ENCODING
+
+def _strip_marks(char: str) -> str:
+    if char in "đĐ":
+        return "d" if char == "đ" else "D"
+    return "".join(part for part in unicodedata.normalize("NFD", char) if not unicodedata.combining(part))
+
+@lru_cache(maxsize=2048)
+def encode_char(char: str, encoding: str) -> bytes:
+    """
+    Mã hóa một ký tự theo bảng mã của máy in. cp1258 không có sẵn chữ có dấu thanh
+    (ví dụ "ệ") nên tách thành chữ gốc ("ê") + dấu thanh tổ hợp; bảng mã không hỗ trợ thì bỏ dấu.
+    """
+    try:
+        return char.encode(encoding)
+    except UnicodeEncodeError:
+        pass
+    decomposed = unicodedata.normalize("NFD", char)
+    base = unicodedata.normalize("NFC", "".join(part for part in decomposed if part not in TONE_MARKS))
+    tones = "".join(part for part in decomposed if part in TONE_MARKS)
+    try:
+        return (base + tones).encode(encoding)
+    except UnicodeEncodeError:
+        return _strip_marks(char).encode(encoding, errors="replace")
+
+def encode_text(text: str, encoding: str = DEFAULT_ENCODING) -> bytes:
+    try:
+        return text.encode(encoding)
+    except UnicodeEncodeError:
+        return b"".join(encode_char(char, encoding) for char in text)
+
+def encode_bill(
+    lines: List[dict], encoding: str = DEFAULT_ENCODING,
+    codepage: Optional[int] = None, cut: bool = True
+) -> bytes:
+    """
+    Biên dịch bill_lines (các dict text/fontSize/fontName/bold/align) thành luồng byte ESC/POS.
+    Lệnh đổi kiểu chỉ được gửi khi kiểu dòng khác dòng trước.
+    """
+    parts = [header_commands(codepage)]
+    current_style = None
+    for line in lines:
+        style = style_commands(
+            line.get("fontSize", 12), bool(line.get("bold")), line.get("align", "left"), line.get("fontName")
+        )
+        if style != current_style:
+            parts.append(style)
+            current_style = style
+        parts.append(encode_text(line.get("text", ""), encoding))
+        parts.append(LF)
+    parts.append(ESC + b"d" + bytes([FEED_LINES]))
+    if cut:
+        parts.append(CUT)
+    return b"".join(parts)
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional
+
+from sqlalchemy.engine import make_url
+
+from app.database.database import SQLALCHEMY_DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+# Kênh NOTIFY dùng chung cho mọi worker
+EVENT_BUS_CHANNEL = "coffeeshop_events"
+# Payload NOTIFY của Postgres phải nhỏ hơn 8000 byte; message lớn hơn (bill dài) được chia nhỏ
+NOTIFY_PAYLOAD_LIMIT = 7900
+# Chờ bao lâu trước khi kết nối lại khi mất kết nối LISTEN/NOTIFY
+EVENT_BUS_RECONNECT_DELAY = 3.0
+
+# deliver(topic, text, coalesce_key): đưa message nhận từ worker khác tới các client cục bộ
+Deliver = Callable[[str, str, object], int]
+
+def _restore_key(key):
+    """coalesce_key đi qua JSON thành list, đổi lại thành tuple để dùng làm key dict"""
+    if isinstance(key, list):
+        return tuple(_restore_key(part) for part in key)
+    return key
+
+class EventBus(ABC):
+    """
+    Kênh phát message giữa các worker. Hub tự gửi cho client cục bộ, bus chỉ lo
+    chuyển message tới các worker khác và gọi deliver() khi nhận được từ chúng.
+    """
+    # True khi có thể có subscriber ở process khác (hub không được bỏ qua publish)
+    distributed = False
+
+    @abstractmethod
+    async def start(self, deliver: Deliver):
+        """Đăng ký deliver để nhận message từ các worker khác"""
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    def publish(self, topic: str, text: str, coalesce_key=None, origin: Optional[Deliver] = None):
+        """origin: deliver của hub gửi, hub đó đã tự gửi cho client cục bộ"""
+
+class InMemoryEventBus(EventBus):
+    """Bus trong process: chạy một worker, hoặc nhiều hub trong cùng process khi test"""
+    def __init__(self):
+        self._subscribers: List[Deliver] = []
+
+    @property
+    def distributed(self) -> bool:
+        return len(self._subscribers) > 1
+
+    async def start(self, deliver: Deliver):
+        self._subscribers.append(deliver)
+
+    async def stop(self):
+        self._subscribers.clear()
+
+    def publish(self, topic: str, text: str, coalesce_key=None, origin: Optional[Deliver] = None):
+        for deliver in list(self._subscribers):
+            # So sánh bằng == vì mỗi lần truy cập bound method tạo object mới
+            if deliver != origin:
+                deliver(topic, text, coalesce_key)
+
+class PostgresEventBus(EventBus):
+    """
+    Bus qua LISTEN/NOTIFY của Postgres (đã có sẵn, không cần thêm Redis).
+    - Gửi: thread riêng lần lượt chạy pg_notify trên một kết nối autocommit,
+      request không phải chờ mạng và thứ tự message của worker được giữ nguyên.
+    - Nhận: kết nối LISTEN đăng ký với event loop (add_reader), không tốn thread.
+    Mỗi worker có origin riêng và bỏ qua message do chính nó gửi.
+    """
+    distributed = True
+
+    def __init__(self, database_url: str, channel: str = EVENT_BUS_CHANNEL):
+        self.dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self.logger = logging.getLogger(__name__)
+        self._deliver: Optional[Deliver] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listen_conn = None
+        self._outbox: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._publisher: Optional[threading.Thread] = None
+        self._partial = {}
+        self._running = False
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        self._loop = asyncio.get_running_loop()
+        self._running = True
+        self._publisher = threading.Thread(target=self._publish_loop, name="event-bus-publisher", daemon=True)
+        self._publisher.start()
+        await self._listen()
+
+    async def stop(self):
+        self._running = False
+        self._close_listener()
+        self._outbox.put(None)
+        if self._publisher:
+            await asyncio.get_running_loop().run_in_executor(None, self._publisher.join, 5.0)
+
+    def publish(self, topic: str, text: str, coalesce_key=None, origin: Optional[Deliver] = None):
+        if not self._running:
+            return
+        # ensure_ascii để độ dài ký tự bằng số byte, cắt payload không làm vỡ ký tự UTF-8
+        envelope = json.dumps([topic, coalesce_key, text])
+        size = NOTIFY_PAYLOAD_LIMIT - len(self.origin) - 16
+        pieces = [envelope[i:i + size] for i in range(0, len(envelope), size)]
+        for index, piece in enumerate(pieces):
+            self._outbox.put(f"{self.origin} {index} {len(pieces)} {piece}")
+
+    def _connect(self):
+        import psycopg2
+        import psycopg2.extensions
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def _publish_loop(self):
+        conn = None
+        payload = None
+        while True:
+            if payload is None:
+                payload = self._outbox.get()
+                if payload is None:
+                    break
+            try:
+                if conn is None:
+                    conn = self._connect()
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+                payload = None
+            except Exception as e:
+                self.logger.error(f"Lỗi khi gửi NOTIFY: {str(e)}")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                    conn = None
+                if not self._running:
+                    break
+                threading.Event().wait(EVENT_BUS_RECONNECT_DELAY)
+        if conn is not None:
+            conn.close()
+
+    async def _listen(self):
+        try:
+            conn = await self._loop.run_in_executor(None, self._connect)
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+        except Exception as e:
+            self.logger.error(f"Không thể LISTEN kênh {self.channel}: {str(e)}")
+            self._schedule_reconnect()
+            return
+        self._listen_conn = conn
+        self._partial.clear()
+        self._loop.add_reader(conn.fileno(), self._on_notify)
+        self.logger.info(f"Event bus đang nghe kênh {self.channel} (origin {self.origin})")
+
+    def _close_listener(self):
+        if self._listen_conn is None:
+            return
+        try:
+            self._loop.remove_reader(self._listen_conn.fileno())
+            self._listen_conn.close()
+        except Exception:
+            pass
+        self._listen_conn = None
+
+    def _schedule_reconnect(self):
+        if self._running:
+            self._loop.call_later(EVENT_BUS_RECONNECT_DELAY, lambda: asyncio.ensure_future(self._listen()))
+
+    def _on_notify(self):
+        try:
+            self._listen_conn.poll()
+        except Exception as e:
+            self.logger.error(f"Mất kết nối LISTEN: {str(e)}")
+            self._close_listener()
+            self._schedule_reconnect()
+            return
+        notifies = self._listen_conn.notifies
+        while notifies:
+            self._handle_payload(notifies.pop(0).payload)
+
+    def _handle_payload(self, payload: str):
+        try:
+            origin, index, total, piece = payload.split(" ", 3)
+            if origin == self.origin:
+                return
+            index, total = int(index), int(total)
+            if total > 1:
+                # Các phần của một message đến liền nhau, theo thứ tự, từ cùng một origin
+                parts = self._partial.setdefault(origin, [])
+                if index == 0:
+                    parts.clear()
+                parts.append(piece)
+                if index < total - 1:
+                    return
+                piece = "".join(self._partial.pop(origin))
+            topic, coalesce_key, text = json.loads(piece)
+            self._deliver(topic, text, _restore_key(coalesce_key))
+        except Exception as e:
+            self.logger.error(f"Bỏ qua event không hợp lệ: {str(e)}")
+
+def create_event_bus() -> EventBus:
+    """
+    Chọn backend theo biến môi trường EVENT_BUS ("postgres" hoặc "memory").
+    Mặc định dùng Postgres khi DATABASE_URL là Postgres, ngược lại dùng bộ nhớ.
+    """
+    backend = os.getenv("EVENT_BUS", "").lower()
+    if not backend:
+        backend = "postgres" if make_url(SQLALCHEMY_DATABASE_URL).get_backend_name() == "postgresql" else "memory"
+    if backend == "postgres":
+        return PostgresEventBus(SQLALCHEMY_DATABASE_URL)
+    return InMemoryEventBus()
@@ -0,0 +1,74 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from contextvars import ContextVar
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+# request_id của request đang xử lý, được middleware gán và gắn vào mọi log record
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_listeners = []
+
+class RequestContextFilter(logging.Filter):
+    """Gắn request_id hiện tại vào log record (chạy ở thread/task gọi log, trước khi vào queue)"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+def _stop_listeners():
+    for listener in _listeners:
+        listener.stop()
+    _listeners.clear()
+
+atexit.register(_stop_listeners)
+
+def _make_queue_handler(*handlers: logging.Handler) -> logging.handlers.QueueHandler:
+    """
+    Tạo QueueHandler: code xử lý request chỉ đẩy record vào queue,
+    việc ghi ra stdout/file do thread của QueueListener đảm nhận (không chặn event loop).
+    """
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return queue_handler
+
+def setup_logging(level: str = None):
+    """
+    Cấu hình logging gốc một lần cho cả ứng dụng: stdout + app.log qua QueueListener.
+    Mức log lấy từ biến môi trường LOG_LEVEL (mặc định INFO).
+    """
+    root = logging.getLogger()
+    if getattr(root, "_coffeeshop_configured", False):
+        return
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    root.handlers = [
+        _make_queue_handler(logging.StreamHandler(sys.stdout), logging.FileHandler('app.log'))
+    ]
+    root.setLevel(level)
+    root._coffeeshop_configured = True
+
+def get_file_logger(name: str, filename: str) -> logging.Logger:
+    """
+    Lấy logger ghi thêm ra file riêng (ví dụ orders.log) qua queue.
+    Record vẫn propagate lên root nên stdout/app.log không cần handler trùng lặp.
+    """
+    logger = logging.getLogger(name)
+    if not any(getattr(handler, "_log_file", None) == filename for handler in logger.handlers):
+        handler = _make_queue_handler(logging.FileHandler(filename))
+        handler._log_file = filename
+        logger.addHandler(handler)
+    return logger
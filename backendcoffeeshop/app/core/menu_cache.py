@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.database.database import SessionLocal
+from app.models import MenuItem, MenuGroup
+
+logger = logging.getLogger(__name__)
+
+# Khoảng thời gian (giây) giữa hai lần kiểm tra version trong DB.
+# Ghi trong cùng process thì invalidate() ngay, khoảng này chỉ để phát hiện thay đổi từ worker khác.
+MENU_VERSION_CHECK_INTERVAL = 5.0
+
+MenuItemEntry = namedtuple("MenuItemEntry", ["id", "name", "code", "unit", "price", "group_id", "is_active"])
+MenuGroupEntry = namedtuple("MenuGroupEntry", ["id", "name", "description", "station", "is_active"])
+
+def menu_version(db: Session) -> Tuple:
+    """
+    Version của menu trong DB: (số món, updated_at lớn nhất của món, số nhóm, updated_at lớn nhất của nhóm).
+    Một câu SELECT aggregate, không tải dòng nào.
+    """
+    row = db.execute(select(
+        select(func.count(MenuItem.id)).scalar_subquery(),
+        select(func.max(MenuItem.updated_at)).scalar_subquery(),
+        select(func.count(MenuGroup.id)).scalar_subquery(),
+        select(func.max(MenuGroup.updated_at)).scalar_subquery()
+    )).one()
+    return tuple(row)
+
+class MenuCache:
+    """
+    Cache menu (món + nhóm món) trong process, tra theo id.
+    Nạp một lần, được các thao tác ghi menu invalidate ngay; các worker khác
+    nhận ra thay đổi qua menu_version() mỗi MENU_VERSION_CHECK_INTERVAL giây.
+    """
+    def __init__(self, check_interval: float = MENU_VERSION_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._items: Dict[int, MenuItemEntry] = {}
+        self._groups: Dict[int, MenuGroupEntry] = {}
+        self._version: Optional[Tuple] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[Tuple]:
+        return self._version
+
+    def load(self, db: Session, version: Optional[Tuple] = None):
+        """Nạp lại toàn bộ menu từ DB"""
+        if version is None:
+            version = menu_version(db)
+        items = {
+            row.id: MenuItemEntry(*row)
+            for row in db.query(
+                MenuItem.id, MenuItem.name, MenuItem.code, MenuItem.unit,
+                MenuItem.price, MenuItem.group_id, MenuItem.is_active
+            )
+        }
+        groups = {
+            row.id: MenuGroupEntry(*row)
+            for row in db.query(MenuGroup.id, MenuGroup.name, MenuGroup.description, MenuGroup.station, MenuGroup.is_active)
+        }
+        self._items, self._groups = items, groups
+        self._version = version
+        self._checked_at = time.monotonic()
+        logger.info(f"Đã nạp menu cache: {len(items)} món, {len(groups)} nhóm")
+
+    def invalidate(self):
+        """Đánh dấu cache cũ, lần đọc sau sẽ nạp lại (gọi sau khi commit thay đổi menu)"""
+        self._version = None
+
+    def ensure_fresh(self, db: Session):
+        """Nạp lại nếu cache đã bị invalidate hoặc version trong DB đã đổi"""
+        if self._version is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return
+            version = menu_version(db)
+            if version != self._version:
+                self.load(db, version)
+            else:
+                self._checked_at = time.monotonic()
+
+    def warm_up(self):
+        """Nạp cache lúc khởi động bằng session riêng"""
+        db = SessionLocal()
+        try:
+            self.ensure_fresh(db)
+        finally:
+            db.close()
+
+    def get_item(self, db: Session, menu_item_id: int) -> Optional[MenuItemEntry]:
+        self.ensure_fresh(db)
+        return self._items.get(menu_item_id)
+
+    def get_items(self, db: Session, menu_item_ids: Iterable[int]) -> Dict[int, MenuItemEntry]:
+        """Tra nhiều món, chỉ trả về các id có trong menu"""
+        self.ensure_fresh(db)
+        items = self._items
+        return {menu_item_id: items[menu_item_id] for menu_item_id in menu_item_ids if menu_item_id in items}
+
+    def get_group(self, db: Session, menu_group_id: int) -> Optional[MenuGroupEntry]:
+        self.ensure_fresh(db)
+        return self._groups.get(menu_group_id)
+
+    def item_name(self, db: Session, menu_item_id: int, default: str = "") -> str:
+        menu_item = self.get_item(db, menu_item_id)
+        return menu_item.name if menu_item else default
+
+    def item_station(self, db: Session, menu_item_id: int, default: Optional[str] = None) -> Optional[str]:
+        """Quầy in của món, lấy theo nhóm món"""
+        menu_item = self.get_item(db, menu_item_id)
+        group = self._groups.get(menu_item.group_id) if menu_item else None
+        return (group.station if group else None) or default
+
+menu_cache = MenuCache()
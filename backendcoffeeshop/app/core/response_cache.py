@@ -0,0 +1,42 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+from fastapi import Response
+
+class JSONResponseCache:
+    """
+    Cache body JSON đã encode sẵn (bytes) theo key, ví dụ (skip, limit).
+    Mỗi entry gắn với version dữ liệu lúc build; version trong DB đổi (sau khi ghi menu,
+    ở bất kỳ worker nào) thì entry được build lại ở lần đọc kế tiếp.
+    """
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: Hashable, version, build: Callable[[], bytes]) -> bytes:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        body = build()
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def raw_json_response(body: bytes, response: Response) -> Response:
+    """Trả body JSON có sẵn, giữ các header đã gắn vào response (ETag, Last-Modified...)"""
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+menu_items_response_cache = JSONResponseCache()
+menu_groups_response_cache = JSONResponseCache()
@@ -0,0 +1,59 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, cast, extract, or_, Integer
+from sqlalchemy.orm import Session
+from app.models import Order, OrderItem, Payment
+
+# Các endpoint doanh thu trong main.py (/dashboard/revenue, /dashboard/revenue-by-hour, /payments/summary/)
+# đều đọc từ đây: khoảng thời gian nửa mở [start, end) để dùng được index trên created_at / time_in.
+
+def day_window(day: Optional[date] = None) -> Tuple[datetime, datetime]:
+    """[00:00 ngày day, 00:00 ngày hôm sau), mặc định hôm nay theo UTC như các endpoint dashboard cũ"""
+    start_dt = datetime.combine(day or datetime.utcnow().date(), time(0, 0, 0))
+    return start_dt, start_dt + timedelta(days=1)
+
+def payment_buckets(db: Session, start_dt: datetime, end_dt: datetime) -> List:
+    """
+    Một câu GROUP BY (giờ, phương thức) trên payments trong [start_dt, end_dt), bỏ payment "failed".
+    Mỗi dòng có hour, method, total_amount, count; các hàm bên dưới gộp lại theo giờ hoặc theo phương thức.
+    """
+    hour = cast(extract('hour', Payment.created_at), Integer)
+    return db.query(
+        hour.label('hour'),
+        Payment.payment_method.label('method'),
+        func.sum(Payment.amount).label('total_amount'),
+        func.count(Payment.id).label('count')
+    ).filter(
+        Payment.created_at >= start_dt,
+        Payment.created_at < end_dt,
+        or_(Payment.payment_status.is_(None), Payment.payment_status != "failed")
+    ).group_by(hour, Payment.payment_method).order_by(hour).all()
+
+def _group(buckets: List, key: str) -> List[Dict]:
+    groups: Dict = {}
+    for bucket in buckets:
+        group = groups.setdefault(getattr(bucket, key), {"total_amount": 0, "count": 0})
+        group["total_amount"] += bucket.total_amount or 0
+        group["count"] += bucket.count
+    return [{key: value, **totals} for value, totals in groups.items()]
+
+def totals_by_hour(buckets: List) -> List[Dict]:
+    return sorted(_group(buckets, "hour"), key=lambda group: group["hour"])
+
+def totals_by_method(buckets: List) -> List[Dict]:
+    return _group(buckets, "method")
+
+def paid_revenue(buckets: List) -> float:
+    return sum(bucket.total_amount or 0 for bucket in buckets)
+
+def pending_order_revenue(db: Session, start_dt: datetime, end_dt: datetime) -> float:
+    """Doanh thu dự kiến: tổng quantity * unit_price của các order pending có time_in trong [start_dt, end_dt)"""
+    return db.query(
+        func.coalesce(func.sum(OrderItem.quantity * OrderItem.unit_price), 0)
+    ).join(
+        Order, OrderItem.order_id == Order.id
+    ).filter(
+        Order.time_in >= start_dt,
+        Order.time_in < end_dt,
+        Order.status == "pending"
+    ).scalar() or 0
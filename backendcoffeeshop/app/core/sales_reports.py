@@ -0,0 +1,285 @@
+import asyncio
+import logging
+import os
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional
+from sqlalchemy import func, and_, or_, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.database.database import SessionLocal
+from app.models import (
+    Order, Payment, MenuItem, MenuGroup, Product, ProductPerformance,
+    SalesHourly, SalesHourlyItem, SalesReport
+)
+
+logger = logging.getLogger(__name__)
+
+# Cấu hình timezone cho Việt Nam (time_in của order lưu theo giờ Việt Nam)
+VIETNAM_TIMEZONE = timezone(timedelta(hours=7))
+
+REPORT_TYPE_DAILY = "daily"
+# Giờ chốt doanh số ngày hôm trước (giờ Việt Nam), sau khi quán đã đóng cửa
+SALES_REPORT_CLOSE_TIME = os.getenv("SALES_REPORT_CLOSE_TIME", "03:00")
+# Số ngày tối đa chốt bù khi server tắt qua nhiều đêm
+SALES_REPORT_CATCH_UP_DAYS = int(os.getenv("SALES_REPORT_CATCH_UP_DAYS", "7"))
+# Chu kỳ (giây) job chốt lại các ngày đã chốt nhưng có order thay đổi sau đó
+SALES_REPORT_REFRESH_INTERVAL = float(os.getenv("SALES_REPORT_REFRESH_INTERVAL", "600"))
+# Khóa advisory Postgres: nhiều worker uvicorn thì chỉ một worker chạy job tại một thời điểm
+SALES_REPORT_LOCK_KEY = 72350241
+TOP_PRODUCTS_LIMIT = 10
+
+def _daily_reports(db: Session):
+    return db.query(SalesReport).filter(SalesReport.report_type == REPORT_TYPE_DAILY)
+
+def mark_days_dirty(db: Session, days: Iterable[date]):
+    """
+    Đánh dấu báo cáo đã chốt của các ngày này cần chốt lại. Gọi trong transaction sửa order
+    (không commit): ngày chưa chốt thì không có gì để đánh dấu.
+    """
+    days = {day for day in days if day is not None}
+    if days:
+        _daily_reports(db).filter(SalesReport.report_date.in_(days)).update(
+            {SalesReport.pending_changes: SalesReport.pending_changes + 1}, synchronize_session=False
+        )
+
+def mark_range_dirty(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """Như mark_days_dirty cho cả khoảng [start_date, end_date] (bỏ trống: không giới hạn)"""
+    query = _daily_reports(db)
+    if start_date:
+        query = query.filter(SalesReport.report_date >= start_date)
+    if end_date:
+        query = query.filter(SalesReport.report_date <= end_date)
+    query.update({SalesReport.pending_changes: SalesReport.pending_changes + 1}, synchronize_session=False)
+
+def _lock_report(db: Session, day: date, start_dt: datetime, end_dt: datetime) -> SalesReport:
+    """Lấy (tạo nếu chưa có) dòng báo cáo của ngày và khóa nó đến khi commit"""
+    query = _daily_reports(db).filter(SalesReport.report_date == day)
+    if query.first() is None:
+        try:
+            db.add(SalesReport(
+                report_date=day, report_type=REPORT_TYPE_DAILY, start_date=start_dt, end_date=end_dt,
+                total_sales=0, total_orders=0, total_customers=0, average_order_value=0,
+                payment_methods={}, top_products=[], top_categories=[], pending_changes=0
+            ))
+            db.commit()
+        except IntegrityError:
+            # Process khác vừa tạo cùng ngày
+            db.rollback()
+    # Sửa order đánh dấu ngày bẩn phải chờ lần chốt này commit, nên không lọt thay đổi nào
+    return query.with_for_update().populate_existing().one()
+
+def close_business_day(db: Session, day: date) -> SalesReport:
+    """
+    Chốt một ngày vào sales_reports (report_type "daily") và product_performance, tính bằng vài câu
+    GROUP BY trên rollup sales_hourly / sales_hourly_items. Chạy lại cho cùng ngày thì ghi đè (idempotent)
+    và xóa đánh dấu pending_changes. Commit khi xong.
+    """
+    start_dt = datetime.combine(day, time(0, 0, 0))
+    end_dt = start_dt + timedelta(days=1)
+    report = _lock_report(db, day, start_dt, end_dt)
+    seen_changes = report.pending_changes
+
+    total_orders, total_sales = db.query(
+        func.coalesce(func.sum(SalesHourly.order_count), 0),
+        func.coalesce(func.sum(SalesHourly.revenue), 0)
+    ).filter(SalesHourly.sale_date == day, SalesHourly.status == "completed").one()
+
+    quantity = func.sum(SalesHourlyItem.quantity)
+    items = db.query(
+        SalesHourlyItem.menu_item_id,
+        MenuItem.name,
+        MenuItem.group_id,
+        MenuGroup.name,
+        quantity.label("quantity"),
+        func.sum(SalesHourlyItem.revenue)
+    ).outerjoin(
+        MenuItem, MenuItem.id == SalesHourlyItem.menu_item_id
+    ).outerjoin(
+        MenuGroup, MenuGroup.id == MenuItem.group_id
+    ).filter(
+        SalesHourlyItem.sale_date == day,
+        SalesHourlyItem.status == "completed"
+    ).group_by(
+        SalesHourlyItem.menu_item_id, MenuItem.name, MenuItem.group_id, MenuGroup.name
+    ).having(quantity != 0).order_by(quantity.desc(), SalesHourlyItem.menu_item_id).all()
+
+    categories = {}
+    for _, _, group_id, group_name, item_quantity, item_revenue in items:
+        category = categories.setdefault(group_id, {"id": group_id, "name": group_name, "quantity": 0, "revenue": 0})
+        category["quantity"] += item_quantity
+        category["revenue"] += item_revenue
+
+    payment_methods = db.query(
+        Payment.payment_method,
+        func.coalesce(func.sum(Payment.amount), 0)
+    ).filter(
+        Payment.created_at >= start_dt,
+        Payment.created_at < end_dt,
+        or_(Payment.payment_status.is_(None), Payment.payment_status != "failed")
+    ).group_by(Payment.payment_method).all()
+    total_customers = db.query(func.count(func.distinct(Order.customer_phone))).filter(
+        Order.time_in >= start_dt,
+        Order.time_in < end_dt,
+        Order.status == "completed",
+        Order.customer_phone.isnot(None)
+    ).scalar() or 0
+
+    report.start_date = start_dt
+    report.end_date = end_dt
+    report.total_sales = total_sales
+    report.total_orders = total_orders
+    report.total_customers = total_customers
+    report.average_order_value = round(total_sales / total_orders, 2) if total_orders else 0
+    report.payment_methods = {method or "": amount for method, amount in payment_methods}
+    report.top_products = [
+        {"id": menu_item_id, "name": name, "quantity": item_quantity, "revenue": item_revenue}
+        for menu_item_id, name, _, _, item_quantity, item_revenue in items[:TOP_PRODUCTS_LIMIT]
+    ]
+    report.top_categories = sorted(categories.values(), key=lambda category: category["revenue"], reverse=True)
+    # Trừ đúng số thay đổi đã thấy lúc bắt đầu (DB không khóa được dòng thì thay đổi đến sau vẫn còn đánh dấu)
+    report.pending_changes = SalesReport.pending_changes - seen_changes
+
+    # Sản phẩm khớp món theo code; lợi nhuận = doanh thu - số lượng * giá vốn
+    performance = db.query(
+        Product.id,
+        Product.cost,
+        func.sum(SalesHourlyItem.quantity),
+        func.sum(SalesHourlyItem.revenue)
+    ).join(
+        MenuItem, MenuItem.code == Product.code
+    ).join(
+        SalesHourlyItem, and_(
+            SalesHourlyItem.menu_item_id == MenuItem.id,
+            SalesHourlyItem.sale_date == day,
+            SalesHourlyItem.status == "completed"
+        )
+    ).group_by(Product.id, Product.cost).all()
+
+    try:
+        db.query(ProductPerformance).filter(ProductPerformance.report_date == day).delete(synchronize_session="fetch")
+        db.add_all([
+            ProductPerformance(
+                product_id=product_id,
+                report_date=day,
+                date=start_dt,
+                quantity_sold=product_sold,
+                revenue=product_revenue,
+                profit=product_revenue - product_sold * (cost or 0)
+            )
+            for product_id, cost, product_sold, product_revenue in performance
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    db.refresh(report)
+    logger.info(f"Đã chốt doanh số ngày {day}: {total_orders} order, {total_sales} doanh thu, {len(performance)} sản phẩm")
+    return report
+
+def last_closable_day(now: Optional[datetime] = None) -> date:
+    """Ngày gần nhất đã qua giờ chốt: sau SALES_REPORT_CLOSE_TIME là hôm qua, trước đó là hôm kia"""
+    now = now or datetime.now(VIETNAM_TIMEZONE).replace(tzinfo=None)
+    close_time = time.fromisoformat(SALES_REPORT_CLOSE_TIME)
+    yesterday = now.date() - timedelta(days=1)
+    return yesterday if now.time() >= close_time else yesterday - timedelta(days=1)
+
+def close_pending_days(db: Session, now: Optional[datetime] = None) -> List[date]:
+    """
+    Chốt các ngày chưa có báo cáo (tối đa SALES_REPORT_CATCH_UP_DAYS ngày đến last_closable_day())
+    và chốt lại mọi ngày đã chốt nhưng có order thay đổi sau đó (pending_changes > 0)
+    """
+    last_day = last_closable_day(now)
+    first_day = last_day - timedelta(days=SALES_REPORT_CATCH_UP_DAYS - 1)
+    closed_days = {
+        report_date for (report_date,) in db.query(SalesReport.report_date).filter(
+            SalesReport.report_type == REPORT_TYPE_DAILY,
+            SalesReport.report_date >= first_day,
+            SalesReport.report_date <= last_day
+        )
+    }
+    days = set()
+    day = first_day
+    while day <= last_day:
+        if day not in closed_days:
+            days.add(day)
+        day += timedelta(days=1)
+    days.update(
+        report_date for (report_date,) in db.query(SalesReport.report_date).filter(
+            SalesReport.report_type == REPORT_TYPE_DAILY,
+            SalesReport.report_date <= last_day,
+            SalesReport.pending_changes > 0
+        )
+    )
+    for day in sorted(days):
+        close_business_day(db, day)
+    return sorted(days)
+
+@contextmanager
+def report_job_lock(db: Session) -> Iterator[bool]:
+    """
+    Khóa advisory Postgres trên một kết nối riêng (các lần commit của job không nhả khóa).
+    Trả về False nếu worker khác đang giữ khóa; DB khác (SQLite khi dev) chỉ có một process nên luôn True.
+    """
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        yield True
+        return
+    with bind.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SALES_REPORT_LOCK_KEY}).scalar()
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SALES_REPORT_LOCK_KEY})
+            conn.commit()
+
+class SalesReportScheduler:
+    """
+    Job trong process: sau SALES_REPORT_CLOSE_TIME chốt các ngày chưa có báo cáo, và cứ
+    SALES_REPORT_REFRESH_INTERVAL giây chốt lại các ngày có order thay đổi. Mọi worker đều chạy job
+    nhưng chỉ worker giữ được report_job_lock mới chốt.
+    """
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def run_once(self) -> List[date]:
+        db = SessionLocal()
+        try:
+            with report_job_lock(db) as acquired:
+                if not acquired:
+                    return []
+                return close_pending_days(db)
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            try:
+                # Truy vấn DB đồng bộ: chạy ở thread riêng để không chặn event loop
+                days = await asyncio.to_thread(self.run_once)
+                if days:
+                    self.logger.info(f"Đã chốt doanh số các ngày: {', '.join(str(day) for day in days)}")
+            except Exception as e:
+                self.logger.error(f"Lỗi khi chốt doanh số ngày: {str(e)}")
+            await asyncio.sleep(self._seconds_until_next_run())
+
+    def _seconds_until_next_run(self) -> float:
+        now = datetime.now(VIETNAM_TIMEZONE).replace(tzinfo=None)
+        next_run = datetime.combine(now.date(), time.fromisoformat(SALES_REPORT_CLOSE_TIME))
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return min((next_run - now).total_seconds(), SALES_REPORT_REFRESH_INTERVAL)
+
+sales_report_scheduler = SalesReportScheduler()
@@ -0,0 +1,199 @@
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, cast, extract, type_coerce, Integer, Date
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models import Order, OrderItem, Shift, SalesHourly, SalesHourlyItem
+from app.core.sales_reports import mark_days_dirty, mark_range_dirty
+
+logger = logging.getLogger(__name__)
+
+# (sale_date, hour, shift, status) và (sale_date, hour, shift, status, menu_item_id)
+BUCKET_COLUMNS = ("sale_date", "hour", "shift", "status")
+ITEM_BUCKET_COLUMNS = BUCKET_COLUMNS + ("menu_item_id",)
+
+class Contribution:
+    """Phần đóng góp của một nhóm order vào các dòng rollup: khóa bucket → [giá trị, ...]"""
+    def __init__(self):
+        self.orders: Dict[Tuple, List[float]] = {}
+        self.items: Dict[Tuple, List[float]] = {}
+
+    def add_order(self, key: Tuple, revenue: float):
+        values = self.orders.setdefault(key, [0, 0.0])
+        values[0] += 1
+        values[1] += revenue
+
+    def add_item(self, key: Tuple, quantity: int, revenue: float):
+        values = self.items.setdefault(key, [0, 0.0])
+        values[0] += quantity
+        values[1] += revenue
+
+def _delta(after: Dict[Tuple, List[float]], before: Dict[Tuple, List[float]]) -> List[Tuple[Tuple, List[float]]]:
+    deltas = []
+    for key in sorted(set(after) | set(before)):
+        new_values = after.get(key, (0, 0.0))
+        old_values = before.get(key, (0, 0.0))
+        values = [new - old for new, old in zip(new_values, old_values)]
+        if any(values):
+            deltas.append((key, values))
+    return deltas
+
+class SalesRollup:
+    """
+    Duy trì sales_hourly / sales_hourly_items theo từng order: trước khi sửa order lấy snapshot(),
+    sau khi sửa (chưa commit) gọi apply() để cộng phần chênh lệch vào các bucket bằng upsert.
+    Cộng/trừ delta nên nhiều request ghi cùng bucket không đè nhau. Không commit; lỗi rollup chỉ ghi log,
+    không làm hỏng order (dựng lại bằng rebuild()).
+    """
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def snapshot(self, db: Session, order_ids: Iterable[int]) -> Contribution:
+        """Đóng góp hiện tại (theo DB, trong transaction đang mở) của các order"""
+        contribution = Contribution()
+        order_ids = [order_id for order_id in set(order_ids) if order_id is not None]
+        if not order_ids:
+            return contribution
+        db.flush()
+        orders = db.query(
+            Order.id,
+            Order.time_in,
+            func.coalesce(func.lower(Shift.shift_type), ""),
+            func.coalesce(Order.status, ""),
+            func.coalesce(Order.total_amount, 0)
+        ).outerjoin(
+            Shift, Order.shift_id == Shift.id
+        ).filter(Order.id.in_(order_ids)).all()
+
+        buckets = {}
+        for order_id, time_in, shift, status, revenue in orders:
+            # Thống kê lọc theo time_in, order không có time_in không vào bucket nào
+            if time_in is None:
+                continue
+            buckets[order_id] = (time_in.date(), time_in.hour, shift, status)
+            contribution.add_order(buckets[order_id], revenue)
+        if not buckets:
+            return contribution
+
+        items = db.query(
+            OrderItem.order_id,
+            func.coalesce(OrderItem.menu_item_id, 0),
+            func.coalesce(func.sum(OrderItem.quantity), 0),
+            func.coalesce(func.sum(OrderItem.quantity * OrderItem.unit_price), 0)
+        ).filter(
+            OrderItem.order_id.in_(list(buckets))
+        ).group_by(OrderItem.order_id, OrderItem.menu_item_id).all()
+        for order_id, menu_item_id, quantity, revenue in items:
+            contribution.add_item(buckets[order_id] + (menu_item_id,), quantity, revenue)
+        return contribution
+
+    def apply(self, db: Session, order_ids: Iterable[int], before: Optional[Contribution] = None):
+        """Cập nhật rollup theo trạng thái hiện tại của các order (before: snapshot trước khi sửa)"""
+        try:
+            after = self.snapshot(db, order_ids)
+            before = before or Contribution()
+            order_deltas = _delta(after.orders, before.orders)
+            item_deltas = _delta(after.items, before.items)
+            if not order_deltas and not item_deltas:
+                return
+            # Savepoint: lỗi rollup không làm hỏng transaction của order
+            with db.begin_nested():
+                self._upsert(db, SalesHourly, BUCKET_COLUMNS, ("order_count", "revenue"), order_deltas)
+                self._upsert(db, SalesHourlyItem, ITEM_BUCKET_COLUMNS, ("quantity", "revenue"), item_deltas)
+                # Ngày đã chốt báo cáo thì job sẽ chốt lại
+                mark_days_dirty(db, [key[0] for key, _ in order_deltas + item_deltas])
+        except Exception as e:
+            self.logger.error(f"Không thể cập nhật sales rollup cho order {list(order_ids)}: {str(e)}")
+
+    def _upsert(self, db: Session, model, key_columns: Tuple[str, ...], value_columns: Tuple[str, ...], deltas):
+        if not deltas:
+            return
+        table = model.__table__
+        rows = [
+            {**dict(zip(key_columns, key)), **dict(zip(value_columns, values))}
+            for key, values in deltas
+        ]
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            stmt = insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key_columns),
+                set_={column: table.c[column] + stmt.excluded[column] for column in value_columns}
+            )
+            db.execute(stmt, rows)
+            return
+        # DB khác: UPDATE cộng dồn, chưa có dòng thì INSERT
+        for row in rows:
+            updated = db.execute(
+                table.update().where(*[table.c[column] == row[column] for column in key_columns]).values(
+                    {column: table.c[column] + row[column] for column in value_columns}
+                )
+            ).rowcount
+            if not updated:
+                db.execute(table.insert().values(row))
+
+    def rebuild(self, db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Tuple[int, int]:
+        """
+        Dựng lại rollup từ orders/order_items (cả bảng hoặc các ngày trong [start_date, end_date])
+        bằng DELETE + INSERT ... SELECT GROUP BY, rồi commit. Trả về (số dòng sales_hourly, số dòng sales_hourly_items).
+        Nên chạy lúc ít order mới: order ghi trong lúc dựng lại có thể bị tính lệch.
+        """
+        sale_date = type_coerce(func.date(Order.time_in), Date)
+        hour = cast(extract("hour", Order.time_in), Integer)
+        shift = func.coalesce(func.lower(Shift.shift_type), "")
+        status = func.coalesce(Order.status, "")
+        filters = [Order.time_in.isnot(None)]
+        # Lọc theo time_in để dùng được index của orders
+        if start_date:
+            filters.append(Order.time_in >= datetime.combine(start_date, time(0, 0, 0)))
+        if end_date:
+            filters.append(Order.time_in < datetime.combine(end_date + timedelta(days=1), time(0, 0, 0)))
+
+        try:
+            for model in (SalesHourly, SalesHourlyItem):
+                query = db.query(model)
+                if start_date:
+                    query = query.filter(model.sale_date >= start_date)
+                if end_date:
+                    query = query.filter(model.sale_date <= end_date)
+                query.delete(synchronize_session=False)
+
+            orders = db.query(
+                sale_date, hour, shift, status,
+                func.count(Order.id),
+                func.coalesce(func.sum(Order.total_amount), 0)
+            ).select_from(Order).outerjoin(
+                Shift, Order.shift_id == Shift.id
+            ).filter(*filters).group_by(sale_date, hour, shift, status)
+            order_rows = db.execute(SalesHourly.__table__.insert().from_select(
+                list(BUCKET_COLUMNS) + ["order_count", "revenue"], orders.statement
+            )).rowcount
+
+            menu_item_id = func.coalesce(OrderItem.menu_item_id, 0)
+            items = db.query(
+                sale_date, hour, shift, status, menu_item_id,
+                func.coalesce(func.sum(OrderItem.quantity), 0),
+                func.coalesce(func.sum(OrderItem.quantity * OrderItem.unit_price), 0)
+            ).select_from(OrderItem).join(
+                Order, OrderItem.order_id == Order.id
+            ).outerjoin(
+                Shift, Order.shift_id == Shift.id
+            ).filter(*filters).group_by(sale_date, hour, shift, status, menu_item_id)
+            item_rows = db.execute(SalesHourlyItem.__table__.insert().from_select(
+                list(ITEM_BUCKET_COLUMNS) + ["quantity", "revenue"], items.statement
+            )).rowcount
+            mark_range_dirty(db, start_date, end_date)
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        self.logger.info(f"Đã dựng lại sales rollup ({start_date or '*'} → {end_date or '*'}): {order_rows} dòng giờ, {item_rows} dòng món")
+        return order_rows, item_rows
+
+    def is_empty(self, db: Session) -> bool:
+        return db.query(SalesHourly.id).first() is None
+
+sales_rollup = SalesRollup()
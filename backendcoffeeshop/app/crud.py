@@ -1,13 +1,17 @@
 from sqlalchemy.orm import Session
 from .database import models
 from .database.database import get_db
+from .core.menu_cache import menu_cache
+from .core.bill_renderer import paper_width_cache
+from .core.sales_rollup import sales_rollup
 from . import schemas
-from typing import List, Optional
+from typing import Iterable, List, Optional
 from datetime import datetime, date
 from fastapi import HTTPException
 from sqlalchemy.exc import IntegrityError
 from passlib.context import CryptContext
-from sqlalchemy import func, extract
+from pydantic import TypeAdapter
+from sqlalchemy import extract, bindparam
 
 def handle_not_found(entity_name: str):
     def decorator(func):
@@ -19,6 +23,9 @@ def handle_not_found(entity_name: str):
         return wrapper
     return decorator
 
+_menu_group_list_adapter = TypeAdapter(List[schemas.MenuGroup])
+_menu_item_list_adapter = TypeAdapter(List[schemas.MenuItem])
+
 # Menu Group CRUD
 @handle_not_found("Menu group")
 def get_menu_group(db: Session, menu_group_id: int):
@@ -27,11 +34,18 @@ def get_menu_group(db: Session, menu_group_id: int):
 def get_menu_groups(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.MenuGroup).offset(skip).limit(limit).all()
 
+def get_menu_groups_json(db: Session, skip: int = 0, limit: int = 100) -> bytes:
+    """Danh sách nhóm món đã encode JSON theo schemas.MenuGroup (dùng cho cache response)"""
+    return _menu_group_list_adapter.dump_json(
+        _menu_group_list_adapter.validate_python(get_menu_groups(db, skip=skip, limit=limit), from_attributes=True)
+    )
+
 def create_menu_group(db: Session, menu_group: schemas.MenuGroupCreate):
     try:
         db_menu_group = models.MenuGroup(**menu_group.dict())
         db.add(db_menu_group)
         db.commit()
+        menu_cache.invalidate()
         db.refresh(db_menu_group)
         return db_menu_group
     except IntegrityError:
@@ -45,6 +59,7 @@ def update_menu_group(db: Session, menu_group_id: int, menu_group: schemas.MenuG
         for key, value in menu_group.dict().items():
             setattr(db_menu_group, key, value)
         db.commit()
+        menu_cache.invalidate()
         db.refresh(db_menu_group)
         return db_menu_group
     except IntegrityError:
@@ -57,6 +72,7 @@ def delete_menu_group(db: Session, menu_group_id: int):
     try:
         db.delete(db_menu_group)
         db.commit()
+        menu_cache.invalidate()
         return db_menu_group
     except IntegrityError:
         db.rollback()
@@ -70,6 +86,12 @@ def get_menu_item(db: Session, menu_item_id: int):
 def get_menu_items(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.MenuItem).offset(skip).limit(limit).all()
 
+def get_menu_items_json(db: Session, skip: int = 0, limit: int = 100) -> bytes:
+    """Danh sách món đã encode JSON theo schemas.MenuItem (dùng cho cache response)"""
+    return _menu_item_list_adapter.dump_json(
+        _menu_item_list_adapter.validate_python(get_menu_items(db, skip=skip, limit=limit), from_attributes=True)
+    )
+
 def create_menu_item(db: Session, menu_item: schemas.MenuItemCreate):
     try:
         db_menu_item = models.MenuItem(
@@ -81,6 +103,7 @@ def create_menu_item(db: Session, menu_item: schemas.MenuItemCreate):
         )
         db.add(db_menu_item)
         db.commit()
+        menu_cache.invalidate()
         db.refresh(db_menu_item)
         return db_menu_item
     except Exception as e:
@@ -94,6 +117,7 @@ def update_menu_item(db: Session, menu_item_id: int, menu_item: schemas.MenuItem
         for key, value in menu_item.dict().items():
             setattr(db_menu_item, key, value)
         db.commit()
+        menu_cache.invalidate()
         db.refresh(db_menu_item)
         return db_menu_item
     except IntegrityError:
@@ -106,6 +130,7 @@ def delete_menu_item(db: Session, menu_item_id: int):
     try:
         db.delete(db_menu_item)
         db.commit()
+        menu_cache.invalidate()
         return db_menu_item
     except IntegrityError:
         db.rollback()
@@ -280,6 +305,100 @@ def delete_staff_schedule(db: Session, schedule_id: int):
     return db_schedule
 
 # Order CRUD
+def get_menu_items_by_ids(db: Session, menu_item_ids: Iterable[int]):
+    """Tra nhiều món qua menu cache, trả về dict id -> MenuItemEntry (chỉ các id tồn tại)"""
+    return menu_cache.get_items(db, set(menu_item_ids))
+
+def bulk_create_order_items(db: Session, order_id: int, items: List[schemas.OrderItemCreate]) -> int:
+    """Thêm toàn bộ item của một order bằng một lệnh INSERT nhiều dòng (executemany), không commit"""
+    rows = [
+        {
+            "order_id": order_id,
+            "menu_item_id": item.menu_item_id,
+            "quantity": item.quantity,
+            "unit_price": item.unit_price,
+            "total_price": item.total_price,
+            "note": item.note
+        }
+        for item in items
+    ]
+    if rows:
+        db.execute(models.OrderItem.__table__.insert(), rows)
+    return len(rows)
+
+def order_item_key(menu_item_id: int, note: Optional[str]):
+    """Khóa so khớp item của order: (menu_item_id, note)"""
+    return (menu_item_id, note or "")
+
+def sync_order_items(db: Session, order_id: int, items: List[schemas.OrderItemCreate]) -> List[dict]:
+    """
+    Đồng bộ items của order với danh sách mới bằng cách so khớp dòng cũ theo (menu_item_id, note):
+    chỉ UPDATE dòng thay đổi, INSERT dòng mới, DELETE dòng thừa (mỗi loại một lệnh), không commit.
+    Trả về delta số lượng theo từng khóa đã thay đổi:
+    [{"menu_item_id", "note", "old_quantity", "new_quantity"}] để in phiếu bếp dùng lại.
+    """
+    order_items = models.OrderItem.__table__
+    existing_rows = db.query(
+        models.OrderItem.id,
+        models.OrderItem.menu_item_id,
+        models.OrderItem.quantity,
+        models.OrderItem.unit_price,
+        models.OrderItem.total_price,
+        models.OrderItem.note
+    ).filter(models.OrderItem.order_id == order_id).order_by(models.OrderItem.id).all()
+
+    existing_by_key = {}
+    old_quantities = {}
+    for row in existing_rows:
+        key = order_item_key(row.menu_item_id, row.note)
+        existing_by_key.setdefault(key, []).append(row)
+        old_quantities[key] = old_quantities.get(key, 0) + row.quantity
+
+    updates = []
+    inserts = []
+    new_quantities = {}
+    for item in items:
+        key = order_item_key(item.menu_item_id, item.note)
+        new_quantities[key] = new_quantities.get(key, 0) + item.quantity
+        matches = existing_by_key.get(key)
+        if not matches:
+            inserts.append(item)
+            continue
+        row = matches.pop(0)
+        if (row.quantity, row.unit_price, row.total_price, row.note) != (item.quantity, item.unit_price, item.total_price, item.note):
+            updates.append({
+                "_id": row.id,
+                "quantity": item.quantity,
+                "unit_price": item.unit_price,
+                "total_price": item.total_price,
+                "note": item.note
+            })
+
+    delete_ids = [row.id for rows in existing_by_key.values() for row in rows]
+
+    if updates:
+        db.execute(
+            order_items.update().where(order_items.c.id == bindparam("_id")),
+            updates
+        )
+    if inserts:
+        bulk_create_order_items(db, order_id, inserts)
+    if delete_ids:
+        db.execute(order_items.delete().where(order_items.c.id.in_(delete_ids)))
+
+    delta = []
+    for key in list(new_quantities) + [key for key in old_quantities if key not in new_quantities]:
+        old_quantity = old_quantities.get(key, 0)
+        new_quantity = new_quantities.get(key, 0)
+        if old_quantity != new_quantity:
+            delta.append({
+                "menu_item_id": key[0],
+                "note": key[1],
+                "old_quantity": old_quantity,
+                "new_quantity": new_quantity
+            })
+    return delta
+
 def create_order(db: Session, order: schemas.OrderCreate):
     # Lấy shift đang hoạt động
     active_shift = db.query(models.Shift).filter(
@@ -290,48 +409,45 @@ def create_order(db: Session, order: schemas.OrderCreate):
     if not active_shift:
         raise ValueError("Không tìm thấy ca làm việc đang hoạt động")
 
-    db_order = models.Order(
-        table_id=order.table_id,
-        staff_id=order.staff_id,
-        shift_id=active_shift.id,  # Sử dụng shift đang hoạt động
-        status=order.status,
-        total_amount=order.total_amount,
-        note=order.note,
-        order_code=order.order_code,
-        payment_status="unpaid"
-    )
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
-
-    # Create order items
+    # Kiểm tra toàn bộ menu_item_id bằng một query, bỏ qua item không tồn tại
+    menu_items = get_menu_items_by_ids(db, (item.menu_item_id for item in order.items))
+    valid_items = []
     for item in order.items:
-        print(f"[ORDER] Đang xử lý item: {item}")
-        menu_item = db.query(models.MenuItem).filter(models.MenuItem.id == item.menu_item_id).first()
-        if not menu_item:
+        if item.menu_item_id not in menu_items:
             print(f"[ORDER] Không tìm thấy menu_item với id: {item.menu_item_id}, bỏ qua!")
-            continue  # Bỏ qua nếu menu_item không tồn tại
-        db_item = models.OrderItem(
-            order_id=db_order.id,
-            menu_item_id=item.menu_item_id,
-            quantity=item.quantity,
-            unit_price=item.unit_price,
-            total_price=item.total_price,
-            note=item.note
+            continue
+        valid_items.append(item)
+
+    try:
+        db_order = models.Order(
+            table_id=order.table_id,
+            staff_id=order.staff_id,
+            shift_id=active_shift.id,  # Sử dụng shift đang hoạt động
+            status=order.status,
+            total_amount=order.total_amount,
+            note=order.note,
+            order_code=order.order_code,
+            payment_status="unpaid"
+        )
+        db.add(db_order)
+        db.flush()
+
+        # Order, items và trạng thái bàn nằm trong cùng một transaction
+        bulk_create_order_items(db, db_order.id, valid_items)
+        print(f"[ORDER] Đã thêm {len(valid_items)} item vào order_items")
+        sales_rollup.apply(db, [db_order.id])
+
+        # Cập nhật trạng thái bàn thành 'occupied'
+        db.query(models.Table).filter(models.Table.id == db_order.table_id).update(
+            {models.Table.status: 'occupied'}, synchronize_session=False
         )
-        db.add(db_item)
-        print(f"[ORDER] Đã thêm item vào order_items: {db_item}")
-    
-    db.commit()
-    db.refresh(db_order)
 
-    # Cập nhật trạng thái bàn thành 'occupied'
-    db_table = db.query(models.Table).filter(models.Table.id == db_order.table_id).first()
-    if db_table:
-        db_table.status = 'occupied'
         db.commit()
-        db.refresh(db_table)
+    except Exception:
+        db.rollback()
+        raise
 
+    db.refresh(db_order)
     return db_order
 
 def get_order(db: Session, order_id: int):
@@ -342,21 +458,15 @@ def get_orders(db: Session, skip: int = 0, limit: int = 100):
 
 def update_order(db: Session, order_id: int, order: schemas.OrderCreate):
     db_order = get_order(db, order_id)
+    if db_order is None:
+        return None
+    rollup_before = sales_rollup.snapshot(db, [order_id])
     for key, value in order.dict(exclude={'items'}).items():
         setattr(db_order, key, value)
     
-    # Update order items
-    db.query(models.OrderItem).filter(models.OrderItem.order_id == order_id).delete()
-    for item in order.items:
-        db_item = models.OrderItem(
-            order_id=order_id,
-            menu_item_id=item.menu_item_id,
-            quantity=item.quantity,
-            unit_price=item.unit_price,
-            total_price=item.total_price,
-            note=item.note
-        )
-        db.add(db_item)
+    # Update order items: chỉ ghi các dòng thay đổi
+    sync_order_items(db, order_id, order.items)
+    sales_rollup.apply(db, [order_id], rollup_before)
     
     db.commit()
     db.refresh(db_order)
@@ -364,7 +474,11 @@ def update_order(db: Session, order_id: int, order: schemas.OrderCreate):
 
 def delete_order(db: Session, order_id: int):
     db_order = get_order(db, order_id)
+    if db_order is None:
+        return None
+    rollup_before = sales_rollup.snapshot(db, [order_id])
     db.delete(db_order)
+    sales_rollup.apply(db, [order_id], rollup_before)
     db.commit()
     return db_order
 
@@ -375,8 +489,10 @@ def create_payment(db: Session, payment: schemas.PaymentCreate):
     
     # Update order status
     db_order = get_order(db, payment.order_id)
+    rollup_before = sales_rollup.snapshot(db, [payment.order_id])
     db_order.status = "completed"
     db_order.time_out = datetime.utcnow()
+    sales_rollup.apply(db, [payment.order_id], rollup_before)
     
     # Update table status
     db_table = db_order.table
@@ -467,6 +583,7 @@ def create_printer_settings(db: Session, printer_settings: schemas.PrinterSettin
     db_printer_settings = models.PrinterSettings(**printer_settings.dict())
     db.add(db_printer_settings)
     db.commit()
+    paper_width_cache.invalidate()
     db.refresh(db_printer_settings)
     return db_printer_settings
 
@@ -485,6 +602,7 @@ def update_printer_settings(db: Session, printer_settings_id: int, printer_setti
         for key, value in printer_settings.dict().items():
             setattr(db_printer_settings, key, value)
         db.commit()
+        paper_width_cache.invalidate()
         db.refresh(db_printer_settings)
     return db_printer_settings
 
@@ -493,6 +611,7 @@ def delete_printer_settings(db: Session, printer_settings_id: int):
     if db_printer_settings:
         db.delete(db_printer_settings)
         db.commit()
+        paper_width_cache.invalidate()
     return db_printer_settings
 
 # Receipt Template CRUD
@@ -542,8 +661,18 @@ def create_sales_report(db: Session, sales_report: schemas.SalesReportCreate):
 def get_sales_report(db: Session, sales_report_id: int):
     return db.query(models.SalesReport).filter(models.SalesReport.id == sales_report_id).first()
 
-def get_sales_reports(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.SalesReport).offset(skip).limit(limit).all()
+def get_sales_reports(
+    db: Session, skip: int = 0, limit: int = 100,
+    start_date: Optional[date] = None, end_date: Optional[date] = None, report_type: Optional[str] = None
+):
+    query = db.query(models.SalesReport)
+    if start_date:
+        query = query.filter(models.SalesReport.report_date >= start_date)
+    if end_date:
+        query = query.filter(models.SalesReport.report_date <= end_date)
+    if report_type:
+        query = query.filter(models.SalesReport.report_type == report_type)
+    return query.order_by(models.SalesReport.report_date, models.SalesReport.id).offset(skip).limit(limit).all()
 
 def get_sales_report_by_date(db: Session, report_date: date, report_type: str):
     return db.query(models.SalesReport).filter(
@@ -578,8 +707,18 @@ def create_product_performance(db: Session, product_performance: schemas.Product
 def get_product_performance(db: Session, product_performance_id: int):
     return db.query(models.ProductPerformance).filter(models.ProductPerformance.id == product_performance_id).first()
 
-def get_product_performances(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.ProductPerformance).offset(skip).limit(limit).all()
+def get_product_performances(
+    db: Session, skip: int = 0, limit: int = 100,
+    start_date: Optional[date] = None, end_date: Optional[date] = None, product_id: Optional[int] = None
+):
+    query = db.query(models.ProductPerformance)
+    if start_date:
+        query = query.filter(models.ProductPerformance.report_date >= start_date)
+    if end_date:
+        query = query.filter(models.ProductPerformance.report_date <= end_date)
+    if product_id:
+        query = query.filter(models.ProductPerformance.product_id == product_id)
+    return query.order_by(models.ProductPerformance.report_date, models.ProductPerformance.id).offset(skip).limit(limit).all()
 
 def get_product_performance_by_date(db: Session, product_id: int, report_date: date):
     return db.query(models.ProductPerformance).filter(
@@ -612,7 +751,9 @@ def get_order_items(db: Session, skip: int = 0, limit: int = 100):
 
 def create_order_item(db: Session, order_item: schemas.OrderItemCreate):
     db_order_item = models.OrderItem(**order_item.dict())
+    rollup_before = sales_rollup.snapshot(db, [db_order_item.order_id])
     db.add(db_order_item)
+    sales_rollup.apply(db, [db_order_item.order_id], rollup_before)
     db.commit()
     db.refresh(db_order_item)
     return db_order_item
@@ -620,8 +761,12 @@ def create_order_item(db: Session, order_item: schemas.OrderItemCreate):
 def update_order_item(db: Session, order_item_id: int, order_item: schemas.OrderItemCreate):
     db_order_item = get_order_item(db, order_item_id)
     if db_order_item:
+        order_ids = [db_order_item.order_id]
+        rollup_before = sales_rollup.snapshot(db, order_ids)
         for key, value in order_item.dict().items():
             setattr(db_order_item, key, value)
+        order_ids.append(db_order_item.order_id)
+        sales_rollup.apply(db, order_ids, rollup_before)
         db.commit()
         db.refresh(db_order_item)
     return db_order_item
@@ -629,6 +774,8 @@ def update_order_item(db: Session, order_item_id: int, order_item: schemas.Order
 def delete_order_item(db: Session, order_item_id: int):
     db_order_item = get_order_item(db, order_item_id)
     if db_order_item:
+        rollup_before = sales_rollup.snapshot(db, [db_order_item.order_id])
         db.delete(db_order_item)
+        sales_rollup.apply(db, [db_order_item.order_id], rollup_before)
         db.commit()
     return db_order_item 
\ No newline at end of file
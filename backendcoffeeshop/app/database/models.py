@@ -10,7 +10,8 @@ from .database import Base
 from ..models import (
     MenuGroup, MenuItem, Order, OrderItem, Payment, Promotion,
     Table, Staff, StaffRole, StaffAttendance, StaffPerformance, StaffSchedule,
-    Shift, Product, ProductPerformance
+    Shift, Product, ProductPerformance, PrinterSettings, PrintSpoolEntry,
+    SalesHourly, SalesHourlyItem, SalesReport
 )
 
 class ShiftType(str, enum.Enum):
@@ -1,12 +1,12 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Body, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Depends, HTTPException, status, Body, WebSocket, Response, Request
 from sqlalchemy.orm import Session
-from typing import List, Dict
+from typing import List, Optional
 from . import crud, schemas
-from .models import Order, OrderItem, MenuItem, Table, Shift, Staff, StaffRole, StaffAttendance, StaffPerformance, StaffSchedule, Product, ProductPerformance, MenuGroup, Promotion, Payment
-from .database.database import engine, get_db, Base, init_all
+from .models import Order, MenuItem, Table, Shift, Staff, StaffRole, StaffAttendance, StaffPerformance, StaffSchedule, Product, ProductPerformance, MenuGroup, Promotion, SalesHourlyItem
+from .database.database import engine, get_db, Base, init_all, SessionLocal
 from .database.models import OrderStatus, TableStatus, StaffStatus, ShiftType
 from datetime import datetime, timedelta, date
-from sqlalchemy import func, extract
+from sqlalchemy import func
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from .api.staff.create import router as staff_router
@@ -25,15 +25,25 @@ import os
 from dotenv import load_dotenv
 import uvicorn
 from app.core.config import settings
+from app.core.logging_config import setup_logging, request_id_var
+from app.core.menu_cache import menu_cache
+from app.core.sales_rollup import sales_rollup
+from app.core import revenue
+from app.core.sales_reports import sales_report_scheduler, close_business_day, last_closable_day, REPORT_TYPE_DAILY
+from app.core.conditional import model_version, conditional_get
+from app.core.response_cache import menu_items_response_cache, menu_groups_response_cache, raw_json_response
 from app.api.v1.api import api_router
-import json
 import uuid
 import logging
-import sys
+import time
 import requests
 from app.api.v1.endpoints.dashboard import router as dashboard_router
 from starlette.websockets import WebSocketState
-from app.api.v1.endpoints.printer_manager import printer_manager
+from app.api.v1.endpoints.ws_hub import hub, parse_topics
+from app.api.v1.endpoints.print_queue import print_queue, router as print_jobs_router
+from app.api.v1.endpoints.printer_health import printer_monitor, router as printer_health_router
+from app.api.v1.endpoints.table_feed import table_feed
+from app.api.v1.endpoints.order_loader import fetch_order_items, paginate_orders
 # Removed ProxyHeadersMiddleware - it was causing SSL errors in redirect URLs
 
 load_dotenv()
@@ -52,15 +62,8 @@ app = FastAPI(
 # Mount static files for images
 app.mount("/image", StaticFiles(directory="/app/image"), name="image")
 
-# Cấu hình logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('app.log')
-    ]
-)
+# Cấu hình logging: stdout + app.log qua QueueListener (ghi log không chặn event loop)
+setup_logging()
 
 # Cấu hình uvicorn logging
 uvicorn_logger = logging.getLogger("uvicorn")
@@ -70,47 +73,8 @@ uvicorn_access_logger.setLevel(logging.INFO)
 
 # Cấu hình app logging
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-# Thêm handler cho console
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.INFO)
-console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(console_formatter)
-logger.addHandler(console_handler)
-
-# Thêm handler cho file
-file_handler = logging.FileHandler('app.log')
-file_handler.setLevel(logging.INFO)
-file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(file_formatter)
-logger.addHandler(file_handler)
-
-# Thêm ConnectionManager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.logger = logging.getLogger(__name__)
-
-    async def connect(self, websocket: WebSocket, client_id: str):
-        await websocket.accept()
-        self.active_connections[client_id] = websocket
-        self.logger.info(f"Client {client_id} connected")
-
-    def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
-            self.logger.info(f"Client {client_id} disconnected")
-
-    async def broadcast(self, message: str):
-        for client_id, connection in self.active_connections.items():
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                self.logger.error(f"Error broadcasting to client {client_id}: {str(e)}")
-                self.disconnect(client_id)
+request_logger = logging.getLogger("app.request")
 
-manager = ConnectionManager()
 
 # Cấu hình CORS
 app.add_middleware(
@@ -122,6 +86,32 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# Middleware log mỗi request một record có cấu trúc, kèm request_id cho mọi log trong request
+@app.middleware("http")
+async def request_logging_middleware(request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:12]
+    token = request_id_var.set(request_id)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        request_logger.info(
+            "method=%s path=%s status=%s duration_ms=%.1f",
+            request.method, request.url.path, status_code, duration_ms,
+            extra={
+                "method": request.method,
+                "path": request.url.path,
+                "status_code": status_code,
+                "duration_ms": round(duration_ms, 1)
+            }
+        )
+        request_id_var.reset(token)
+
 # Thêm middleware cho WebSocket
 @app.middleware("http")
 async def websocket_cors_middleware(request, call_next):
@@ -146,66 +136,80 @@ app.include_router(shifts_all_router, prefix="/api/shifts", tags=["shifts"])
 app.include_router(shifts_delete_router, prefix="/api/shifts", tags=["shifts"])
 app.include_router(dashboard_router, prefix="/api/v1/endpoints/dashboard", tags=["dashboard"])
 app.include_router(cancelled_items.router, prefix="/api/v1/endpoints/cancelled-items", tags=["cancelled-items"])
+app.include_router(print_jobs_router, prefix="/api/print-jobs", tags=["print-jobs"])
+app.include_router(printer_health_router, prefix="/api/printers", tags=["printers"])
+
+# Nạp menu cache khi khởi động (lỗi thì cache tự nạp ở lần đọc đầu tiên)
+@app.on_event("startup")
+def warm_up_menu_cache():
+    try:
+        menu_cache.warm_up()
+    except Exception as e:
+        logger.error(f"Không thể nạp menu cache: {str(e)}")
+
+# Lệnh in còn trong print spool từ lần chạy trước sẽ được in khi máy in kết nối
+@app.on_event("startup")
+def restore_print_spool():
+    try:
+        print_queue.restore()
+    except Exception as e:
+        logger.error(f"Không thể khôi phục print spool: {str(e)}")
+
+# Lần đầu chạy với bảng sales rollup mới: dựng rollup từ các order sẵn có
+@app.on_event("startup")
+def backfill_sales_rollup():
+    db = SessionLocal()
+    try:
+        if sales_rollup.is_empty(db) and db.query(Order.id).first() is not None:
+            sales_rollup.rebuild(db)
+    except Exception as e:
+        logger.error(f"Không thể dựng sales rollup: {str(e)}")
+    finally:
+        db.close()
+
+# Event bus giữa các worker: broadcast tới client WebSocket ở mọi worker
+@app.on_event("startup")
+async def start_event_bus():
+    await hub.start()
+
+# Chốt doanh số ngày vào sales_reports/product_performance mỗi đêm
+@app.on_event("startup")
+async def start_sales_report_scheduler():
+    sales_report_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_event_bus():
+    await sales_report_scheduler.stop()
+    await printer_monitor.stop()
+    await print_queue.stop()
+    await hub.stop()
 
 # Thêm WebSocket endpoint
 @app.websocket("/ws/printer")
 async def printer_websocket_endpoint(websocket: WebSocket):
     printer_id = str(uuid.uuid4())
-    try:
-        # Accept connection trước
-        await websocket.accept()
-        
-        # Gửi thông tin kết nối thành công
-        await websocket.send_json({
-            "type": "connection",
-            "data": {
-                "status": "connected",
-                "printer_id": printer_id,
-                "timestamp": datetime.now().isoformat()
-            }
-        })
-        
-        # Thêm vào manager sau khi đã accept
-        success = await printer_manager.connect(printer_id, websocket)
-        if not success:
-            logger.error(f"Failed to add printer {printer_id} to manager")
-            await websocket.close()
-            return
-        
-        while True:
-            try:
-                data = await websocket.receive_text()
-                try:
-                    message = json.loads(data)
-                    logger.info(f"Received message from printer {printer_id}: {message}")
-                    
-                    if message.get("type") == "ping":
-                        await websocket.send_json({
-                            "type": "pong",
-                            "data": {
-                                "timestamp": datetime.now().isoformat()
-                            }
-                        })
-                    elif message.get("type") == "printer_info":
-                        printer_info = message.get("data", {})
-                        logger.info(f"Printer {printer_id} info: {printer_info}")
-                        
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON from printer {printer_id}: {data}")
-                    
-            except WebSocketDisconnect:
-                logger.info(f"Printer {printer_id} disconnected")
-                break
-            except Exception as e:
-                logger.error(f"Error receiving message from printer {printer_id}: {str(e)}")
-                break
-    except Exception as e:
-        logger.error(f"WebSocket error for printer {printer_id}: {str(e)}")
-    finally:
-        try:
-            printer_manager.disconnect(printer_id)
-        except Exception as e:
-            logger.error(f"Error disconnecting printer {printer_id}: {str(e)}")
+    await hub.serve(
+        websocket, printer_id, ["printers"],
+        on_message=print_queue.on_printer_message, on_connect=printer_monitor.register
+    )
+
+# WebSocket đẩy trạng thái bàn cho sơ đồ bàn (TableGrid)
+@app.websocket("/ws/tables")
+async def table_status_websocket_endpoint(websocket: WebSocket):
+    client_id = str(uuid.uuid4())
+
+    async def on_message(client_id: str, message: dict):
+        if message.get("type") == "resync":
+            await table_feed.send_snapshot(client_id)
+
+    # Gửi snapshot ngay khi kết nối, sau đó chỉ gửi delta
+    await hub.serve(websocket, client_id, ["tables"], on_message=on_message, on_connect=table_feed.send_snapshot)
+
+# WebSocket chung: client tự chọn topic, ví dụ /ws?topics=orders,kitchen
+@app.websocket("/ws")
+async def hub_websocket_endpoint(websocket: WebSocket, topics: Optional[str] = None):
+    client_id = str(uuid.uuid4())
+    await hub.serve(websocket, client_id, parse_topics(topics, ["orders"]))
 
 # Menu Group Endpoints
 @app.post("/api/menu-groups/", response_model=schemas.MenuGroup)
@@ -217,12 +221,22 @@ def create_menu_group(
 
 @app.get("/api/menu-groups/", response_model=List[schemas.MenuGroup])
 def read_menu_groups(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db)
 ):
-    menu_groups = crud.get_menu_groups(db, skip=skip, limit=limit)
-    return menu_groups
+    # Trả 304 nếu danh sách không đổi so với ETag client đang giữ
+    version = model_version(db, MenuGroup)
+    not_modified = conditional_get(request, response, version, last_modified=version[1])
+    if not_modified:
+        return not_modified
+    # Body JSON dựng sẵn theo (skip, limit), chỉ build lại khi version menu đổi
+    body = menu_groups_response_cache.get_or_build(
+        (skip, limit), version, lambda: crud.get_menu_groups_json(db, skip=skip, limit=limit)
+    )
+    return raw_json_response(body, response)
 
 @app.get("/api/menu-groups/{menu_group_id}", response_model=schemas.MenuGroup)
 def read_menu_group(menu_group_id: int, db: Session = Depends(get_db)):
@@ -258,9 +272,17 @@ def create_menu_item(menu_item: schemas.MenuItemCreate, db: Session = Depends(ge
         raise
 
 @app.get("/api/menu-items/", response_model=List[schemas.MenuItem])
-def read_menu_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    menu_items = crud.get_menu_items(db, skip=skip, limit=limit)
-    return menu_items
+def read_menu_items(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    # Trả 304 nếu danh sách không đổi so với ETag client đang giữ
+    version = model_version(db, MenuItem)
+    not_modified = conditional_get(request, response, version, last_modified=version[1])
+    if not_modified:
+        return not_modified
+    # Body JSON dựng sẵn theo (skip, limit), chỉ build lại khi version menu đổi
+    body = menu_items_response_cache.get_or_build(
+        (skip, limit), version, lambda: crud.get_menu_items_json(db, skip=skip, limit=limit)
+    )
+    return raw_json_response(body, response)
 
 @app.get("/api/menu-items/{menu_item_id}", response_model=schemas.MenuItem)
 def read_menu_item(menu_item_id: int, db: Session = Depends(get_db)):
@@ -340,7 +362,12 @@ def create_staff(staff: schemas.StaffCreate, db: Session = Depends(get_db)):
     return crud.create_staff(db=db, staff=staff)
 
 @app.get("/staff/", response_model=List[schemas.Staff])
-def read_staffs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_staffs(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    # Trả 304 nếu danh sách không đổi so với ETag client đang giữ
+    version = model_version(db, Staff)
+    not_modified = conditional_get(request, response, version, last_modified=version[1])
+    if not_modified:
+        return not_modified
     staffs = crud.get_staffs(db, skip=skip, limit=limit)
     return staffs
 
@@ -498,18 +525,23 @@ async def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)
         )
         
         db.add(db_order)
+        db.flush()
+        sales_rollup.apply(db, [db_order.id])
         db.commit()
         db.refresh(db_order)
+
+        # Đẩy trạng thái bàn mới tới các màn hình sơ đồ bàn
+        await table_feed.publish(db, [db_order.table_id])
         
         # Broadcast thông báo order mới
-        await manager.broadcast(json.dumps({
+        hub.publish("orders", {
             "type": "new_order",
             "data": {
                 "order_id": db_order.id,
                 "timestamp": datetime.now().isoformat(),
                 "date": db_order.time_in.strftime("%d/%m/%Y") if db_order.time_in else None
             }
-        }))
+        })
         
         # Chuyển đổi kết quả thành dict
         result = {
@@ -537,7 +569,7 @@ async def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)
         )
 
 @app.get("/orders/", response_model=List[schemas.OrderResponse])
-def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_orders(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_db)):
     try:
         # Chỉ lấy các order có status là active hoặc pending
         orders = db.query(
@@ -554,44 +586,18 @@ def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
             Order.time_out
         ).filter(
             Order.status.in_(["active", "pending"])
-        ).order_by(
-            Order.time_in.desc()  # Sắp xếp theo thời gian mới nhất
-        ).offset(skip).limit(limit).all()
+        )
+        # Sắp xếp theo thời gian mới nhất, phân trang theo cursor (time_in, id) nếu có
+        orders, next_cursor = paginate_orders(orders, skip=skip, limit=limit, cursor=cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        
+        # Lấy items (kèm tên món) của tất cả orders trong trang bằng một query
+        items_by_order = fetch_order_items(db, (order.id for order in orders))
         
         # Chuyển đổi kết quả thành dict
         result = []
         for order in orders:
-            # Lấy thông tin items của order, chỉ lấy các cột cần thiết
-            items = db.query(
-                OrderItem.id,
-                OrderItem.order_id,
-                OrderItem.menu_item_id,
-                OrderItem.quantity,
-                OrderItem.unit_price,
-                OrderItem.total_price,
-                OrderItem.note
-            ).filter(
-                OrderItem.order_id == order.id
-            ).all()
-            
-            # Chuyển đổi items thành dict
-            items_dict = []
-            for item in items:
-                menu_item = db.query(MenuItem).filter(
-                    MenuItem.id == item.menu_item_id
-                ).first()
-                
-                items_dict.append({
-                    "id": item.id,
-                    "order_id": item.order_id,
-                    "menu_item_id": item.menu_item_id,
-                    "quantity": item.quantity,
-                    "unit_price": item.unit_price,
-                    "total_price": item.total_price,
-                    "note": item.note,
-                    "name": menu_item.name if menu_item else ""
-                })
-            
             order_dict = {
                 "id": order.id,
                 "table_id": order.table_id,
@@ -604,11 +610,13 @@ def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
                 "payment_status": order.payment_status,
                 "time_in": order.time_in,
                 "time_out": order.time_out,
-                "items": items_dict
+                "items": items_by_order.get(order.id, [])
             }
             result.append(order_dict)
         
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Lỗi khi lấy danh sách orders: {str(e)}")
         raise HTTPException(
@@ -621,10 +629,9 @@ def read_order(order_id: int, db: Session = Depends(get_db)):
     db_order = crud.get_order(db, order_id=order_id)
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
-    # Gán tên món cho từng item
+    # Gán tên món cho từng item (tra từ menu cache)
     for item in db_order.items:
-        menu_item = db.query(MenuItem).filter(MenuItem.id == item.menu_item_id).first()
-        item.name = menu_item.name if menu_item else ""
+        item.name = menu_cache.item_name(db, item.menu_item_id)
     return db_order
 
 @app.put("/orders/{order_id}", response_model=schemas.OrderResponse)
@@ -668,7 +675,12 @@ def create_table(table: schemas.TableCreate, db: Session = Depends(get_db)):
     return crud.create_table(db=db, table=table)
 
 @app.get("/tables/", response_model=List[schemas.Table])
-def read_tables(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_tables(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    # Trả 304 nếu danh sách không đổi so với ETag client đang giữ
+    version = model_version(db, Table)
+    not_modified = conditional_get(request, response, version, last_modified=version[1])
+    if not_modified:
+        return not_modified
     tables = crud.get_tables(db, skip=skip, limit=limit)
     return tables
 
@@ -727,22 +739,13 @@ def delete_promotion(promotion_id: int, db: Session = Depends(get_db)):
 # Dashboard Endpoints
 @app.get("/dashboard/revenue")
 def get_revenue(db: Session = Depends(get_db)):
-    today = datetime.utcnow().date()
-    start_of_day = datetime.combine(today, datetime.min.time())
-    end_of_day = datetime.combine(today, datetime.max.time())
+    start_dt, end_dt = revenue.day_window()
 
-    # Get actual revenue (completed payments)
-    actual_revenue = db.query(Payment).filter(
-        Payment.payment_time >= start_of_day,
-        Payment.payment_time <= end_of_day
-    ).with_entities(func.sum(Payment.total_amount)).scalar() or 0
+    # Doanh thu thực (payments trong ngày)
+    actual_revenue = revenue.paid_revenue(revenue.payment_buckets(db, start_dt, end_dt))
 
-    # Get estimated revenue (pending orders)
-    estimated_revenue = db.query(Order).filter(
-        Order.time_in >= start_of_day,
-        Order.time_in <= end_of_day,
-        Order.status == "pending"
-    ).with_entities(func.sum(OrderItem.quantity * OrderItem.unit_price)).scalar() or 0
+    # Doanh thu dự kiến (order pending, order_items join theo order_id)
+    estimated_revenue = revenue.pending_order_revenue(db, start_dt, end_dt)
 
     return {
         "actual_revenue": actual_revenue,
@@ -766,38 +769,24 @@ def get_cancelled_orders(db: Session = Depends(get_db)):
 
 @app.get("/dashboard/revenue-by-hour")
 def get_revenue_by_hour(db: Session = Depends(get_db)):
-    today = datetime.utcnow().date()
-    start_of_day = datetime.combine(today, datetime.min.time())
-    end_of_day = datetime.combine(today, datetime.max.time())
-
-    revenue_by_hour = db.query(
-        extract('hour', Payment.payment_time).label('hour'),
-        func.sum(Payment.total_amount).label('revenue')
-    ).filter(
-        Payment.payment_time >= start_of_day,
-        Payment.payment_time <= end_of_day
-    ).group_by('hour').all()
-
-    return [{"hour": r.hour, "revenue": r.revenue} for r in revenue_by_hour]
+    start_dt, end_dt = revenue.day_window()
+    revenue_by_hour = revenue.totals_by_hour(revenue.payment_buckets(db, start_dt, end_dt))
+    return [{"hour": r["hour"], "revenue": r["total_amount"]} for r in revenue_by_hour]
 
 @app.get("/dashboard/revenue-by-group")
 def get_revenue_by_group(db: Session = Depends(get_db)):
     today = datetime.utcnow().date()
-    start_of_day = datetime.combine(today, datetime.min.time())
-    end_of_day = datetime.combine(today, datetime.max.time())
 
+    # Đọc từ rollup theo ngày/món thay vì quét order_items
     revenue_by_group = db.query(
         MenuGroup.name.label('group_name'),
-        func.sum(OrderItem.quantity * OrderItem.unit_price).label('revenue')
+        func.sum(SalesHourlyItem.revenue).label('revenue')
     ).join(
         MenuItem, MenuItem.group_id == MenuGroup.id
     ).join(
-        OrderItem, OrderItem.menu_item_id == MenuItem.id
-    ).join(
-        Order, Order.id == OrderItem.order_id
+        SalesHourlyItem, SalesHourlyItem.menu_item_id == MenuItem.id
     ).filter(
-        Order.time_in >= start_of_day,
-        Order.time_in <= end_of_day
+        SalesHourlyItem.sale_date == today
     ).group_by('group_name').all()
 
     return [{"group_name": r.group_name, "revenue": r.revenue} for r in revenue_by_group]
@@ -1025,7 +1014,7 @@ async def update_order_status(order_id: int, status: str, db: Session = Depends(
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     # Broadcast thông báo cập nhật trạng thái
-    await manager.broadcast(json.dumps({
+    hub.publish("orders", {
         "type": "order_status_update",
         "data": {
             "order_id": order_id,
@@ -1033,7 +1022,7 @@ async def update_order_status(order_id: int, status: str, db: Session = Depends(
             "timestamp": datetime.now().isoformat(),
             "date": db_order.time_in.strftime("%d/%m/%Y") if db_order.time_in else None
         }
-    }))
+    }, coalesce_key=("order_status_update", order_id))
     return db_order
 
 @app.post("/orders/{order_id}/cancel/", response_model=schemas.OrderResponse)
@@ -1063,45 +1052,14 @@ def get_payments_by_date_range(start_date: datetime, end_date: datetime, db: Ses
 
 @app.get("/payments/summary/")
 def get_payment_summary(db: Session = Depends(get_db)):
-    today = datetime.utcnow().date()
-    start_of_day = datetime.combine(today, datetime.min.time())
-    end_of_day = datetime.combine(today, datetime.max.time())
+    start_dt, end_dt = revenue.day_window()
 
-    # Tổng doanh thu theo phương thức thanh toán
-    payment_method_summary = db.query(
-        Payment.payment_method,
-        func.sum(Payment.total_amount).label('total_amount'),
-        func.count(Payment.id).label('count')
-    ).filter(
-        Payment.payment_time >= start_of_day,
-        Payment.payment_time <= end_of_day
-    ).group_by(Payment.payment_method).all()
-
-    # Tổng doanh thu theo giờ
-    hourly_summary = db.query(
-        extract('hour', Payment.payment_time).label('hour'),
-        func.sum(Payment.total_amount).label('total_amount'),
-        func.count(Payment.id).label('count')
-    ).filter(
-        Payment.payment_time >= start_of_day,
-        Payment.payment_time <= end_of_day
-    ).group_by('hour').all()
+    # Một câu GROUP BY (giờ, phương thức), gộp ra tổng theo phương thức và theo giờ
+    buckets = revenue.payment_buckets(db, start_dt, end_dt)
 
     return {
-        "payment_method_summary": [
-            {
-                "method": p.payment_method,
-                "total_amount": p.total_amount,
-                "count": p.count
-            } for p in payment_method_summary
-        ],
-        "hourly_summary": [
-            {
-                "hour": h.hour,
-                "total_amount": h.total_amount,
-                "count": h.count
-            } for h in hourly_summary
-        ]
+        "payment_method_summary": revenue.totals_by_method(buckets),
+        "hourly_summary": revenue.totals_by_hour(buckets)
     }
 
 # Printer Settings endpoints
@@ -1186,10 +1144,25 @@ def create_sales_report(sales_report: schemas.SalesReportCreate, db: Session = D
     return crud.create_sales_report(db=db, sales_report=sales_report)
 
 @app.get("/sales-reports/", response_model=List[schemas.SalesReport])
-def read_sales_reports(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    sales_reports = crud.get_sales_reports(db, skip=skip, limit=limit)
+def read_sales_reports(
+    skip: int = 0, limit: int = 100,
+    start_date: Optional[date] = None, end_date: Optional[date] = None, report_type: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    sales_reports = crud.get_sales_reports(
+        db, skip=skip, limit=limit, start_date=start_date, end_date=end_date, report_type=report_type
+    )
     return sales_reports
 
+@app.post("/sales-reports/close-day", response_model=schemas.SalesReport)
+def close_sales_day(report_date: Optional[date] = None, db: Session = Depends(get_db)):
+    """Chốt (hoặc chốt lại) doanh số một ngày, mặc định ngày gần nhất đã qua giờ chốt"""
+    try:
+        return close_business_day(db, report_date or last_closable_day())
+    except Exception as e:
+        logger.error(f"Lỗi khi chốt doanh số ngày: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/sales-reports/{sales_report_id}", response_model=schemas.SalesReport)
 def read_sales_report(sales_report_id: int, db: Session = Depends(get_db)):
     db_sales_report = crud.get_sales_report(db, sales_report_id=sales_report_id)
@@ -1200,6 +1173,10 @@ def read_sales_report(sales_report_id: int, db: Session = Depends(get_db)):
 @app.get("/sales-reports/date/{report_date}/type/{report_type}", response_model=schemas.SalesReport)
 def read_sales_report_by_date(report_date: date, report_type: str, db: Session = Depends(get_db)):
     db_sales_report = crud.get_sales_report_by_date(db, report_date=report_date, report_type=report_type)
+    stale = db_sales_report is None or db_sales_report.pending_changes > 0
+    if stale and report_type == REPORT_TYPE_DAILY and report_date <= last_closable_day():
+        # Ngày đã qua nhưng job chưa chốt (server tắt quá lâu) hoặc order đã đổi sau lần chốt: chốt ngay rồi trả về
+        db_sales_report = close_business_day(db, report_date)
     if db_sales_report is None:
         raise HTTPException(status_code=404, detail="Sales report not found")
     return db_sales_report
@@ -1224,8 +1201,14 @@ def create_product_performance(product_performance: schemas.ProductPerformanceCr
     return crud.create_product_performance(db=db, product_performance=product_performance)
 
 @app.get("/product-performance/", response_model=List[schemas.ProductPerformance])
-def read_product_performances(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    product_performances = crud.get_product_performances(db, skip=skip, limit=limit)
+def read_product_performances(
+    skip: int = 0, limit: int = 100,
+    start_date: Optional[date] = None, end_date: Optional[date] = None, product_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    product_performances = crud.get_product_performances(
+        db, skip=skip, limit=limit, start_date=start_date, end_date=end_date, product_id=product_id
+    )
     return product_performances
 
 @app.get("/product-performance/{product_performance_id}", response_model=schemas.ProductPerformance)
@@ -1278,6 +1261,8 @@ async def close_all_orders(db: Session = Depends(get_db)):
         
         if not active_orders:
             return {"message": "Không có order nào cần đóng"}
+        order_ids = [order.id for order in active_orders]
+        rollup_before = sales_rollup.snapshot(db, order_ids)
         
         # Cập nhật trạng thái của tất cả order thành completed và thêm time_out
         for order in active_orders:
@@ -1291,6 +1276,8 @@ async def close_all_orders(db: Session = Depends(get_db)):
             except Exception as e:
                 logger.error(f"Lỗi khi cập nhật order {order.id}: {str(e)}")
                 continue
+        # Chuyển các order từ bucket pending sang completed trong sales rollup
+        sales_rollup.apply(db, order_ids, rollup_before)
         
         try:
             db.commit()
@@ -1304,14 +1291,14 @@ async def close_all_orders(db: Session = Depends(get_db)):
         
         # Broadcast thông báo đóng tất cả order
         try:
-            await manager.broadcast(json.dumps({
+            hub.publish("orders", {
                 "type": "close_all_orders",
                 "data": {
                     "count": len(active_orders),
                     "timestamp": datetime.now().isoformat(),
                     "date": datetime.now().strftime("%d/%m/%Y")
                 }
-            }))
+            })
         except Exception as e:
             logger.error(f"Lỗi khi broadcast thông báo: {str(e)}")
         
@@ -9,6 +9,10 @@ from .table import Table
 from .staff import Staff, StaffRole, StaffAttendance, StaffPerformance, StaffSchedule
 from .shift import Shift
 from .product import Product, ProductPerformance
+from .printer import PrinterSettings
+from .print_spool import PrintSpoolEntry
+from .sales_rollup import SalesHourly, SalesHourlyItem
+from .sales import SalesReport
 
 __all__ = [
     'Base',
@@ -26,5 +30,10 @@ __all__ = [
     'StaffSchedule',
     'Shift',
     'Product',
-    'ProductPerformance'
+    'ProductPerformance',
+    'PrinterSettings',
+    'PrintSpoolEntry',
+    'SalesHourly',
+    'SalesHourlyItem',
+    'SalesReport'
 ]
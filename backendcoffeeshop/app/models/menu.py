@@ -10,6 +10,8 @@ class MenuGroup(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), unique=True, index=True)
     description = Column(String(200))
+    # Quầy in phiếu làm đồ cho các món của nhóm (bar, kitchen...); NULL = quầy mặc định
+    station = Column(String(50), nullable=True)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
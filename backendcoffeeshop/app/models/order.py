@@ -1,11 +1,15 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Text, Enum
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Text, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
 
 class Order(Base):
     __tablename__ = "orders"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Phục vụ phân trang keyset theo (time_in, id) cho danh sách order
+        Index("ix_orders_time_in_id", "time_in", "id"),
+        {'extend_existing': True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     table_id = Column(Integer, ForeignKey("tables.id"))
@@ -33,7 +37,11 @@ class Order(Base):
 
 class OrderItem(Base):
     __tablename__ = "order_items"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Join order_items theo order (doanh thu dự kiến, chi tiết order)
+        Index("ix_order_items_order_id", "order_id"),
+        {'extend_existing': True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"))
@@ -48,7 +56,11 @@ class OrderItem(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Tổng hợp doanh thu theo khoảng created_at (app.core.revenue)
+        Index("ix_payments_created_at", "created_at"),
+        {'extend_existing': True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"))
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index
+from datetime import datetime
+from . import Base
+
+class PrintSpoolEntry(Base):
+    """Lệnh in đã xếp hàng, lưu lại để không mất phiếu khi mất máy in hoặc khởi động lại"""
+    __tablename__ = "print_spool"
+    __table_args__ = (
+        # Lấy các lệnh đang chờ theo thứ tự FIFO
+        Index("ix_print_spool_status_id", "status", "id"),
+        {'extend_existing': True},
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(32), unique=True, nullable=False)
+    kind = Column(String(30))
+    order_id = Column(Integer, nullable=True, index=True)
+    station = Column(String(50), nullable=True)
+    target = Column(String(64), nullable=True)
+    lines = Column(JSON)
+    status = Column(String(20), default="pending")  # pending, sending, printed, sent, failed
+    attempts = Column(Integer, default=0)
+    error = Column(String(200), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Date, Float, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -25,11 +25,16 @@ class Product(Base):
     performance = relationship("ProductPerformance", back_populates="product")
 
 class ProductPerformance(Base):
+    """Số bán của một sản phẩm trong một ngày đã chốt (sản phẩm khớp món theo code)"""
     __tablename__ = "product_performance"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        UniqueConstraint("product_id", "report_date", name="uq_product_performance_product_date"),
+        {'extend_existing': True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
+    report_date = Column(Date, index=True)
     date = Column(DateTime)
     quantity_sold = Column(Integer)
     revenue = Column(Float)
@@ -1,20 +1,33 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Text, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Date, Float, Text, JSON, UniqueConstraint
+from sqlalchemy.orm import relationship, synonym
 from datetime import datetime
 from . import Base
 
 class SalesReport(Base):
+    """Báo cáo đã chốt của một kỳ (report_type "daily": một ngày), do app.core.sales_reports tính"""
     __tablename__ = "sales_reports"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Chốt lại một ngày thì ghi đè báo cáo cũ, không tạo bản trùng
+        UniqueConstraint("report_date", "report_type", name="uq_sales_reports_date_type"),
+        {'extend_existing': True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
+    report_date = Column(Date, index=True)
+    report_type = Column(String(20), default="daily")
     date = Column(DateTime)
+    # Kỳ báo cáo [start_date, end_date) theo tên trường trong API (schemas.SalesReport)
+    start_date = synonym("date")
+    end_date = Column(DateTime)
     total_sales = Column(Float)
     total_orders = Column(Integer)
     total_customers = Column(Integer)
     average_order_value = Column(Float)
     payment_methods = Column(JSON)  # {"cash": 1000, "card": 2000}
     top_products = Column(JSON)  # [{"id": 1, "name": "Coffee", "quantity": 10}]
+    top_categories = Column(JSON)  # [{"id": 1, "name": "Cafe", "quantity": 30, "revenue": 150000}]
     note = Column(String(200))
+    # Số lần order của ngày thay đổi sau lần chốt gần nhất (> 0: job sẽ chốt lại ngày này)
+    pending_changes = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
\ No newline at end of file
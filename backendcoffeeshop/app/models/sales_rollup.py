@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, String, Date, Float, UniqueConstraint, Index
+from . import Base
+
+class SalesHourly(Base):
+    """
+    Tổng order theo (ngày, giờ, ca, trạng thái) tính từ time_in của order.
+    Cập nhật cùng transaction với order (app.core.sales_rollup), dựng lại bằng app.rebuild_sales_rollup.
+    """
+    __tablename__ = "sales_hourly"
+    __table_args__ = (
+        UniqueConstraint("sale_date", "hour", "shift", "status", name="uq_sales_hourly_bucket"),
+        {'extend_existing': True},
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    sale_date = Column(Date, nullable=False)
+    hour = Column(Integer, nullable=False)
+    # shift_type (chữ thường) của ca gắn với order, "" nếu order không có ca
+    shift = Column(String(50), nullable=False, default="")
+    status = Column(String(20), nullable=False, default="")
+    order_count = Column(Integer, nullable=False, default=0)
+    # Tổng Order.total_amount
+    revenue = Column(Float, nullable=False, default=0)
+
+class SalesHourlyItem(Base):
+    """Số lượng/doanh thu từng món theo (ngày, giờ, ca, trạng thái order)"""
+    __tablename__ = "sales_hourly_items"
+    __table_args__ = (
+        UniqueConstraint("sale_date", "hour", "shift", "status", "menu_item_id", name="uq_sales_hourly_items_bucket"),
+        # Thống kê một món theo khoảng ngày
+        Index("ix_sales_hourly_items_menu_item_date", "menu_item_id", "sale_date"),
+        {'extend_existing': True},
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    sale_date = Column(Date, nullable=False)
+    hour = Column(Integer, nullable=False)
+    shift = Column(String(50), nullable=False, default="")
+    status = Column(String(20), nullable=False, default="")
+    menu_item_id = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False, default=0)
+    # Tổng quantity * unit_price
+    revenue = Column(Float, nullable=False, default=0)
@@ -0,0 +1,30 @@
+"""
+Dựng lại (backfill) các bảng sales_hourly / sales_hourly_items từ orders và order_items.
+
+    python -m app.rebuild_sales_rollup                      # toàn bộ
+    python -m app.rebuild_sales_rollup --start 2025-01-01 --end 2025-12-31
+"""
+import argparse
+from datetime import datetime
+from .database.database import SessionLocal, init_tables
+from .core.sales_rollup import sales_rollup
+
+def parse_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def main():
+    parser = argparse.ArgumentParser(description="Dựng lại sales rollup từ dữ liệu order")
+    parser.add_argument("--start", type=parse_date, help="Ngày bắt đầu YYYY-MM-DD (mặc định: từ đầu)")
+    parser.add_argument("--end", type=parse_date, help="Ngày kết thúc YYYY-MM-DD (mặc định: đến hết)")
+    args = parser.parse_args()
+
+    init_tables()
+    db = SessionLocal()
+    try:
+        order_rows, item_rows = sales_rollup.rebuild(db, args.start, args.end)
+        print(f"Đã dựng lại sales rollup: {order_rows} dòng sales_hourly, {item_rows} dòng sales_hourly_items")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ from typing import Optional, List
 class MenuGroupBase(BaseModel):
     name: str
     description: Optional[str] = None
+    station: Optional[str] = None
     is_active: bool = True
 
 class MenuGroupCreate(MenuGroupBase):
@@ -0,0 +1,113 @@
+"""
+Benchmark số phiếu/giây khi dựng phiếu làm đồ (bill_lines) cho một order.
+
+- before: mỗi món gọi textwrap.wrap() và dựng lại header/dòng kẻ (code cũ trong orders.py).
+- after:  app.core.bill_renderer, bố cục tên món nhớ theo (menu_item_id, width).
+
+Hai cách phải cho ra cùng bill_lines ở khổ 33 ký tự. Chạy từ thư mục backendcoffeeshop:
+    python -m benchmarks.bench_bill_render
+"""
+import os
+import sys
+import textwrap
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.database  # noqa: E402,F401  (phải import trước app.models)
+from app.core.bill_renderer import BillItem, kitchen_ticket_lines, item_name_layout  # noqa: E402
+
+TICKETS = 5000
+ITEMS_PER_ORDER = 12
+
+TOTAL_BILL_WIDTH = 33
+QTY_COL_WIDTH = 4
+PRICE_COL_WIDTH = 9
+NAME_COL_WIDTH = TOTAL_BILL_WIDTH - QTY_COL_WIDTH - PRICE_COL_WIDTH
+
+def kitchen_ticket_lines_before(table_label: str, time_text: str, items: List[dict]) -> List[dict]:
+    """Bản cũ của orders.kitchen_ticket_lines (rút gọn comment, giữ nguyên logic)"""
+    bill_lines = [
+        {"text": "PHIẾU LÀM ĐỒ", "fontSize": 14, "fontName": "Arial Black", "bold": True, "align": "center"},
+        {"text": f"Bàn: {table_label}", "fontSize": 10, "bold": False, "align": "left"},
+        {"text": f"Thời gian: {time_text}", "fontSize": 10, "bold": False, "align": "left"},
+        {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
+    ]
+    header_name_part = "TÊN HÀNG".ljust(NAME_COL_WIDTH)
+    header_qty_part = "SL".center(QTY_COL_WIDTH)
+    header_total_price_part = "TIỀN".rjust(PRICE_COL_WIDTH)
+    bill_lines.append({"text": f"{header_name_part}{header_qty_part}{header_total_price_part}", "fontSize": 12, "bold": True, "align": "left"})
+    bill_lines.append({"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"})
+
+    total_amount = 0
+    for item in items:
+        item_total = item['total_price']
+        total_amount += item_total
+        item_qty_part = f"x{item['quantity']}".center(QTY_COL_WIDTH)
+        item_total_price_part = f"{int(item_total):,}".rjust(PRICE_COL_WIDTH)
+        wrapped_name_lines = textwrap.wrap(item['name'], width=NAME_COL_WIDTH)
+        if wrapped_name_lines:
+            first_name_part = wrapped_name_lines[0].ljust(NAME_COL_WIDTH)
+            bill_lines.append({
+                "text": f"{first_name_part}{item_qty_part}{item_total_price_part}",
+                "fontSize": 12, "bold": False, "align": "left"
+            })
+            for i in range(1, len(wrapped_name_lines)):
+                bill_lines.append({
+                    "text": "  " + wrapped_name_lines[i].ljust(NAME_COL_WIDTH - 2),
+                    "fontSize": 12, "bold": False, "align": "left"
+                })
+        else:
+            bill_lines.append({
+                "text": f"{''.ljust(NAME_COL_WIDTH)}{item_qty_part}{item_total_price_part}",
+                "fontSize": 12, "bold": False, "align": "left"
+            })
+        if item.get("note"):
+            bill_lines.append({"text": f"  Ghi chú: {item['note']}", "fontSize": 12, "bold": False, "align": "left"})
+
+    total_label_part = "TỔNG TIỀN:".ljust(NAME_COL_WIDTH + QTY_COL_WIDTH)
+    total_amount_part = f"{int(total_amount):,}".rjust(PRICE_COL_WIDTH)
+    bill_lines.extend([
+        {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
+        {"text": f"{total_label_part}{total_amount_part}", "fontSize": 14, "bold": True, "align": "left"},
+        {"text": "---------------------------------", "fontSize": 16, "bold": False, "align": "left"},
+    ])
+    return bill_lines
+
+def make_items() -> List[dict]:
+    return [
+        {
+            "menu_item_id": i,
+            "name": f"Cà phê sữa đá pha phin truyền thống số {i}" if i % 2 else f"Bạc xỉu {i}",
+            "quantity": i % 4 + 1,
+            "total_price": (i % 4 + 1) * (20000 + i * 1000),
+            "note": "Ít đá" if i % 3 == 0 else None,
+        }
+        for i in range(1, ITEMS_PER_ORDER + 1)
+    ]
+
+def run(render) -> float:
+    start = time.perf_counter()
+    for _ in range(TICKETS):
+        render()
+    return TICKETS / (time.perf_counter() - start)
+
+def main():
+    items = make_items()
+    bill_items = [BillItem(item["menu_item_id"], item["name"], item["quantity"], item["total_price"], item["note"]) for item in items]
+
+    before = kitchen_ticket_lines_before("Bàn 5", "10:30", items)
+    after = kitchen_ticket_lines("Bàn 5", "10:30", bill_items)
+    assert before == after, "bill_lines khác nhau"
+
+    before_tps = run(lambda: kitchen_ticket_lines_before("Bàn 5", "10:30", items))
+    item_name_layout.cache_clear()
+    after_tps = run(lambda: kitchen_ticket_lines("Bàn 5", "10:30", bill_items))
+    wide_tps = run(lambda: kitchen_ticket_lines("Bàn 5", "10:30", bill_items, 48))
+    print(f"kitchen ticket ({ITEMS_PER_ORDER} món)  before {before_tps:9.1f} phiếu/s   after {after_tps:9.1f} phiếu/s   x{after_tps / before_tps:.2f}")
+    print(f"kitchen ticket khổ 80mm (48 ký tự)  after {wide_tps:9.1f} phiếu/s")
+    print(f"item_name_layout cache: {item_name_layout.cache_info()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark chi phí logging cho mỗi request GET /api/v1/orders/ (trang 100 order), tách hai thay đổi:
+
+- handler: cùng các lệnh log, chạy dưới handler stdout + file ghi đồng bộ (cũ) và dưới
+  QueueHandler/QueueListener của app.core.logging_config (mới).
+- mức log: cùng QueueHandler, lệnh log cũ (mọi thứ ở INFO, compile SQL literal_binds, log từng order)
+  so với lệnh log mới (phần chẩn đoán ở DEBUG, bị lọc khi chạy ở INFO).
+
+Thời gian đo là phần chạy trên đường request; với QueueHandler, thread listener ghi sau
+(mỗi lần đo chờ listener ghi xong trước khi đo tiếp).
+
+Chạy từ thư mục backendcoffeeshop:
+    python -m benchmarks.bench_logging
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import logging_config  # noqa: E402
+
+REQUESTS = 300
+ORDERS_PER_PAGE = 100
+
+orders_table = Table(
+    "orders", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("status", String(20)),
+    Column("payment_status", String(20)),
+    Column("shift_id", Integer),
+    Column("time_in", DateTime),
+)
+QUERY = select(orders_table).where(
+    orders_table.c.time_in >= datetime(2026, 1, 1),
+    orders_table.c.time_in <= datetime(2026, 1, 1, 23, 59, 59)
+).order_by(orders_table.c.time_in.desc())
+
+ORDERS = [
+    {"id": i, "status": "completed", "payment_status": "paid", "time_in": datetime(2026, 1, 1, 8, i % 60), "shift_id": 1}
+    for i in range(ORDERS_PER_PAGE)
+]
+
+def simulate_request(logger: logging.Logger):
+    """Các lệnh log mà get_orders phát ra cho một request"""
+    logger.info("=== BẮT ĐẦU GET ORDERS ===")
+    logger.info(f"Params: skip=0, limit={ORDERS_PER_PAGE}, date=2026-01-01")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"SQL Query: {QUERY.compile(compile_kwargs={'literal_binds': True})}")
+        for order in ORDERS:
+            logger.debug(f"Order {order['id']}: status={order['status']}, payment_status={order['payment_status']}, time_in={order['time_in']}, shift_id={order['shift_id']}")
+    logger.info(f"=== KẾT THÚC GET ORDERS - Trả về {len(ORDERS)} orders ===")
+
+def simulate_request_before(logger: logging.Logger):
+    """Phiên bản cũ: mọi thứ ở INFO, không kiểm tra mức log"""
+    logger.info("=== BẮT ĐẦU GET ORDERS ===")
+    logger.info(f"Params: skip=0, limit={ORDERS_PER_PAGE}, date=2026-01-01")
+    logger.info(f"SQL Query: {QUERY.compile(compile_kwargs={'literal_binds': True})}")
+    for order in ORDERS:
+        logger.info(f"Order {order['id']}: status={order['status']}, payment_status={order['payment_status']}, time_in={order['time_in']}, shift_id={order['shift_id']}")
+    for order in ORDERS:
+        logger.info(f"Successfully processed order {order['id']} with status={order['status']}, payment_status={order['payment_status']}")
+    logger.info(f"=== KẾT THÚC GET ORDERS - Trả về {len(ORDERS)} orders ===")
+
+def sync_logger(name: str, *handlers: logging.Handler) -> logging.Logger:
+    """Setup cũ: handler ghi đồng bộ gắn trực tiếp vào logger"""
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    formatter = logging.Formatter(logging_config.LOG_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    logger.addFilter(logging_config.RequestContextFilter())
+    return logger
+
+def queue_logger(name: str, *handlers: logging.Handler) -> logging.Logger:
+    """Setup mới: QueueHandler, việc ghi do thread listener đảm nhận"""
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging_config._make_queue_handler(*handlers))
+    return logger
+
+def wait_idle(logger: logging.Logger):
+    """Chờ listener ghi hết record còn trong queue để lần đo sau không tranh CPU với nó"""
+    for handler in logger.handlers:
+        while getattr(handler, "queue", None) is not None and not handler.queue.empty():
+            time.sleep(0.01)
+    time.sleep(0.05)
+
+def run(label: str, logger: logging.Logger, func) -> float:
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        func(logger)
+    elapsed = time.perf_counter() - start
+    wait_idle(logger)
+    per_request = elapsed / REQUESTS * 1000
+    print(f"{label:<32} {per_request:8.3f} ms/request")
+    return per_request
+
+def main():
+    tmpdir = tempfile.mkdtemp()
+    devnull = open(os.devnull, "w")
+
+    def handlers(name: str):
+        return logging.StreamHandler(devnull), logging.FileHandler(os.path.join(tmpdir, f"{name}.log"))
+
+    sync_old = run("đồng bộ, log cũ", sync_logger("bench.sync_old", *handlers("sync_old")), simulate_request_before)
+    queue_old = run("queue, log cũ", queue_logger("bench.queue_old", *handlers("queue_old")), simulate_request_before)
+    sync_new = run("đồng bộ, log mới", sync_logger("bench.sync_new", *handlers("sync_new")), simulate_request)
+    queue_new = run("queue, log mới", queue_logger("bench.queue_new", *handlers("queue_new")), simulate_request)
+
+    # Mỗi dòng chỉ đổi một yếu tố
+    print(f"handler (cùng log cũ)            x{sync_old / queue_old:.1f}")
+    print(f"handler (cùng log mới)           x{sync_new / queue_new:.1f}")
+    print(f"mức log (cùng queue)             x{queue_old / queue_new:.1f}")
+    logging_config._stop_listeners()
+    devnull.close()
+
+if __name__ == "__main__":
+    main()
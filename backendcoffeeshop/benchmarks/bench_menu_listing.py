@@ -0,0 +1,114 @@
+"""
+Benchmark requests/giây của GET /api/menu-items/ và /api/menu-groups/.
+
+- before: query ORM + response_model (pydantic validate + jsonable_encoder) mỗi request.
+- after:  model_version() một câu aggregate + body JSON dựng sẵn trong JSONResponseCache.
+
+Hai endpoint được dựng lại trên app FastAPI riêng (app.main cần Postgres và thư mục /app/image),
+dùng đúng các hàm crud/core như main.py. Chạy từ thư mục backendcoffeeshop:
+    python -m benchmarks.bench_menu_listing
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+from fastapi import Depends, FastAPI, Request, Response
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.database  # noqa: E402,F401  (phải import trước app.models)
+from app import crud, schemas  # noqa: E402
+from app.core.conditional import conditional_get, model_version  # noqa: E402
+from app.core.response_cache import (  # noqa: E402
+    menu_groups_response_cache, menu_items_response_cache, raw_json_response
+)
+from app.models import Base, MenuGroup, MenuItem  # noqa: E402
+
+REQUESTS = 500
+MENU_GROUPS = 20
+MENU_ITEMS = 100
+
+def make_sessionmaker():
+    path = os.path.join(tempfile.mkdtemp(), "menu.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    db = SessionLocal()
+    db.add_all([MenuGroup(id=i, name=f"Nhóm {i}", description="Đồ uống") for i in range(1, MENU_GROUPS + 1)])
+    db.add_all([
+        MenuItem(id=i, name=f"Cà phê sữa đá số {i}", code=f"CF{i:03d}", unit="ly",
+                 price=20000 + i * 1000, group_id=(i % MENU_GROUPS) + 1)
+        for i in range(1, MENU_ITEMS + 1)
+    ])
+    db.commit()
+    db.close()
+    return SessionLocal
+
+def build_app(SessionLocal) -> FastAPI:
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    api = FastAPI()
+
+    @api.get("/before/menu-items/", response_model=List[schemas.MenuItem])
+    def read_menu_items_before(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+        return crud.get_menu_items(db, skip=skip, limit=limit)
+
+    @api.get("/before/menu-groups/", response_model=List[schemas.MenuGroup])
+    def read_menu_groups_before(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+        return crud.get_menu_groups(db, skip=skip, limit=limit)
+
+    @api.get("/after/menu-items/", response_model=List[schemas.MenuItem])
+    def read_menu_items_after(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+        version = model_version(db, MenuItem)
+        not_modified = conditional_get(request, response, version, last_modified=version[1])
+        if not_modified:
+            return not_modified
+        body = menu_items_response_cache.get_or_build(
+            (skip, limit), version, lambda: crud.get_menu_items_json(db, skip=skip, limit=limit)
+        )
+        return raw_json_response(body, response)
+
+    @api.get("/after/menu-groups/", response_model=List[schemas.MenuGroup])
+    def read_menu_groups_after(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+        version = model_version(db, MenuGroup)
+        not_modified = conditional_get(request, response, version, last_modified=version[1])
+        if not_modified:
+            return not_modified
+        body = menu_groups_response_cache.get_or_build(
+            (skip, limit), version, lambda: crud.get_menu_groups_json(db, skip=skip, limit=limit)
+        )
+        return raw_json_response(body, response)
+
+    return api
+
+def run(client: TestClient, url: str) -> float:
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.get(url)
+    return REQUESTS / (time.perf_counter() - start)
+
+def main():
+    client = TestClient(build_app(make_sessionmaker()))
+
+    for resource in ("menu-items", "menu-groups"):
+        before = client.get(f"/before/{resource}/").json()
+        after = client.get(f"/after/{resource}/").json()
+        assert json.dumps(before, sort_keys=True) == json.dumps(after, sort_keys=True), f"{resource}: body khác nhau"
+
+        before_rps = run(client, f"/before/{resource}/")
+        after_rps = run(client, f"/after/{resource}/")
+        print(f"{resource:<12} before {before_rps:8.1f} req/s   after {after_rps:8.1f} req/s   x{after_rps / before_rps:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Benchmark /dashboard/menu-stats trên dữ liệu giả lập một năm order.
+
+- before:      câu tổng hợp chính + 3 câu get_shift_quantity_by_time cho mỗi món (code cũ trong dashboard.py).
+- single pass: một câu SUM(CASE ...) trên orders/order_items.
+- rollup:      dashboard.menu_item_totals, SUM(CASE ...) trên bảng rollup sales_hourly_items.
+
+Bản cũ ở đây so sánh giờ bằng minute_of_day thay cho cast(Order.time_in, Time) (SQLite không có kiểu TIME),
+để các cách phải cho ra cùng kết quả; số câu truy vấn giữ nguyên như code cũ.
+Mặc định chạy trên SQLite trong bộ nhớ; đặt BENCH_DATABASE_URL để chạy trên một database Postgres trống.
+Chạy từ thư mục backendcoffeeshop:
+    python -m benchmarks.bench_menu_stats
+"""
+import os
+import random
+import sys
+import time as timer
+from datetime import datetime, timedelta, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, func, desc, case, and_  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import app.database  # noqa: E402,F401  (phải import trước app.models)
+from app.models import Base, Order, OrderItem, MenuItem, MenuGroup  # noqa: E402
+from app.api.v1.endpoints.dashboard import menu_item_totals, MENU_STATS_SHIFT_WINDOWS, SHIFT_KEYS  # noqa: E402
+from app.core.sales_rollup import sales_rollup  # noqa: E402
+
+DAYS = int(os.getenv("BENCH_DAYS", "365"))
+ORDERS_PER_DAY = int(os.getenv("BENCH_ORDERS_PER_DAY", "60"))
+ITEMS_PER_ORDER = 3
+MENU_ITEMS = int(os.getenv("BENCH_MENU_ITEMS", "200"))
+YEAR_START = datetime(2024, 1, 1)
+
+def minute_of_day(column):
+    return func.extract("hour", column) * 60 + func.extract("minute", column)
+
+def menu_item_totals_before(db, start_dt, end_dt):
+    """Bản cũ của menu_stats: câu tổng + 3 câu theo ca cho mỗi món"""
+    total_query = db.query(
+        MenuItem.id,
+        MenuItem.name,
+        MenuItem.price,
+        func.sum(OrderItem.quantity).label('total_quantity'),
+        func.sum(OrderItem.quantity * MenuItem.price).label('total_revenue')
+    ).join(
+        OrderItem, MenuItem.id == OrderItem.menu_item_id
+    ).join(
+        Order, OrderItem.order_id == Order.id
+    ).filter(
+        Order.time_in >= start_dt,
+        Order.time_in <= end_dt,
+        Order.status == 'completed'
+    ).group_by(
+        MenuItem.id, MenuItem.name, MenuItem.price
+    ).order_by(
+        desc('total_quantity')
+    ).all()
+
+    def get_shift_quantity_by_time(menu_item_id, shift_type):
+        shift_start, shift_end = MENU_STATS_SHIFT_WINDOWS[shift_type]
+        order_minute = minute_of_day(Order.time_in)
+        result = db.query(
+            func.sum(OrderItem.quantity).label('quantity')
+        ).join(
+            Order, OrderItem.order_id == Order.id
+        ).filter(
+            OrderItem.menu_item_id == menu_item_id,
+            Order.time_in >= start_dt,
+            Order.time_in <= end_dt,
+            Order.status == 'completed',
+            order_minute >= shift_start,
+            order_minute < shift_end
+        ).scalar()
+        return result or 0
+
+    return [
+        (
+            item.id, item.total_quantity, item.total_revenue,
+            get_shift_quantity_by_time(item.id, 'morning'),
+            get_shift_quantity_by_time(item.id, 'afternoon'),
+            get_shift_quantity_by_time(item.id, 'evening')
+        )
+        for item in total_query
+    ]
+
+def menu_item_totals_single_pass(db, start_dt, end_dt):
+    """Tổng và số lượng theo ca trong một câu, quét orders/order_items"""
+    order_minute = minute_of_day(Order.time_in)
+    shift_columns = []
+    for key in SHIFT_KEYS:
+        shift_start, shift_end = MENU_STATS_SHIFT_WINDOWS[key]
+        in_shift = and_(order_minute >= shift_start, order_minute < shift_end)
+        shift_columns.append(func.coalesce(func.sum(case((in_shift, OrderItem.quantity), else_=0)), 0))
+    rows = db.query(
+        MenuItem.id,
+        func.sum(OrderItem.quantity),
+        func.sum(OrderItem.quantity * MenuItem.price),
+        *shift_columns
+    ).join(
+        OrderItem, MenuItem.id == OrderItem.menu_item_id
+    ).join(
+        Order, OrderItem.order_id == Order.id
+    ).filter(
+        Order.time_in >= start_dt,
+        Order.time_in <= end_dt,
+        Order.status == 'completed'
+    ).group_by(MenuItem.id).all()
+    return [tuple(row) for row in rows]
+
+def menu_item_totals_after(db, start_dt, end_dt):
+    return [
+        (
+            item.id, item.total_quantity, item.total_revenue,
+            item.morning_quantity, item.afternoon_quantity, item.evening_quantity
+        )
+        for item in menu_item_totals(db, start_dt, end_dt)
+    ]
+
+def seed(engine):
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(MenuGroup.__table__.insert(), [{"id": 1, "name": "Bench"}])
+        conn.execute(MenuItem.__table__.insert(), [
+            {"id": i, "name": f"Món {i}", "code": f"B{i}", "unit": "ly", "price": 10000 + i * 500, "group_id": 1}
+            for i in range(1, MENU_ITEMS + 1)
+        ])
+        order_id = 0
+        for day in range(DAYS):
+            orders, items = [], []
+            for _ in range(ORDERS_PER_DAY):
+                order_id += 1
+                time_in = YEAR_START + timedelta(days=day, minutes=rng.randrange(6 * 60, 24 * 60))
+                orders.append({
+                    "id": order_id, "time_in": time_in, "total_amount": 0,
+                    "status": "completed" if rng.random() < 0.9 else "cancelled"
+                })
+                for _ in range(ITEMS_PER_ORDER):
+                    items.append({
+                        "order_id": order_id, "menu_item_id": rng.randint(1, MENU_ITEMS),
+                        "quantity": rng.randint(1, 3), "unit_price": 0, "total_price": 0
+                    })
+            conn.execute(Order.__table__.insert(), orders)
+            conn.execute(OrderItem.__table__.insert(), items)
+    return order_id
+
+def build_rollup(engine):
+    db = sessionmaker(bind=engine)()
+    try:
+        start = timer.perf_counter()
+        sales_rollup.rebuild(db)
+        return timer.perf_counter() - start
+    finally:
+        db.close()
+
+def run(engine, compute, start_dt, end_dt):
+    queries = {"n": 0}
+
+    def count(*args):
+        queries["n"] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    db = sessionmaker(bind=engine)()
+    try:
+        start = timer.perf_counter()
+        result = compute(db, start_dt, end_dt)
+        return result, timer.perf_counter() - start, queries["n"]
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", count)
+
+def main():
+    engine = create_engine(os.getenv("BENCH_DATABASE_URL", "sqlite://"))
+    orders = seed(engine)
+    start_dt = datetime.combine(YEAR_START.date(), time(0, 0, 0))
+    end_dt = datetime.combine((YEAR_START + timedelta(days=DAYS - 1)).date(), time(23, 59, 59))
+    rebuild_s = build_rollup(engine)
+    print(f"{orders} order, {orders * ITEMS_PER_ORDER} order item, {MENU_ITEMS} món, {DAYS} ngày (dựng rollup {rebuild_s * 1000:.1f} ms)")
+
+    before, before_s, before_q = run(engine, menu_item_totals_before, start_dt, end_dt)
+    single, single_s, single_q = run(engine, menu_item_totals_single_pass, start_dt, end_dt)
+    after, after_s, after_q = run(engine, menu_item_totals_after, start_dt, end_dt)
+    assert sorted(before) == sorted(single) == sorted(after), "kết quả menu-stats khác nhau"
+
+    print(f"menu-stats cả năm  before      {before_s * 1000:9.1f} ms ({before_q} câu)")
+    print(f"menu-stats cả năm  single pass {single_s * 1000:9.1f} ms ({single_q} câu)   x{before_s / single_s:.1f}")
+    print(f"menu-stats cả năm  rollup      {after_s * 1000:9.1f} ms ({after_q} câu)   x{before_s / after_s:.1f}")
+
+if __name__ == "__main__":
+    main()
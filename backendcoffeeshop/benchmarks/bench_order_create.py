@@ -0,0 +1,118 @@
+"""
+Micro-benchmark tạo order 20 dòng.
+
+- before: cách cũ của crud.create_order - commit order, mỗi item một query MenuItem,
+          commit items, rồi query + commit trạng thái bàn (3 transaction).
+- after:  crud.create_order hiện tại - một câu IN kiểm tra menu_item_id,
+          INSERT nhiều dòng cho order_items, cập nhật bàn, một commit.
+
+Dùng SQLite file tạm để tính cả chi phí commit. Chạy từ thư mục backendcoffeeshop:
+    python -m benchmarks.bench_order_create
+"""
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.database  # noqa: E402,F401  (phải import trước app.models)
+from app import crud, schemas  # noqa: E402
+from app.database import models  # noqa: E402
+
+ORDERS = 200
+LINES_PER_ORDER = 20
+MENU_ITEMS = 50
+
+def create_order_before(db, order: schemas.OrderCreate):
+    """Bản sao cách ghi cũ để so sánh"""
+    active_shift = db.query(models.Shift).filter(
+        models.Shift.is_active == True,
+        models.Shift.status == "active"
+    ).first()
+    db_order = models.Order(
+        table_id=order.table_id,
+        staff_id=order.staff_id,
+        shift_id=active_shift.id,
+        status=order.status,
+        total_amount=order.total_amount,
+        note=order.note,
+        order_code=order.order_code,
+        payment_status="unpaid"
+    )
+    db.add(db_order)
+    db.commit()
+    db.refresh(db_order)
+
+    for item in order.items:
+        menu_item = db.query(models.MenuItem).filter(models.MenuItem.id == item.menu_item_id).first()
+        if not menu_item:
+            continue
+        db.add(models.OrderItem(
+            order_id=db_order.id,
+            menu_item_id=item.menu_item_id,
+            quantity=item.quantity,
+            unit_price=item.unit_price,
+            total_price=item.total_price,
+            note=item.note
+        ))
+    db.commit()
+    db.refresh(db_order)
+
+    db_table = db.query(models.Table).filter(models.Table.id == db_order.table_id).first()
+    if db_table:
+        db_table.status = 'occupied'
+        db.commit()
+        db.refresh(db_table)
+    return db_order
+
+def make_session(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(models.MenuGroup(id=1, name="Cafe"))
+    db.add_all([
+        models.MenuItem(id=i, name=f"Món {i}", code=f"M{i}", unit="ly", price=1000 * i, group_id=1)
+        for i in range(1, MENU_ITEMS + 1)
+    ])
+    db.add(models.Table(id=1, name="Bàn 1", status="available"))
+    db.add(models.Shift(id=1, shift_type="MORNING", status="active", is_active=True))
+    db.commit()
+    return engine, db
+
+def make_order() -> schemas.OrderCreate:
+    items = [
+        {"menu_item_id": (i % MENU_ITEMS) + 1, "quantity": 2, "unit_price": 25000, "total_price": 50000, "note": "ít đá" if i % 3 == 0 else None}
+        for i in range(LINES_PER_ORDER)
+    ]
+    return schemas.OrderCreate(
+        table_id=1, staff_id=1, shift_id=1, status="pending",
+        total_amount=50000 * LINES_PER_ORDER, items=items
+    )
+
+def run(label: str, func):
+    tmpdir = tempfile.mkdtemp()
+    engine, db = make_session(os.path.join(tmpdir, f"{label}.db"))
+    statements = {"count": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(*args):
+        statements["count"] += 1
+
+    order = make_order()
+    start = time.perf_counter()
+    for _ in range(ORDERS):
+        func(db, order)
+    elapsed = time.perf_counter() - start
+    db.close()
+    print(f"{label:<8} {elapsed / ORDERS * 1000:8.3f} ms/order  {statements['count'] / ORDERS:5.1f} statements/order")
+
+def main():
+    run("before", create_order_before)
+    run("after", crud.create_order)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark các endpoint doanh thu (/dashboard/revenue, /dashboard/revenue-by-hour, /payments/summary/).
+Kết quả đúng của app.core.revenue kiểm tra trong tests/test_revenue.py.
+
+- before:  code cũ trong main.py (đổi Payment.payment_time/total_amount thành created_at/amount vì model không có hai
+           cột đó); doanh thu dự kiến không join order_items với orders nên là tích Descartes.
+- after:   app.core.revenue, một câu GROUP BY (giờ, phương thức) trên payments và một câu join order_items → orders.
+
+Mặc định chạy trên SQLite trong bộ nhớ; đặt BENCH_DATABASE_URL để chạy trên một database Postgres trống.
+Chạy từ thư mục backendcoffeeshop:
+    python -m benchmarks.bench_revenue
+"""
+import os
+import random
+import sys
+import time as timer
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, func, extract  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import app.database  # noqa: E402,F401  (phải import trước app.models)
+from app.models import Base, Order, OrderItem, MenuItem, MenuGroup, Payment  # noqa: E402
+from app.core import revenue  # noqa: E402
+
+DAYS = int(os.getenv("BENCH_DAYS", "90"))
+ORDERS_PER_DAY = int(os.getenv("BENCH_ORDERS_PER_DAY", "60"))
+ITEMS_PER_ORDER = 3
+MENU_ITEMS = 50
+FIRST_DAY = datetime(2024, 1, 1)
+METHODS = ("cash", "card", "transfer")
+
+def summary_after(db, start_dt, end_dt):
+    buckets = revenue.payment_buckets(db, start_dt, end_dt)
+    actual_revenue = revenue.paid_revenue(buckets)
+    estimated_revenue = revenue.pending_order_revenue(db, start_dt, end_dt)
+    return {
+        "actual_revenue": actual_revenue,
+        "estimated_revenue": estimated_revenue,
+        "by_hour": {group["hour"]: (group["total_amount"], group["count"]) for group in revenue.totals_by_hour(buckets)},
+        "by_method": {group["method"]: (group["total_amount"], group["count"]) for group in revenue.totals_by_method(buckets)}
+    }
+
+def summary_before(db, start_dt, end_dt):
+    """Code cũ của get_revenue + get_payment_summary"""
+    end_of_day = end_dt - timedelta(microseconds=1)
+    actual_revenue = db.query(Payment).filter(
+        Payment.created_at >= start_dt,
+        Payment.created_at <= end_of_day
+    ).with_entities(func.sum(Payment.amount)).scalar() or 0
+    estimated_revenue = db.query(Order).filter(
+        Order.time_in >= start_dt,
+        Order.time_in <= end_of_day,
+        Order.status == "pending"
+    ).with_entities(func.sum(OrderItem.quantity * OrderItem.unit_price)).scalar() or 0
+    by_method = db.query(
+        Payment.payment_method,
+        func.sum(Payment.amount).label('total_amount'),
+        func.count(Payment.id).label('count')
+    ).filter(
+        Payment.created_at >= start_dt,
+        Payment.created_at <= end_of_day
+    ).group_by(Payment.payment_method).all()
+    by_hour = db.query(
+        extract('hour', Payment.created_at).label('hour'),
+        func.sum(Payment.amount).label('total_amount'),
+        func.count(Payment.id).label('count')
+    ).filter(
+        Payment.created_at >= start_dt,
+        Payment.created_at <= end_of_day
+    ).group_by('hour').all()
+    return {
+        "actual_revenue": actual_revenue,
+        "estimated_revenue": estimated_revenue,
+        "by_hour": {int(row.hour): (row.total_amount, row.count) for row in by_hour},
+        "by_method": {row.payment_method: (row.total_amount, row.count) for row in by_method}
+    }
+
+def seed_menu(conn):
+    conn.execute(MenuGroup.__table__.insert(), [{"id": 1, "name": "Bench"}])
+    conn.execute(MenuItem.__table__.insert(), [
+        {"id": i, "name": f"Món {i}", "code": f"B{i}", "unit": "ly", "price": 10000 + i * 500, "group_id": 1}
+        for i in range(1, MENU_ITEMS + 1)
+    ])
+
+def seed(engine):
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        seed_menu(conn)
+        order_id = 0
+        for day in range(DAYS):
+            orders, items, payments = [], [], []
+            for _ in range(ORDERS_PER_DAY):
+                order_id += 1
+                time_in = FIRST_DAY + timedelta(days=day, minutes=rng.randrange(6 * 60, 23 * 60))
+                status = "pending" if rng.random() < 0.2 else "completed"
+                total = 0
+                for _ in range(ITEMS_PER_ORDER):
+                    quantity, unit_price = rng.randint(1, 3), 10000 + rng.randint(1, MENU_ITEMS) * 500
+                    total += quantity * unit_price
+                    items.append({
+                        "order_id": order_id, "menu_item_id": rng.randint(1, MENU_ITEMS),
+                        "quantity": quantity, "unit_price": unit_price, "total_price": quantity * unit_price
+                    })
+                orders.append({"id": order_id, "time_in": time_in, "status": status, "total_amount": total})
+                if status == "completed":
+                    payments.append({
+                        "order_id": order_id, "amount": total, "payment_method": rng.choice(METHODS),
+                        "payment_status": "completed", "created_at": time_in + timedelta(minutes=rng.randint(5, 50))
+                    })
+            conn.execute(Order.__table__.insert(), orders)
+            conn.execute(OrderItem.__table__.insert(), items)
+            conn.execute(Payment.__table__.insert(), payments)
+    return order_id
+
+def run(engine, compute, start_dt, end_dt):
+    queries = {"n": 0}
+
+    def count(*args):
+        queries["n"] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    db = sessionmaker(bind=engine)()
+    try:
+        start = timer.perf_counter()
+        result = compute(db, start_dt, end_dt)
+        return result, timer.perf_counter() - start, queries["n"]
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", count)
+
+def main():
+    engine = create_engine(os.getenv("BENCH_DATABASE_URL", "sqlite://"))
+    orders = seed(engine)
+    print(f"{orders} order, {orders * ITEMS_PER_ORDER} order item, {DAYS} ngày")
+    start_dt, end_dt = revenue.day_window((FIRST_DAY + timedelta(days=DAYS - 1)).date())
+
+    before, before_s, before_q = run(engine, summary_before, start_dt, end_dt)
+    after, after_s, after_q = run(engine, summary_after, start_dt, end_dt)
+    print(f"doanh thu dự kiến  before {before['estimated_revenue']:>16,.0f}  (tích Descartes với toàn bộ order_items)")
+    print(f"doanh thu dự kiến  after  {after['estimated_revenue']:>16,.0f}")
+
+    print(f"revenue + summary một ngày  before {before_s * 1000:9.1f} ms ({before_q} câu)")
+    print(f"revenue + summary một ngày  after  {after_s * 1000:9.1f} ms ({after_q} câu)   x{before_s / after_s:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""add orders (time_in, id) index for keyset pagination
+
+Revision ID: 3f9c1a7d2b64
+Revises: add_staff_id_1_to_orders
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1a7d2b64'
+down_revision: Union[str, None] = 'add_staff_id_1_to_orders'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Index phục vụ ORDER BY time_in DESC, id DESC và điều kiện (time_in, id) < (:t, :id)
+    op.create_index('ix_orders_time_in_id', 'orders', ['time_in', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_orders_time_in_id', table_name='orders')
@@ -0,0 +1,27 @@
+"""add menu_groups.station for printer routing
+
+Revision ID: 8b1e4c7a9d20
+Revises: 3f9c1a7d2b64
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1e4c7a9d20'
+down_revision: Union[str, None] = '3f9c1a7d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Quầy in phiếu làm đồ của nhóm món; NULL = quầy mặc định
+    op.add_column('menu_groups', sa.Column('station', sa.String(length=50), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('menu_groups', 'station')
@@ -0,0 +1,29 @@
+"""pending_changes for sales_reports
+
+Revision ID: b5d2f8e1c693
+Revises: f3a6d1c8b905
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d2f8e1c693'
+down_revision: Union[str, None] = 'f3a6d1c8b905'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Order của một ngày đã chốt thay đổi thì tăng bộ đếm; job chốt lại các ngày có pending_changes > 0
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('sales_reports')}
+    if 'pending_changes' not in columns:
+        op.add_column('sales_reports', sa.Column('pending_changes', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('sales_reports', 'pending_changes')
@@ -0,0 +1,51 @@
+"""add print_spool table for durable print jobs
+
+Revision ID: c41d7e2f9a13
+Revises: 8b1e4c7a9d20
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7e2f9a13'
+down_revision: Union[str, None] = '8b1e4c7a9d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # App có thể đã tạo bảng qua create_all khi khởi động
+    if sa.inspect(op.get_bind()).has_table('print_spool'):
+        return
+    op.create_table(
+        'print_spool',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.String(length=32), nullable=False),
+        sa.Column('kind', sa.String(length=30), nullable=True),
+        sa.Column('order_id', sa.Integer(), nullable=True),
+        sa.Column('station', sa.String(length=50), nullable=True),
+        sa.Column('target', sa.String(length=64), nullable=True),
+        sa.Column('lines', sa.JSON(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('error', sa.String(length=200), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('job_id'),
+    )
+    op.create_index('ix_print_spool_id', 'print_spool', ['id'], unique=False)
+    op.create_index('ix_print_spool_order_id', 'print_spool', ['order_id'], unique=False)
+    op.create_index('ix_print_spool_status_id', 'print_spool', ['status', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_print_spool_status_id', table_name='print_spool')
+    op.drop_index('ix_print_spool_order_id', table_name='print_spool')
+    op.drop_index('ix_print_spool_id', table_name='print_spool')
+    op.drop_table('print_spool')
@@ -0,0 +1,61 @@
+"""add sales_hourly and sales_hourly_items rollup tables
+
+Revision ID: d5a8f3b1c027
+Revises: c41d7e2f9a13
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a8f3b1c027'
+down_revision: Union[str, None] = 'c41d7e2f9a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # App có thể đã tạo bảng qua create_all khi khởi động
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('sales_hourly'):
+        op.create_table(
+            'sales_hourly',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sale_date', sa.Date(), nullable=False),
+            sa.Column('hour', sa.Integer(), nullable=False),
+            sa.Column('shift', sa.String(length=50), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('order_count', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('sale_date', 'hour', 'shift', 'status', name='uq_sales_hourly_bucket'),
+        )
+        op.create_index('ix_sales_hourly_id', 'sales_hourly', ['id'], unique=False)
+    if not inspector.has_table('sales_hourly_items'):
+        op.create_table(
+            'sales_hourly_items',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sale_date', sa.Date(), nullable=False),
+            sa.Column('hour', sa.Integer(), nullable=False),
+            sa.Column('shift', sa.String(length=50), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('menu_item_id', sa.Integer(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('sale_date', 'hour', 'shift', 'status', 'menu_item_id', name='uq_sales_hourly_items_bucket'),
+        )
+        op.create_index('ix_sales_hourly_items_id', 'sales_hourly_items', ['id'], unique=False)
+        op.create_index('ix_sales_hourly_items_menu_item_date', 'sales_hourly_items', ['menu_item_id', 'sale_date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sales_hourly_items_menu_item_date', table_name='sales_hourly_items')
+    op.drop_index('ix_sales_hourly_items_id', table_name='sales_hourly_items')
+    op.drop_table('sales_hourly_items')
+    op.drop_index('ix_sales_hourly_id', table_name='sales_hourly')
+    op.drop_table('sales_hourly')
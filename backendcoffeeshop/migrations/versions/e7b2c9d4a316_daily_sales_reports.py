@@ -0,0 +1,61 @@
+"""report_date columns for sales_reports and product_performance
+
+Revision ID: e7b2c9d4a316
+Revises: d5a8f3b1c027
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2c9d4a316'
+down_revision: Union[str, None] = 'd5a8f3b1c027'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    # App có thể đã tạo bảng qua create_all khi khởi động
+    if not inspector.has_table('sales_reports'):
+        op.create_table(
+            'sales_reports',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('report_date', sa.Date(), nullable=True),
+            sa.Column('report_type', sa.String(length=20), nullable=True),
+            sa.Column('date', sa.DateTime(), nullable=True),
+            sa.Column('end_date', sa.DateTime(), nullable=True),
+            sa.Column('total_sales', sa.Float(), nullable=True),
+            sa.Column('total_orders', sa.Integer(), nullable=True),
+            sa.Column('total_customers', sa.Integer(), nullable=True),
+            sa.Column('average_order_value', sa.Float(), nullable=True),
+            sa.Column('payment_methods', sa.JSON(), nullable=True),
+            sa.Column('top_products', sa.JSON(), nullable=True),
+            sa.Column('top_categories', sa.JSON(), nullable=True),
+            sa.Column('note', sa.String(length=200), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('report_date', 'report_type', name='uq_sales_reports_date_type'),
+        )
+        op.create_index('ix_sales_reports_id', 'sales_reports', ['id'], unique=False)
+        op.create_index('ix_sales_reports_report_date', 'sales_reports', ['report_date'], unique=False)
+
+    columns = {column['name'] for column in inspector.get_columns('product_performance')}
+    if 'report_date' not in columns:
+        op.add_column('product_performance', sa.Column('report_date', sa.Date(), nullable=True))
+        op.create_index('ix_product_performance_report_date', 'product_performance', ['report_date'], unique=False)
+        op.create_unique_constraint('uq_product_performance_product_date', 'product_performance', ['product_id', 'report_date'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_product_performance_product_date', 'product_performance', type_='unique')
+    op.drop_index('ix_product_performance_report_date', table_name='product_performance')
+    op.drop_column('product_performance', 'report_date')
+    op.drop_index('ix_sales_reports_report_date', table_name='sales_reports')
+    op.drop_index('ix_sales_reports_id', table_name='sales_reports')
+    op.drop_table('sales_reports')
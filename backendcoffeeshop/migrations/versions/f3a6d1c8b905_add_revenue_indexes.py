@@ -0,0 +1,29 @@
+"""add order_items.order_id and payments.created_at indexes for revenue aggregates
+
+Revision ID: f3a6d1c8b905
+Revises: e7b2c9d4a316
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a6d1c8b905'
+down_revision: Union[str, None] = 'e7b2c9d4a316'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Index cho join order_items → orders và lọc payments theo khoảng created_at
+    op.create_index('ix_order_items_order_id', 'order_items', ['order_id'], unique=False)
+    op.create_index('ix_payments_created_at', 'payments', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payments_created_at', table_name='payments')
+    op.drop_index('ix_order_items_order_id', table_name='order_items')
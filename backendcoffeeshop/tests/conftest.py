@@ -0,0 +1,74 @@
+import os
+import sys
+
+# Chạy pytest từ thư mục backendcoffeeshop: python -m pytest tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+import app.database  # noqa: E402,F401  (phải import trước app.models)
+from app.models import Base, MenuGroup, MenuItem, Table, Shift  # noqa: E402
+
+@pytest.fixture
+def engine():
+    """SQLite trong bộ nhớ, một kết nối dùng chung cho mọi session (cả session riêng của các module)"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+@pytest.fixture
+def menu(db):
+    """Nhóm "Cafe", món 1-5 (giá 10000 * id), bàn 1-2 và một ca sáng đang mở"""
+    db.add(MenuGroup(id=1, name="Cafe"))
+    db.add_all([
+        MenuItem(id=i, name=f"Món {i}", code=f"M{i}", unit="ly", price=10000 * i, group_id=1)
+        for i in range(1, 6)
+    ])
+    db.add_all([Table(id=i, name=f"Bàn {i}", status="available") for i in (1, 2)])
+    db.add(Shift(id=1, shift_type="MORNING", status="open", is_active=True))
+    db.commit()
+
+@pytest.fixture
+def orders_client(session_factory, menu, monkeypatch):
+    """TestClient cho router orders trên SQLite, event bus trong bộ nhớ"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.database.database import get_db
+    from app.core.event_bus import InMemoryEventBus
+    from app.core import bill_renderer, menu_cache
+    from app.api.v1.endpoints import orders, print_spool, table_feed
+    from app.api.v1.endpoints.ws_hub import hub
+
+    for module in (bill_renderer, menu_cache, print_spool, table_feed):
+        monkeypatch.setattr(module, "SessionLocal", session_factory)
+    monkeypatch.setattr(hub, "bus", InMemoryEventBus())
+    menu_cache.menu_cache.invalidate()
+    bill_renderer.paper_width_cache.invalidate()
+
+    api = FastAPI()
+    api.include_router(orders.router, prefix="/api/orders")
+
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    api.dependency_overrides[get_db] = override_get_db
+    with TestClient(api) as client:
+        yield client
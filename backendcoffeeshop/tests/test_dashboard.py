@@ -0,0 +1,26 @@
+import pytest
+
+from app.api.v1.endpoints.dashboard import DEFAULT_SHIFT_WINDOWS, load_shift_windows, parse_shift_windows
+
+def test_parse_shift_windows_in_minutes():
+    assert parse_shift_windows("05:00-11:00,11:00-17:00,17:00-24:00") == {
+        "morning": (300, 660),
+        "afternoon": (660, 1020),
+        "evening": (1020, 1440)
+    }
+
+@pytest.mark.parametrize("value", [
+    "06:30-12:00,12:00-18:00,18:00-24:00",  # rollup theo giờ: không chia được giữa giờ
+    "06:00-12:00,12:00-18:00",
+    "06:00-12:00,12:00-18:00,18:00",
+    "sáng,chiều,tối",
+    "12:00-06:00,12:00-18:00,18:00-24:00",
+    "06:00-12:00,12:00-18:00,18:00-25:00",
+])
+def test_parse_shift_windows_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_shift_windows(value)
+
+def test_load_shift_windows_falls_back_to_default(caplog):
+    assert load_shift_windows("06:30-12:00,12:00-18:00,18:00-24:00") == parse_shift_windows(DEFAULT_SHIFT_WINDOWS)
+    assert "MENU_STATS_SHIFT_WINDOWS" in caplog.text
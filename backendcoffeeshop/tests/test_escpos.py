@@ -0,0 +1,69 @@
+from app.core.escpos import (
+    CUT, INIT, encode_bill, encode_char, encode_text, header_commands, resolve_encoding, style_commands
+)
+
+# Bill ngắn tiếng Việt: tiêu đề (chữ to, đậm, giữa) + hai dòng thường cùng kiểu
+BILL = [
+    {"text": "CÀ PHÊ", "fontSize": 14, "bold": True, "align": "center"},
+    {"text": "Bạc xỉu x2", "fontSize": 12, "align": "left"},
+    {"text": "Tổng: 50.000đ", "fontSize": 12, "align": "left"},
+]
+
+TITLE_STYLE = b"\x1bM\x00" + b"\x1d!\x01" + b"\x1bE\x01" + b"\x1ba\x01"
+BODY_STYLE = b"\x1bM\x00" + b"\x1d!\x00" + b"\x1bE\x00" + b"\x1ba\x00"
+TRAILER = b"\x1bd\x04" + b"\x1dV\x42\x00"
+
+def test_style_commands():
+    assert style_commands(14, True, "center") == TITLE_STYLE
+    assert style_commands(12, False, "left") == BODY_STYLE
+    # Chữ nhỏ dùng font B, "Arial Black" in đậm, căn lề không hợp lệ về trái
+    assert style_commands(10, False, "right") == b"\x1bM\x01\x1d!\x00\x1bE\x00\x1ba\x02"
+    assert style_commands(12, False, "justify", "Arial Black") == b"\x1bM\x00\x1d!\x00\x1bE\x01\x1ba\x00"
+
+def test_header_commands():
+    assert INIT == b"\x1b@"
+    assert CUT == b"\x1dV\x42\x00"
+    assert header_commands(None) == b"\x1b@"
+    assert header_commands(30) == b"\x1b@\x1bt\x1e"
+    assert header_commands(300) == b"\x1b@"
+
+def test_resolve_encoding():
+    assert resolve_encoding(None) == "ascii"
+    assert resolve_encoding("windows-1258") == "cp1258"
+    assert resolve_encoding("khong-co") == "ascii"
+
+def test_encode_char_cp1258_splits_tone_marks():
+    # Chữ gốc có sẵn trong cp1258 + dấu thanh tổ hợp: huyền CC, sắc EC, ngã DE, hỏi D2, nặng F2
+    assert encode_char("ầ", "cp1258") == b"\xe2\xcc"
+    assert encode_char("ế", "cp1258") == b"\xea\xec"
+    assert encode_char("ữ", "cp1258") == b"\xfd\xde"
+    assert encode_char("ở", "cp1258") == b"\xf5\xd2"
+    assert encode_char("ạ", "cp1258") == b"a\xf2"
+    # Có sẵn dạng dựng sẵn trong cp1258
+    assert encode_char("à", "cp1258") == b"\xe0"
+    assert encode_char("đ", "cp1258") == b"\xf0"
+
+def test_encode_text_ascii_strips_marks():
+    assert encode_text("Tổng: 50.000đ") == b"Tong: 50.000d"
+    assert encode_text("ĐÁ") == b"DA"
+
+def test_encode_bill_ascii():
+    assert encode_bill(BILL) == (
+        b"\x1b@"
+        + TITLE_STYLE + b"CA PHE\n"
+        + BODY_STYLE + b"Bac xiu x2\n"
+        + b"Tong: 50.000d\n"
+        + TRAILER
+    )
+
+def test_encode_bill_cp1258():
+    assert encode_bill(BILL, "cp1258", codepage=30) == (
+        b"\x1b@\x1bt\x1e"
+        + TITLE_STYLE + b"C\xc0 PH\xca\n"
+        + BODY_STYLE + b"Ba\xf2c xi\xd2u x2\n"
+        + b"T\xf4\xd2ng: 50.000\xf0\n"
+        + TRAILER
+    )
+
+def test_encode_bill_without_cut():
+    assert encode_bill([{"text": "A"}], cut=False) == b"\x1b@" + BODY_STYLE + b"A\n" + b"\x1bd\x04"
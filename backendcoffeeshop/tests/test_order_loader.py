@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from app.api.v1.endpoints.order_loader import decode_cursor, encode_cursor, paginate_orders
+from app.models import Order
+
+def seed_orders(db):
+    """8 order, trong đó 3 order chưa có time_in; thứ tự mong đợi: time_in NULL trước (id giảm dần), rồi mới nhất trước"""
+    times = {
+        1: datetime(2025, 3, 1, 8), 2: None, 3: datetime(2025, 3, 1, 9), 4: None,
+        5: datetime(2025, 3, 1, 9), 6: datetime(2025, 3, 1, 7), 7: None, 8: datetime(2025, 3, 1, 10),
+    }
+    db.add_all([Order(id=order_id, status="pending", time_in=time_in) for order_id, time_in in times.items()])
+    db.commit()
+    return [7, 4, 2, 8, 5, 3, 1, 6]
+
+def test_cursor_round_trip_with_null_time_in():
+    assert decode_cursor(encode_cursor(Order(id=4, time_in=None))) == (None, 4)
+    assert decode_cursor(encode_cursor(Order(id=5, time_in=datetime(2025, 3, 1, 9)))) == (datetime(2025, 3, 1, 9), 5)
+
+def test_cursor_pages_through_orders_without_time_in(db):
+    expected = seed_orders(db)
+
+    assert [order.id for order in paginate_orders(db.query(Order), limit=None)[0]] == expected
+    seen, cursor = [], None
+    while True:
+        page, cursor = paginate_orders(db.query(Order), limit=2, cursor=cursor)
+        seen.extend(order.id for order in page)
+        if cursor is None:
+            break
+    assert seen == expected
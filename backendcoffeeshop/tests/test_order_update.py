@@ -0,0 +1,74 @@
+import pytest
+
+from app.api.v1.endpoints import orders
+
+def order_item(menu_item_id, quantity):
+    price = 10000 * menu_item_id
+    return {"menu_item_id": menu_item_id, "quantity": quantity, "unit_price": price, "total_price": price * quantity}
+
+@pytest.fixture
+def tickets(monkeypatch):
+    """Ghi lại các phiếu bếp được xếp thay vì gửi tới print queue"""
+    calls = []
+
+    def full(db, order_id, table_id, time_text, items, kind, station=None):
+        calls.append(("full", table_id, kind))
+        return []
+
+    def delta(db, order_id, table_id, time_text, item_changes):
+        calls.append(("delta", table_id, len(item_changes)))
+        return []
+
+    monkeypatch.setattr(orders, "KITCHEN_TICKET_MODE", "delta")
+    monkeypatch.setattr(orders, "submit_kitchen_tickets", full)
+    monkeypatch.setattr(orders, "submit_delta_tickets", delta)
+    return calls
+
+@pytest.fixture
+def published_tables(monkeypatch):
+    calls = []
+
+    async def publish(db, table_ids):
+        calls.append(sorted(set(table_ids)))
+
+    monkeypatch.setattr(orders.table_feed, "publish", publish)
+    return calls
+
+def create_order(client):
+    items = [order_item(1, 1)]
+    response = client.post("/api/orders/", json={
+        "table_id": 1, "staff_id": 1, "shift_id": 1, "status": "active",
+        "total_amount": sum(item["total_price"] for item in items), "items": items
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+def test_table_change_prints_full_ticket_in_delta_mode(orders_client, tickets, published_tables):
+    order_id = create_order(orders_client)
+    tickets.clear()
+    published_tables.clear()
+
+    response = orders_client.put(f"/api/orders/{order_id}", json={"table_id": 2})
+
+    assert response.status_code == 200
+    assert tickets == [("full", 2, "order_updated")]
+    # Cả bàn cũ lẫn bàn mới được cập nhật trên sơ đồ bàn
+    assert published_tables == [[1, 2]]
+
+def test_item_change_prints_delta_ticket(orders_client, tickets):
+    order_id = create_order(orders_client)
+    tickets.clear()
+
+    response = orders_client.put(f"/api/orders/{order_id}", json={"items": [order_item(1, 1), order_item(2, 2)]})
+
+    assert response.status_code == 200
+    assert tickets == [("delta", 1, 1)]
+
+def test_unchanged_order_prints_nothing(orders_client, tickets):
+    order_id = create_order(orders_client)
+    tickets.clear()
+
+    response = orders_client.put(f"/api/orders/{order_id}", json={"note": "ít đá", "items": [order_item(1, 1)]})
+
+    assert response.status_code == 200
+    assert tickets == []
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from app.core.event_bus import InMemoryEventBus
+from app.api.v1.endpoints import print_queue as print_queue_module, print_spool as print_spool_module
+from app.api.v1.endpoints.print_queue import PrintJob, print_queue
+from app.api.v1.endpoints.print_spool import print_spool
+from app.api.v1.endpoints.ws_hub import WebSocketHub
+from app.models import PrintSpoolEntry
+
+class FakeWebSocket:
+    """WebSocket của máy in; broken: socket đã đứt, mọi lần gửi đều lỗi"""
+    def __init__(self, broken: bool = False):
+        self.broken = broken
+        self.frames = []
+
+    async def send_text(self, text):
+        if self.broken:
+            raise RuntimeError("socket closed")
+        self.frames.append(text)
+
+    async def send_bytes(self, data):
+        await self.send_text(data)
+
+@pytest.fixture
+def spool(session_factory, monkeypatch):
+    monkeypatch.setattr(print_spool_module, "SessionLocal", session_factory)
+
+@pytest.fixture
+def printer_hub(monkeypatch):
+    test_hub = WebSocketHub(InMemoryEventBus())
+    monkeypatch.setattr(print_queue_module, "hub", test_hub)
+    return test_hub
+
+def spooled_job(claim: bool = True) -> PrintJob:
+    job = PrintJob([{"type": "text", "text": "Bàn 1"}], "bill")
+    job.spooled = print_spool.add(job)
+    job.claimed = claim and print_spool.claim([job.id]) == [job.id]
+    return job
+
+def spool_status(session_factory, job: PrintJob) -> str:
+    db = session_factory()
+    try:
+        return db.query(PrintSpoolEntry.status).filter(PrintSpoolEntry.job_id == job.id).scalar()
+    finally:
+        db.close()
+
+def deliver(printer_hub, websocket, job: PrintJob):
+    async def run():
+        printer = printer_hub.connect("printer-1", websocket, ["printers"])
+        return await print_queue._deliver(printer, [job])
+    return asyncio.run(run())
+
+def test_claim_takes_only_pending_rows_once(spool):
+    jobs = [spooled_job(claim=False) for _ in range(3)]
+    print_spool.claim([jobs[0].id])
+
+    assert sorted(print_spool.claim([job.id for job in jobs])) == sorted([jobs[1].id, jobs[2].id])
+    assert print_spool.claim([job.id for job in jobs]) == []
+    assert print_spool.claim([]) == []
+
+def test_job_without_ack_is_sent_after_writer_sends_it(spool, session_factory, printer_hub):
+    job = spooled_job()
+    websocket = FakeWebSocket()
+
+    assert deliver(printer_hub, websocket, job) == []
+    assert job.status == "sent"
+    assert len(websocket.frames) == 1
+    assert spool_status(session_factory, job) == "sent"
+
+def test_job_without_ack_stays_in_spool_when_socket_drops(spool, session_factory, printer_hub):
+    job = spooled_job()
+
+    assert deliver(printer_hub, FakeWebSocket(broken=True), job) == [job]
+    assert job.status == "sending"
+    # release_stale trả dòng về pending nếu worker dừng trước khi gửi lại
+    assert spool_status(session_factory, job) == "sending"
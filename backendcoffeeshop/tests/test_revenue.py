@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core import revenue
+from app.models import Order, OrderItem, Payment
+
+DAY = datetime(2025, 3, 1)
+
+@pytest.fixture
+def day_data(db, menu):
+    """Một ngày viết tay; số liệu mong đợi trong các test tính bằng tay từ dữ liệu dưới đây"""
+    db.execute(Order.__table__.insert(), [
+        {"id": 1, "time_in": DAY.replace(hour=8), "status": "completed", "total_amount": 50000},
+        {"id": 2, "time_in": DAY.replace(hour=9), "status": "pending", "total_amount": 0},
+        {"id": 3, "time_in": DAY.replace(hour=20), "status": "pending", "total_amount": 0},
+        # Ngoài ngày: không được tính
+        {"id": 4, "time_in": DAY - timedelta(minutes=1), "status": "pending", "total_amount": 0},
+        {"id": 5, "time_in": DAY + timedelta(days=1), "status": "pending", "total_amount": 0},
+    ])
+    db.execute(OrderItem.__table__.insert(), [
+        {"order_id": 1, "menu_item_id": 1, "quantity": 2, "unit_price": 25000, "total_price": 50000},
+        {"order_id": 2, "menu_item_id": 2, "quantity": 1, "unit_price": 30000, "total_price": 30000},
+        {"order_id": 2, "menu_item_id": 3, "quantity": 3, "unit_price": 10000, "total_price": 30000},
+        {"order_id": 3, "menu_item_id": 1, "quantity": 1, "unit_price": 25000, "total_price": 25000},
+        {"order_id": 4, "menu_item_id": 1, "quantity": 4, "unit_price": 25000, "total_price": 100000},
+        {"order_id": 5, "menu_item_id": 1, "quantity": 5, "unit_price": 25000, "total_price": 125000},
+    ])
+    db.execute(Payment.__table__.insert(), [
+        {"order_id": 1, "amount": 30000, "payment_method": "cash", "payment_status": "completed", "created_at": DAY.replace(hour=8, minute=30)},
+        {"order_id": 1, "amount": 20000, "payment_method": "card", "payment_status": "completed", "created_at": DAY.replace(hour=8, minute=45)},
+        {"order_id": 1, "amount": 15000, "payment_method": "cash", "payment_status": None, "created_at": DAY.replace(hour=14)},
+        {"order_id": 1, "amount": 99000, "payment_method": "card", "payment_status": "failed", "created_at": DAY.replace(hour=14)},
+        {"order_id": 1, "amount": 70000, "payment_method": "cash", "payment_status": "completed", "created_at": DAY - timedelta(seconds=1)},
+        {"order_id": 1, "amount": 80000, "payment_method": "cash", "payment_status": "completed", "created_at": DAY + timedelta(days=1)},
+    ])
+    db.commit()
+    return revenue.day_window(DAY.date())
+
+def test_day_window_is_half_open():
+    assert revenue.day_window(DAY.date()) == (DAY, DAY + timedelta(days=1))
+
+def test_paid_revenue_skips_failed_and_other_days(db, day_data):
+    buckets = revenue.payment_buckets(db, *day_data)
+
+    assert revenue.paid_revenue(buckets) == 65000
+
+def test_totals_by_hour(db, day_data):
+    buckets = revenue.payment_buckets(db, *day_data)
+
+    assert {group["hour"]: (group["total_amount"], group["count"]) for group in revenue.totals_by_hour(buckets)} == {
+        8: (50000, 2),
+        14: (15000, 1)
+    }
+
+def test_totals_by_method(db, day_data):
+    buckets = revenue.payment_buckets(db, *day_data)
+
+    assert {group["method"]: (group["total_amount"], group["count"]) for group in revenue.totals_by_method(buckets)} == {
+        "cash": (45000, 2),
+        "card": (20000, 1)
+    }
+
+def test_pending_order_revenue_only_counts_items_of_pending_orders_in_day(db, day_data):
+    assert revenue.pending_order_revenue(db, *day_data) == 30000 + 30000 + 25000
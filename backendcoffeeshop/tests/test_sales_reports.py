@@ -0,0 +1,73 @@
+from datetime import date, datetime
+
+import pytest
+
+from app.core.sales_reports import close_business_day, close_pending_days
+from app.core.sales_rollup import sales_rollup
+from app.models import Order, OrderItem, SalesReport
+
+DAY = date(2025, 3, 1)
+# Hai ngày sau, đã qua giờ chốt: DAY nằm trong cửa sổ chốt bù
+NOW = datetime(2025, 3, 3, 10, 0)
+
+@pytest.fixture
+def order(db, menu):
+    """Order đã thanh toán của DAY: 2 x món 1 (10000)"""
+    order = Order(id=1, table_id=1, shift_id=1, status="completed", total_amount=20000, time_in=datetime(2025, 3, 1, 9, 30))
+    order.items = [OrderItem(menu_item_id=1, quantity=2, unit_price=10000, total_price=20000)]
+    db.add(order)
+    db.flush()
+    sales_rollup.apply(db, [order.id])
+    db.commit()
+    return order
+
+def edit(db, order, target=None, **changes):
+    """Sửa order (hoặc target) như các endpoint: snapshot rollup, sửa, apply, commit"""
+    before = sales_rollup.snapshot(db, [order.id])
+    for key, value in changes.items():
+        setattr(target or order, key, value)
+    sales_rollup.apply(db, [order.id], before)
+    db.commit()
+
+def test_close_business_day_reads_rollup(db, order):
+    report = close_business_day(db, DAY)
+
+    assert (report.total_orders, report.total_sales) == (1, 20000)
+    assert report.top_products == [{"id": 1, "name": "Món 1", "quantity": 2, "revenue": 20000}]
+    assert report.pending_changes == 0
+
+def test_edit_after_close_marks_day_and_is_reclosed(db, order):
+    close_business_day(db, DAY)
+
+    edit(db, order, total_amount=30000)
+    edit(db, order, order.items[0], quantity=3)
+    report = db.query(SalesReport).filter(SalesReport.report_date == DAY).one()
+    db.refresh(report)
+    assert report.pending_changes == 2
+
+    assert DAY in close_pending_days(db, NOW)
+    db.refresh(report)
+    assert (report.total_orders, report.total_sales, report.pending_changes) == (1, 30000, 0)
+    assert report.top_products[0]["quantity"] == 3
+
+    # Không còn thay đổi: ngày đã chốt không bị chốt lại
+    assert DAY not in close_pending_days(db, NOW)
+
+def test_status_change_after_close_is_reclosed(db, order):
+    close_business_day(db, DAY)
+
+    edit(db, order, status="cancelled")
+    close_pending_days(db, NOW)
+
+    report = db.query(SalesReport).filter(SalesReport.report_date == DAY).one()
+    db.refresh(report)
+    assert (report.total_orders, report.total_sales, report.top_products) == (0, 0, [])
+
+def test_rebuild_marks_closed_days(db, order):
+    close_business_day(db, DAY)
+
+    sales_rollup.rebuild(db, DAY, DAY)
+
+    report = db.query(SalesReport).filter(SalesReport.report_date == DAY).one()
+    db.refresh(report)
+    assert report.pending_changes == 1
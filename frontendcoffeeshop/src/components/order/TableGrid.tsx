@@ -6,6 +6,7 @@ import { toast } from 'react-hot-toast'
 import { OrderPopup } from './OrderPopup'
 import { tables } from '../../config/tables'
 import { Table } from '@/config/tables'
+import { WEBSOCKET_CONFIG } from '@/config/websocket'
 
 interface TableGridProps {
   onTableClick?: (x: number, y: number) => void;
@@ -39,6 +40,27 @@ interface TableInfo {
   name: string;
 }
 
+// Trạng thái bàn do backend đẩy qua /ws/tables
+interface TableFeedEntry {
+  table_id: number;
+  status: string | null;
+  orders: { id: number; status: string; total_amount: number; time_in: string }[];
+}
+
+// Có WebSocket thì chỉ poll chậm để dự phòng, mất kết nối thì poll lại 30 giây
+const FALLBACK_POLL_INTERVAL = 5 * 60 * 1000
+const DISCONNECTED_POLL_INTERVAL = 30000
+const RECONNECT_DELAY = 5000
+
+const toTableStatuses = (tables: TableFeedEntry[]): TableStatus[] =>
+  tables.flatMap(table => table.orders.map(order => ({
+    id: table.table_id,
+    status: order.status,
+    orderId: String(order.id),
+    totalAmount: Number(order.total_amount || 0),
+    time_in: order.time_in
+  })))
+
 export const TableGrid: React.FC<TableGridProps> = ({ onTableClick, selectMode = false, onTableSelect, selectedTableId }) => {
   const [selectedTable, setSelectedTable] = useState<TableItem | null>(null)
   const [showPopup, setShowPopup] = useState(false)
@@ -79,15 +101,65 @@ export const TableGrid: React.FC<TableGridProps> = ({ onTableClick, selectMode =
   }
 
   useEffect(() => {
+    let socket: WebSocket | null = null
+    // seq cuối cùng theo từng worker backend (source)
+    let lastSeq: Record<string, number> = {}
+    let closed = false
+    let reconnectTimer: ReturnType<typeof setTimeout> | null = null
+    let pollTimer: ReturnType<typeof setInterval> | null = null
+
+    const startPolling = (intervalMs: number) => {
+      if (pollTimer) clearInterval(pollTimer)
+      pollTimer = setInterval(fetchTableStatuses, intervalMs)
+    }
+
+    const connect = () => {
+      socket = new WebSocket(WEBSOCKET_CONFIG.BASE_URL + WEBSOCKET_CONFIG.ENDPOINTS.TABLES)
+
+      socket.onopen = () => {
+        // Đã có dữ liệu đẩy, polling chỉ còn là dự phòng
+        startPolling(FALLBACK_POLL_INTERVAL)
+      }
+
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data)
+        if (message.type === 'snapshot') {
+          lastSeq = { [message.source]: message.seq }
+          setTableStatuses(toTableStatuses(message.tables))
+        } else if (message.type === 'table_status') {
+          // Hụt delta thì xin lại snapshot
+          const previous = lastSeq[message.source]
+          if (previous !== undefined && message.seq !== previous + 1) {
+            socket?.send(JSON.stringify({ type: 'resync' }))
+          }
+          lastSeq[message.source] = message.seq
+          const changedIds = new Set(message.tables.map((table: TableFeedEntry) => table.table_id))
+          setTableStatuses(prev => [
+            ...prev.filter(status => !changedIds.has(status.id)),
+            ...toTableStatuses(message.tables)
+          ])
+        }
+      }
+
+      socket.onclose = () => {
+        if (closed) return
+        lastSeq = {}
+        startPolling(DISCONNECTED_POLL_INTERVAL)
+        reconnectTimer = setTimeout(connect, RECONNECT_DELAY)
+      }
+    }
+
     // Load dữ liệu lần đầu
     fetchTableStatuses()
-
-    // Load lại dữ liệu mỗi 30 giây
-    const interval = setInterval(fetchTableStatuses, 30000)
+    startPolling(DISCONNECTED_POLL_INTERVAL)
+    connect()
 
     // Cleanup khi component unmount
     return () => {
-      clearInterval(interval)
+      closed = true
+      if (pollTimer) clearInterval(pollTimer)
+      if (reconnectTimer) clearTimeout(reconnectTimer)
+      socket?.close()
     }
   }, [])
 
@@ -6,9 +6,13 @@ export const WEBSOCKET_CONFIG = {
   // URL WebSocket server
   SERVER_URL: (process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000').replace(/^http/, 'ws') + '/ws/print',
 
+  // Địa chỉ gốc WebSocket của backend
+  BASE_URL: (process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000').replace(/^http/, 'ws'),
+
   // Các endpoint khác nếu cần
   ENDPOINTS: {
     ORDERS: '/ws/orders',
-    PRINT: '/ws/print'
+    PRINT: '/ws/print',
+    TABLES: '/ws/tables'
   }
 } 
\ No newline at end of file